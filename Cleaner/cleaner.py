@@ -1,14 +1,63 @@
 import asyncio
+import logging
+import os
 from service.UrlService import UrlService
+from service.VisitAggregator import visit_aggregator
+from Monitoring.metrics import CLEANER_RUN_SECONDS, CLEANER_ARCHIVED
+
+logger = logging.getLogger(__name__)
 
 url_service = UrlService()
 
-async def periodic_expired_cleanup(interval_seconds: int = 3600, unused_days: int = 10):
+CLEANER_INTERVAL = int(os.getenv("CLEANER_INTERVAL", 3600))
+CLEANER_UNUSED_DAYS = int(os.getenv("CLEANER_UNUSED_DAYS", 10))
+CLEANER_CHUNK_SIZE = int(os.getenv("CLEANER_CHUNK_SIZE", 500))
+CLEANER_TIME_BUDGET = float(os.getenv("CLEANER_TIME_BUDGET", 30))
+CLEANER_CHUNK_PAUSE = float(os.getenv("CLEANER_CHUNK_PAUSE", 0.05))
+# Если не уложились в бюджет, следующий запуск делаем раньше
+CLEANER_CATCHUP_INTERVAL = int(os.getenv("CLEANER_CATCHUP_INTERVAL", 60))
+
+async def periodic_expired_cleanup(interval_seconds: int = CLEANER_INTERVAL, unused_days: int = CLEANER_UNUSED_DAYS):
     """
     Периодически очищает устаревшие ссылки.
     :param interval_seconds: Интервал между проверками в секундах (по умолчанию 1 час)
+    :param unused_days: Через сколько дней без переходов ссылка считается неиспользуемой
     """
     while True:
-        print("[Cleaner] Checking for expired URLs...")
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, lambda: url_service.delete_expired(unused_days))
\ No newline at end of file
+        logger.debug("Checking for expired URLs...")
+        next_run = interval_seconds
+        try:
+            # Свежие переходы должны попасть в last_visited до проверки на неиспользуемость
+            await visit_aggregator.flush()
+            loop = asyncio.get_running_loop()
+            report = await loop.run_in_executor(None, lambda: url_service.delete_expired(
+                unused_days,
+                chunk_size=CLEANER_CHUNK_SIZE,
+                time_budget=CLEANER_TIME_BUDGET,
+                chunk_pause=CLEANER_CHUNK_PAUSE,
+                # Истёкшие ссылки архивирует ExpiryScheduler точно в срок
+                include_expired=False
+            ))
+            CLEANER_RUN_SECONDS.observe(report["seconds"])
+            CLEANER_ARCHIVED.labels("expired").inc(report["expired"])
+            CLEANER_ARCHIVED.labels("unused").inc(report["unused"])
+            logger.info(
+                f"Archived {report['expired']} expired and {report['unused']} unused URLs "
+                f"in {report['seconds']:.2f}s" + ("" if report["complete"] else " (time budget exhausted)")
+            )
+            if not report["complete"]:
+                next_run = min(interval_seconds, CLEANER_CATCHUP_INTERVAL)
+        except Exception as e:
+            logger.exception(f"Cleanup failed: {e}")
+        await asyncio.sleep(next_run)
+
+
+async def backfill_url_hashes():
+    """Заполняет long_url_hash у ссылок, созданных до появления обратного индекса."""
+    try:
+        loop = asyncio.get_running_loop()
+        updated = await loop.run_in_executor(None, url_service.backfill_long_url_hashes)
+        if updated:
+            logger.info(f"Backfilled long_url_hash for {updated} URLs")
+    except Exception as e:
+        logger.exception(f"Long URL hash backfill failed: {e}")
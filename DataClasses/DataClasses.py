@@ -2,6 +2,9 @@ from pydantic import BaseModel, EmailStr, Field, ValidationError, field_validato
 import re
 from datetime import datetime
 
+# Совпадают со статическими маршрутами GET /links/... и перехватывались бы ими
+RESERVED_ALIASES = {"mine", "search"}
+
 class LongUrlDC(BaseModel):
     url: str
 
@@ -9,6 +12,8 @@ class CreateShortUrlDC(BaseModel):
     url: str
     expiresAt: datetime = None
     alias: str = ""
+    # Вернуть уже существующий алиас, если этот владелец уже сокращал ту же ссылку
+    reuseExisting: bool | None = None
 
     @field_validator("alias")
     def validate_alias(cls, value):
@@ -18,17 +23,65 @@ class CreateShortUrlDC(BaseModel):
             raise ValueError("Alias must be at most 7 characters long.")
         if not re.fullmatch(r"^[a-zA-Z0-9_]+$", value):
             raise ValueError("Alias can only contain letters, digits and underscores: [a-zA-Z0-9_]")
+        if value in RESERVED_ALIASES:
+            raise ValueError(f"Alias '{value}' is reserved.")
         return value
 
 class ShortUrlDC(BaseModel):
     url: str
 
+class BulkShortenResultDC(BaseModel):
+    index: int
+    status: int
+    url: str | None = None
+    detail: str | None = None
+
+class BulkShortenResponseDC(BaseModel):
+    created: int
+    failed: int
+    results: list[BulkShortenResultDC]
+
 class ShortUrlStatsDC(BaseModel):
     originalUrl: str
     visits: int
     lastTimeUsed: datetime
     createdAt: datetime
 
+class ClickPointDC(BaseModel):
+    time: datetime
+    clicks: int
+
+class ClickTimeseriesDC(BaseModel):
+    alias: str
+    granularity: str
+    points: list[ClickPointDC]
+    totalClicks: int
+    # Оценка HyperLogLog (погрешность ~0.8%), с точностью до часа
+    uniqueVisitors: int
+
+class TopLinkDC(BaseModel):
+    shortUrl: str
+    clicks: int
+    pinned: bool
+
+class TopLinksDC(BaseModel):
+    window: int
+    items: list[TopLinkDC]
+
+class OwnedLinkDC(BaseModel):
+    shortUrl: str
+    originalUrl: str
+    visits: int
+    lastTimeUsed: datetime
+    createdAt: datetime
+    expiresAt: datetime | None = None
+
+class OwnedLinksPageDC(BaseModel):
+    items: list[OwnedLinkDC]
+    nextCursor: str | None = None
+    # Считается только для первой страницы
+    total: int | None = None
+
 class UpdateUrlDC(BaseModel):
     newUrl: str
 
@@ -0,0 +1,143 @@
+"""
+Схема БД по версиям. Применённые миграции записываются в таблицу schema_migrations,
+каждая запускается один раз. Все шаги идемпотентны: базы, созданные до появления
+миграций, проходят их с нуля без ошибок.
+
+Запуск вручную (например, перед выкаткой с AUTO_MIGRATE=0):
+    python -m Database.migrations
+"""
+import logging
+import os
+
+from sqlalchemy import (
+    Table, Column, Integer, BigInteger, String, DateTime, Boolean, ForeignKey, MetaData, func, inspect, insert, select, text
+)
+
+from Database.main_db import engine
+from Database.url_hash import LONG_URL_HASH_LENGTH
+
+logger = logging.getLogger(__name__)
+
+# Применять миграции при старте приложения
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1") == "1"
+
+# Ключ pg_advisory_xact_lock: воркеры, стартующие одновременно, мигрируют по очереди
+POSTGRES_LOCK_KEY = 72301
+
+migrations_table = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, server_default=func.now(), nullable=False)
+)
+
+
+# Схема версии 1 зафиксирована здесь, а не берётся из моделей: модели меняются вместе с кодом,
+# а миграция должна создавать одно и то же на любой версии приложения
+base_schema = MetaData()
+
+Table(
+    "urls",
+    base_schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("short_url", String, nullable=False, unique=True),
+    Column("long_url", String, nullable=False),
+    Column("times_visited", Integer, nullable=False),
+    Column("created_at", DateTime, server_default=func.now(), nullable=False),
+    Column("last_visited", DateTime, server_default=func.now(), nullable=False),
+    Column("expires_at", DateTime, nullable=True),
+    Column("owner_id", Integer, ForeignKey("users.id"), nullable=True)
+)
+
+Table(
+    "users",
+    base_schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("email", String, unique=True, index=True, nullable=False),
+    Column("password_hash", String, nullable=False),
+    Column("is_active", Boolean),
+    Column("created_at", DateTime, server_default=func.now())
+)
+
+Table(
+    "expired_urls",
+    base_schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("shortUrl", String, nullable=False),
+    Column("longUrl", String, nullable=False),
+    Column("timesVisited", Integer, nullable=False),
+    Column("createdAt", DateTime, nullable=False),
+    Column("lastVisited", DateTime, nullable=True),
+    Column("expiresAt", DateTime, nullable=True),
+    Column("deletedAt", DateTime, nullable=False),
+    Column("owner_id", Integer, nullable=True)
+)
+
+Table(
+    "alias_sequences",
+    base_schema,
+    Column("name", String, primary_key=True),
+    Column("value", BigInteger, nullable=False)
+)
+
+
+def create_base_schema(connection):
+    # В базе, созданной до миграций, создаются только недостающие таблицы
+    base_schema.create_all(connection)
+
+
+def add_long_url_hash(connection):
+    # Колонка хэша добавлена позже — заполняется фоновым backfill
+    if "long_url_hash" not in {column["name"] for column in inspect(connection).get_columns("urls")}:
+        connection.execute(text(f"ALTER TABLE urls ADD COLUMN long_url_hash VARCHAR({LONG_URL_HASH_LENGTH})"))
+
+
+def create_missing_indexes(connection):
+    # Индексы, появившиеся после базовой схемы; IF NOT EXISTS есть и в SQLite, и в PostgreSQL
+    for name, columns in (
+        ("ix_urls_long_url_hash_owner", "long_url_hash, owner_id"),
+        ("ix_urls_owner_created", "owner_id, created_at, id"),
+        ("ix_urls_last_visited", "last_visited"),
+        ("ix_urls_expires_at", "expires_at"),
+    ):
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON urls ({columns})"))
+
+
+# (версия, название, функция) — только дописывать в конец
+MIGRATIONS = [
+    (1, "base schema", create_base_schema),
+    (2, "urls.long_url_hash", add_long_url_hash),
+    (3, "urls indexes", create_missing_indexes),
+]
+
+
+def lock_schema(connection):
+    backend = connection.dialect.name
+    if backend == "postgresql":
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": POSTGRES_LOCK_KEY})
+    elif backend == "sqlite":
+        # Блокировка записи на всю транзакцию; DDL в SQLite тоже транзакционный
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def run_migrations(bind=engine) -> int:
+    """Применяет недостающие миграции в одной транзакции и возвращает версию схемы."""
+    with bind.begin() as connection:
+        lock_schema(connection)
+        migrations_table.create(connection, checkfirst=True)
+        current = connection.execute(select(func.max(migrations_table.c.version))).scalar() or 0
+        for version, name, migrate in MIGRATIONS:
+            if version <= current:
+                continue
+            logger.info(f"Applying migration {version}: {name}")
+            migrate(connection)
+            connection.execute(insert(migrations_table).values(version=version, name=name))
+            current = version
+    return current
+
+
+if __name__ == "__main__":
+    from Monitoring.metrics import setup_logging
+    setup_logging()
+    print(f"Schema version: {run_migrations()}")
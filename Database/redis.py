@@ -1,7 +1,33 @@
 import redis
+import redis.asyncio as aioredis
 import os
 
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 64))
+
+# Общий ограниченный пул для асинхронных клиентов (создаётся один раз на процесс)
+async_pool = aioredis.BlockingConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=0,
+    decode_responses=True,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=5
+)
+
+# Синхронные клиенты (UrlService, AuthService, очистка) тоже делят один пул соединений
+sync_pool = redis.BlockingConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=0,
+    decode_responses=True,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=5
+)
+
 def get_redis_client():
-    host = os.getenv("REDIS_HOST", "localhost")
-    port = int(os.getenv("REDIS_PORT", 6379))
-    return redis.StrictRedis(host=host, port=port, db=0, decode_responses=True)
\ No newline at end of file
+    return redis.StrictRedis(connection_pool=sync_pool)
+
+def get_async_redis_client():
+    return aioredis.StrictRedis(connection_pool=async_pool)
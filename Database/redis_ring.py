@@ -0,0 +1,255 @@
+"""
+Кэш ссылок (alias -> запись) на нескольких узлах Redis: консистентное хэширование
+с виртуальными узлами. Pub/sub, токены, лимиты и аналитика остаются на основном
+Redis (REDIS_HOST) — по кольцу раскладываются только ключи алиасов.
+
+Узлы из REDIS_NODES должны быть отданы под кэш целиком: вернувшийся после сбоя узел
+очищается (FLUSHDB), чтобы не отдавать записи, изменённые, пока он был недоступен.
+Без REDIS_NODES кольцо состоит из одного основного Redis и ведёт себя как раньше.
+
+Локально — несколько redis-server:
+    redis-server --port 7001 --save "" & redis-server --port 7002 --save "" & redis-server --port 7003 --save "" &
+    REDIS_NODES=localhost:7001,localhost:7002,localhost:7003 uvicorn main:app
+    python -m Database.redis_ring distribution --nodes localhost:7001,localhost:7002,localhost:7003
+"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+import threading
+
+import redis
+import redis.asyncio as aioredis
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+
+from Database.redis import REDIS_HOST, REDIS_PORT, REDIS_MAX_CONNECTIONS, get_redis_client, get_async_redis_client
+
+logger = logging.getLogger(__name__)
+
+# host:port через запятую
+REDIS_NODES = [node.strip() for node in os.getenv("REDIS_NODES", "").split(",") if node.strip()]
+
+# Ошибки, после которых узел считается недоступным
+NODE_ERRORS = (RedisConnectionError, RedisTimeoutError, OSError, asyncio.TimeoutError)
+
+
+def key_hash(key: str) -> int:
+    # Хэш должен совпадать во всех воркерах и между запусками — встроенный hash() не подходит
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Каждый узел — virtual_nodes точек на кольце; ключ принадлежит первой точке по часовой стрелке.
+    Удаление узла переносит только его ключи, и они расходятся по остальным узлам равномерно.
+    """
+
+    def __init__(self, nodes: list[str], virtual_nodes: int):
+        points = sorted((key_hash(f"{node}#{index}"), node) for node in nodes for index in range(virtual_nodes))
+        self._hashes = [point[0] for point in points]
+        self._nodes = [point[1] for point in points]
+
+    def node_for(self, key: str) -> str:
+        return self._nodes[bisect.bisect(self._hashes, key_hash(key)) % len(self._hashes)]
+
+
+class CacheNode:
+
+    def __init__(self, name: str, sync_client, async_client):
+        self.name = name
+        self.redis = sync_client
+        self.async_redis = async_client
+        self.alive = True
+        self.failures = 0
+
+
+class RedisRing:
+    VIRTUAL_NODES = int(os.getenv("REDIS_VIRTUAL_NODES", 160))
+    HEALTH_INTERVAL = float(os.getenv("REDIS_NODE_HEALTH_INTERVAL", 2))
+    # Таймаут операций на узле: недоступный узел должен выпадать быстро
+    TIMEOUT = float(os.getenv("REDIS_NODE_TIMEOUT", 1))
+
+    def __init__(self, names: list[str]):
+        # Узлы только под кэш: их можно выводить из кольца и очищать
+        self.dedicated = bool(names)
+        if names:
+            self.nodes = {name: CacheNode(name, *self._clients(name)) for name in names}
+        else:
+            name = f"{REDIS_HOST}:{REDIS_PORT}"
+            self.nodes = {name: CacheNode(name, get_redis_client(), get_async_redis_client())}
+        self._full_ring = HashRing(list(self.nodes), self.VIRTUAL_NODES)
+        self._ring = self._full_ring
+        self._lock = threading.Lock()
+
+    def _clients(self, name: str):
+        host, _, port = name.rpartition(":")
+        options = dict(
+            host=host, port=int(port), db=0, decode_responses=True, max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=5, socket_timeout=self.TIMEOUT, socket_connect_timeout=self.TIMEOUT
+        )
+        return (
+            redis.StrictRedis(connection_pool=redis.BlockingConnectionPool(**options)),
+            aioredis.StrictRedis(connection_pool=aioredis.BlockingConnectionPool(**options))
+        )
+
+    def node_for(self, key: str) -> CacheNode:
+        return self.nodes[self._ring.node_for(key)]
+
+    def group(self, keys: list[str], for_delete: bool = False) -> dict[str, list[str]]:
+        """
+        Ключи по узлам. Удаление идёт и на владельца в полном кольце, если он жив:
+        другой воркер мог ещё не заметить возвращения узла и читать с него.
+        """
+        ring, full_ring = self._ring, self._full_ring
+        groups: dict[str, list[str]] = {}
+        for key in keys:
+            owner = ring.node_for(key)
+            groups.setdefault(owner, []).append(key)
+            if for_delete:
+                full_owner = full_ring.node_for(key)
+                if full_owner != owner and self.nodes[full_owner].alive:
+                    groups.setdefault(full_owner, []).append(key)
+        return groups
+
+    def mark_down(self, node: CacheNode, error: Exception) -> bool:
+        """Выводит узел из кольца; последний живой узел не выводится (возвращает False)."""
+        with self._lock:
+            if not node.alive:
+                return True
+            if not self.dedicated or sum(other.alive for other in self.nodes.values()) <= 1:
+                return False
+            node.alive = False
+            node.failures += 1
+            self._rebuild()
+        logger.warning(f"Redis node {node.name} removed from the ring: {error}")
+        return True
+
+    def _rebuild(self):
+        self._ring = HashRing([name for name, node in self.nodes.items() if node.alive], self.VIRTUAL_NODES)
+
+    def call(self, key: str, operation):
+        """operation(клиент узла) на владельце ключа; при сбое узла — один повтор на новом владельце."""
+        node = self.node_for(key)
+        try:
+            return operation(node.redis)
+        except NODE_ERRORS as e:
+            if not self.mark_down(node, e):
+                raise
+            return operation(self.node_for(key).redis)
+
+    async def call_async(self, key: str, operation):
+        node = self.node_for(key)
+        try:
+            return await operation(node.async_redis)
+        except NODE_ERRORS as e:
+            if not self.mark_down(node, e):
+                raise
+            return await operation(self.node_for(key).async_redis)
+
+    def pipeline(self, keys: list[str], build, for_delete: bool = False):
+        """
+        Многоключевая операция — по одному pipeline на узел: build(pipe, ключи узла).
+        Ключи упавшего узла повторяются на новых владельцах; удаления на нём пропускаются —
+        узел очистится при возвращении.
+        """
+        failed = []
+        for name, node_keys in self.group(keys, for_delete).items():
+            node = self.nodes[name]
+            pipe = node.redis.pipeline(transaction=False)
+            build(pipe, node_keys)
+            try:
+                pipe.execute()
+            except NODE_ERRORS as e:
+                if not self.mark_down(node, e):
+                    raise
+                failed += node_keys
+        if failed and not for_delete:
+            for name, node_keys in self.group(failed).items():
+                pipe = self.nodes[name].redis.pipeline(transaction=False)
+                build(pipe, node_keys)
+                pipe.execute()
+
+    async def pipeline_async(self, keys: list[str], build, for_delete: bool = False):
+        groups = self.group(keys, for_delete)
+
+        async def execute(name: str, node_keys: list[str]):
+            pipe = self.nodes[name].async_redis.pipeline(transaction=False)
+            build(pipe, node_keys)
+            await pipe.execute()
+
+        # Узлы независимы — pipeline'ы выполняются параллельно
+        results = await asyncio.gather(
+            *(execute(name, node_keys) for name, node_keys in groups.items()), return_exceptions=True
+        )
+        failed = []
+        for (name, node_keys), result in zip(groups.items(), results):
+            if not isinstance(result, BaseException):
+                continue
+            if not isinstance(result, NODE_ERRORS) or not self.mark_down(self.nodes[name], result):
+                raise result
+            failed += node_keys
+        if failed and not for_delete:
+            await asyncio.gather(*(execute(name, node_keys) for name, node_keys in self.group(failed).items()))
+
+    async def check(self, node: CacheNode):
+        try:
+            await asyncio.wait_for(node.async_redis.ping(), self.TIMEOUT)
+            if not node.alive:
+                # Пока узел был недоступен, его ключи менялись и удалялись на соседях
+                await asyncio.wait_for(node.async_redis.flushdb(), self.TIMEOUT)
+        except NODE_ERRORS as e:
+            self.mark_down(node, e)
+            return
+        if not node.alive:
+            with self._lock:
+                node.alive = True
+                self._rebuild()
+            logger.info(f"Redis node {node.name} is back in the ring")
+
+    async def run_health_checks(self):
+        if not self.dedicated:
+            return
+        while True:
+            await asyncio.gather(*(self.check(node) for node in self.nodes.values()))
+            await asyncio.sleep(self.HEALTH_INTERVAL)
+
+    def stats(self) -> dict:
+        return {
+            "virtualNodes": self.VIRTUAL_NODES,
+            "nodes": [
+                {"name": node.name, "alive": node.alive, "failures": node.failures}
+                for node in self.nodes.values()
+            ]
+        }
+
+
+redis_ring = RedisRing(REDIS_NODES)
+
+
+def print_distribution(nodes: list[str], keys: int, virtual_nodes: int):
+    """Доля ключей на узлах и сколько ключей переезжает при выходе узла — без подключения к Redis."""
+    aliases = [f"alias{index}" for index in range(keys)]
+    ring = HashRing(nodes, virtual_nodes)
+    owners = [ring.node_for(alias) for alias in aliases]
+    print(f"{'node':<24}{'share':>8}{'moved if removed':>18}")
+    for node in nodes:
+        share = owners.count(node) / keys
+        rest = HashRing([other for other in nodes if other != node], virtual_nodes) if len(nodes) > 1 else ring
+        moved = sum(owner != rest.node_for(alias) for alias, owner in zip(aliases, owners)) / keys
+        print(f"{node:<24}{share:>8.1%}{moved:>18.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consistent-hash ring of cache Redis nodes")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    distribution = subparsers.add_parser("distribution", help="key shares and movement per node")
+    distribution.add_argument("--nodes", default=",".join(REDIS_NODES), help="host:port list, default REDIS_NODES")
+    distribution.add_argument("--keys", type=int, default=100000)
+    distribution.add_argument("--virtual-nodes", type=int, default=RedisRing.VIRTUAL_NODES)
+    args = parser.parse_args()
+    node_names = [node.strip() for node in args.nodes.split(",") if node.strip()]
+    if not node_names:
+        raise SystemExit("No nodes: pass --nodes or set REDIS_NODES")
+    print_distribution(node_names, args.keys, args.virtual_nodes)
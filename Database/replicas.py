@@ -0,0 +1,224 @@
+"""
+Чтение с реплик. Запросы только на чтение уходят на реплики из DATABASE_REPLICA_URLS,
+запись и всё, что должно видеть последние изменения, — на основную БД.
+
+Локальная проверка на двух SQLite (реплика — периодическая копия основной базы):
+    python -m Database.replicas sync sqlite:///urls.db sqlite:///replica.db --interval 2
+    DATABASE_REPLICA_URLS=sqlite:///replica.db uvicorn main:app
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from Database.main_db import AsyncSessionLocal, engine_options, async_url_of, tune_sqlite
+
+logger = logging.getLogger(__name__)
+
+# Через запятую; пусто — всё читается с основной БД
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+# Проверяет и соединение, и то, что схема на реплике уже есть
+HEALTH_QUERY = text("SELECT 1 FROM urls LIMIT 1")
+# Отставание реплики PostgreSQL; без новых записей на основной БД считается нулевым
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+def user_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def alias_key(alias: str) -> str:
+    return f"alias:{alias}"
+
+
+class Replica:
+
+    def __init__(self, url: str):
+        url = make_url(url)
+        self.name = url.render_as_string(hide_password=True)
+        self.backend = url.get_backend_name()
+        async_url = async_url_of(url)
+        self.async_engine = create_async_engine(async_url, **engine_options(async_url))
+        if self.backend == "sqlite":
+            tune_sqlite(self.async_engine.sync_engine)
+        self.AsyncSessionLocal = async_sessionmaker(bind=self.async_engine, autoflush=False, expire_on_commit=False)
+
+        self.healthy = True
+        self.lag = 0.0
+        self.reads = 0
+        self.failures = 0
+
+    def in_use(self) -> int:
+        pool = self.async_engine.sync_engine.pool
+        # У SingletonThreadPool/NullPool нет счётчика выданных соединений
+        return pool.checkedout() if hasattr(pool, "checkedout") else 0
+
+
+class ReplicaRouter:
+    """
+    Выбирает реплику для чтения: round_robin или least_connections (по числу соединений,
+    выданных из пула реплики). Нездоровые реплики пропускаются до следующей успешной проверки.
+
+    Read-your-writes: после записи ключи (пользователь, алиас) на RYW_WINDOW секунд читаются
+    с основной БД. Окно хранится в памяти воркера; точечные чтения, не нашедшие строку
+    на реплике, дополнительно повторяются на основной БД — так новая ссылка не «пропадает»
+    и при запросе в соседний воркер.
+    """
+    STRATEGY = os.getenv("DB_REPLICA_STRATEGY", "round_robin")
+    RYW_WINDOW = float(os.getenv("DB_READ_YOUR_WRITES_WINDOW", 5))
+    HEALTH_INTERVAL = float(os.getenv("DB_REPLICA_HEALTH_INTERVAL", 5))
+    HEALTH_TIMEOUT = float(os.getenv("DB_REPLICA_HEALTH_TIMEOUT", 2))
+    MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", 10))
+    MAX_WINDOW_KEYS = 100000
+
+    def __init__(self, urls: list[str]):
+        if self.STRATEGY not in ("round_robin", "least_connections"):
+            raise ValueError(f"Unknown DB_REPLICA_STRATEGY '{self.STRATEGY}'")
+        self.replicas = [Replica(url) for url in urls]
+        self._counter = itertools.count()
+        # ключ -> момент, до которого читаем с основной БД
+        self._recent_writes: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.primary_reads = 0
+
+    def mark_write(self, *keys: str):
+        if not self.replicas:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                self._recent_writes[key] = now + self.RYW_WINDOW
+            if len(self._recent_writes) > self.MAX_WINDOW_KEYS:
+                self._recent_writes = {key: until for key, until in self._recent_writes.items() if until > now}
+
+    def _in_write_window(self, keys: tuple[str, ...]) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            return any(self._recent_writes.get(key, 0) > now for key in keys)
+
+    def pick(self, keys: tuple[str, ...] = ()) -> Replica | None:
+        if not self.replicas or (keys and self._in_write_window(keys)):
+            return None
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.STRATEGY == "least_connections":
+            return min(healthy, key=lambda replica: replica.in_use())
+        return healthy[next(self._counter) % len(healthy)]
+
+    def _failed(self, replica: Replica, error: Exception):
+        replica.failures += 1
+        replica.healthy = False
+        logger.warning(f"Replica {replica.name} failed, reading from primary: {error}")
+
+    def async_session(self, *keys: str):
+        """Сессия для чтения без повтора на основной БД (выгрузки, списки)."""
+        replica = self.pick(keys)
+        if replica is None:
+            self.primary_reads += 1
+            return AsyncSessionLocal()
+        replica.reads += 1
+        return replica.AsyncSessionLocal()
+
+    async def read(self, load, *keys: str, retry_on_miss: bool = False):
+        """
+        Выполняет await load(db) на реплике, при её ошибке — на основной БД.
+        retry_on_miss: None с реплики (строку ещё не реплицировали) перепроверяется на основной БД.
+        """
+        replica = self.pick(keys)
+        if replica is not None:
+            replica.reads += 1
+            try:
+                async with replica.AsyncSessionLocal() as db:
+                    result = await load(db)
+                if result is not None or not retry_on_miss:
+                    return result
+            except DBAPIError as e:
+                self._failed(replica, e)
+        self.primary_reads += 1
+        async with AsyncSessionLocal() as db:
+            return await load(db)
+
+    async def check(self, replica: Replica):
+        try:
+            async with replica.async_engine.connect() as connection:
+                await asyncio.wait_for(connection.execute(HEALTH_QUERY), self.HEALTH_TIMEOUT)
+                if replica.backend == "postgresql":
+                    replica.lag = float(
+                        (await asyncio.wait_for(connection.execute(POSTGRES_LAG_QUERY), self.HEALTH_TIMEOUT)).scalar()
+                    )
+            healthy = replica.lag <= self.MAX_LAG
+        except (DBAPIError, OSError, asyncio.TimeoutError) as e:
+            logger.debug(f"Replica {replica.name} health check failed: {e}")
+            healthy = False
+        if healthy != replica.healthy:
+            logger.info(f"Replica {replica.name} is now {'healthy' if healthy else 'unhealthy'} (lag {replica.lag:.1f}s)")
+        replica.healthy = healthy
+
+    async def run_health_checks(self):
+        if not self.replicas:
+            return
+        while True:
+            await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+            await asyncio.sleep(self.HEALTH_INTERVAL)
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.async_engine.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "strategy": self.STRATEGY,
+            "primaryReads": self.primary_reads,
+            "replicas": [
+                {
+                    "name": replica.name,
+                    "healthy": replica.healthy,
+                    "lagSeconds": replica.lag,
+                    "reads": replica.reads,
+                    "failures": replica.failures,
+                    "inUse": replica.in_use(True) + replica.in_use(False)
+                }
+                for replica in self.replicas
+            ]
+        }
+
+
+replica_router = ReplicaRouter(DATABASE_REPLICA_URLS)
+
+
+def sync_sqlite_replica(source: str, target: str, interval: float):
+    """Имитация асинхронной репликации для локальной проверки: копия базы раз в interval секунд."""
+    source_path, target_path = make_url(source).database, make_url(target).database
+    while True:
+        with closing(sqlite3.connect(source_path)) as source_db, closing(sqlite3.connect(target_path)) as target_db:
+            source_db.backup(target_db)
+        logger.info(f"Copied {source_path} -> {target_path}")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    from Monitoring.metrics import setup_logging
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Local SQLite replica for testing read routing")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sync_parser = subparsers.add_parser("sync", help="copy the primary SQLite database periodically")
+    sync_parser.add_argument("source")
+    sync_parser.add_argument("target")
+    sync_parser.add_argument("--interval", type=float, default=2)
+    args = parser.parse_args()
+    sync_sqlite_replica(args.source, args.target, args.interval)
@@ -0,0 +1,145 @@
+import asyncio
+import sqlite3
+import threading
+from collections import deque
+
+
+class WriterQueue:
+    """
+    FIFO-очередь писателей SQLite внутри процесса.
+    SQLite пропускает одного писателя за раз, остальные без очереди опрашивают блокировку
+    с растущими паузами (busy handler) — под нагрузкой это и лишние задержки, и голодание.
+    Здесь писатели ждут своей очереди и получают блокировку сразу после коммита предыдущего.
+    Между процессами по-прежнему работает busy_timeout.
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._locked = False
+        self._waiters: deque[threading.Event] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def acquire(self, timeout: float) -> bool:
+        with self._mutex:
+            if not self._locked and not self._waiters:
+                self._locked = True
+                return True
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+
+        if waiter.wait(timeout):
+            return True
+        with self._mutex:
+            # Блокировку могли передать нам в момент таймаута
+            if waiter.is_set():
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def try_acquire(self) -> bool:
+        """Захват без ожидания: только если очередь пуста."""
+        with self._mutex:
+            if self._locked or self._waiters:
+                return False
+            self._locked = True
+            return True
+
+    def release(self):
+        with self._mutex:
+            if self._waiters:
+                # Передаём блокировку следующему, не снимая её
+                self._waiters.popleft().set()
+            else:
+                self._locked = False
+
+
+writer_queue = WriterQueue()
+
+def on_event_loop_thread() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+# Только эти операторы открывают в sqlite3 неявную транзакцию записи
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+class WriterQueueCursor(sqlite3.Cursor):
+
+    def _enter(self, sql: str):
+        connection = self.connection
+        if connection.holds_writer or connection.in_transaction:
+            return
+        if sql.lstrip().upper().startswith(WRITE_STATEMENTS):
+            # aiosqlite выполняет запросы в своём потоке — ожидание там не задерживает event loop.
+            # Синхронная сессия в потоке event loop остановила бы все корутины: там только
+            # попытка без ожидания, а занятая очередь — сразу ошибка
+            if on_event_loop_thread():
+                if not writer_queue.try_acquire():
+                    raise sqlite3.OperationalError("database is locked (writer queue busy, event loop thread must not wait)")
+            elif not writer_queue.acquire(connection.busy_timeout):
+                raise sqlite3.OperationalError("database is locked (writer queue timeout)")
+            connection.holds_writer = True
+
+    def _leave(self):
+        connection = self.connection
+        # Оператор упал до BEGIN или выполнился вне транзакции
+        if connection.holds_writer and not connection.in_transaction:
+            connection.release_writer()
+
+    def execute(self, sql, parameters=()):
+        self._enter(sql)
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._leave()
+
+    def executemany(self, sql, seq_of_parameters):
+        self._enter(sql)
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._leave()
+
+
+class WriterQueueConnection(sqlite3.Connection):
+    """Соединение sqlite3, которое встаёт в writer_queue перед первой записью транзакции."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.busy_timeout = kwargs.get("timeout", 5.0)
+        self.holds_writer = False
+
+    def cursor(self, factory=WriterQueueCursor):
+        return super().cursor(factory)
+
+    def release_writer(self):
+        if self.holds_writer:
+            self.holds_writer = False
+            writer_queue.release()
+
+    def commit(self):
+        try:
+            super().commit()
+        finally:
+            # Неудачный коммит оставляет транзакцию открытой до rollback
+            if not self.in_transaction:
+                self.release_writer()
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self.release_writer()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.release_writer()
@@ -0,0 +1,38 @@
+import hashlib
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+LONG_URL_HASH_LENGTH = 32
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Приводит ссылку к каноническому виду для поиска дублей:
+    схема и хост в нижнем регистре, без порта по умолчанию и без завершающего слеша.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    if not parts.scheme or not parts.hostname:
+        return url
+
+    scheme = parts.scheme.lower()
+    host = parts.hostname.lower()
+    if ":" in host:
+        host = f"[{host}]"
+    if port and DEFAULT_PORTS.get(scheme) != port:
+        host = f"{host}:{port}"
+    if parts.username is not None:
+        userinfo = parts.username + (f":{parts.password}" if parts.password is not None else "")
+        host = f"{userinfo}@{host}"
+
+    path = parts.path.rstrip("/")
+    return urlunsplit((scheme, host, path, parts.query, parts.fragment))
+
+
+def long_url_hash(url: str) -> str:
+    # Фиксированная ширина — удобно для индекса (128 бит sha256)
+    return hashlib.sha256(canonicalize_url(url).encode()).hexdigest()[:LONG_URL_HASH_LENGTH]
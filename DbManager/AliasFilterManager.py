@@ -0,0 +1,244 @@
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from Database.redis import get_async_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class CountingBloomFilter:
+    """Bloom-фильтр с 8-битными счётчиками вместо битов — поддерживает удаление."""
+    MAX_COUNTER = 255
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.counters = bytearray(self.size)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item: str):
+        counters = self.counters
+        for position in self._positions(item):
+            if counters[position] < self.MAX_COUNTER:
+                counters[position] += 1
+        self.count += 1
+
+    def remove(self, item: str):
+        positions = self._positions(item)
+        counters = self.counters
+        # Удаляем только то, что фильтр действительно считает присутствующим
+        if not all(counters[position] for position in positions):
+            return
+        for position in positions:
+            # Насыщенный счётчик больше не уменьшаем — он мог накопить больше, чем помнит
+            if counters[position] < self.MAX_COUNTER:
+                counters[position] -= 1
+        self.count = max(0, self.count - 1)
+
+    def __contains__(self, item: str) -> bool:
+        counters = self.counters
+        return all(counters[position] for position in self._positions(item))
+
+    def estimated_false_positive_rate(self) -> float:
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
+
+
+class AliasFilterManager:
+    """
+    Фильтр всех живых алиасов воркера. Если фильтр говорит "нет", редирект не идёт в БД
+    после промаха Redis. Ложноположительный хвост закрывается коротким негативным кэшем.
+    Изменения рассылаются остальным воркерам через Redis pub/sub: каждый держит свою копию,
+    общий фильтр в Redis стоил бы сетевого запроса на каждый редирект.
+    Чужие новые алиасы доходят с задержкой pub/sub, поэтому "нет" от фильтра окончательно,
+    только если он синхронизирован: перестроен при действующей подписке. После потери
+    подписки фильтр не доверяют до следующей перестройки.
+    При пропущенных сообщениях или во время перестройки удаления игнорируются,
+    а добавления применяются повторно.
+    """
+    ENABLED = os.getenv("ALIAS_FILTER_ENABLED", "1") == "1"
+    CAPACITY = int(os.getenv("ALIAS_FILTER_CAPACITY", 1_000_000))
+    ERROR_RATE = float(os.getenv("ALIAS_FILTER_ERROR_RATE", 0.01))
+    NEGATIVE_TTL = float(os.getenv("ALIAS_NEGATIVE_CACHE_TTL", 30))
+    NEGATIVE_MAX_SIZE = int(os.getenv("ALIAS_NEGATIVE_CACHE_SIZE", 100_000))
+    CHANNEL = "url-filter"
+
+    def __init__(self, enabled: bool | None = None):
+        self.enabled = self.ENABLED if enabled is None else enabled
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.filter: CountingBloomFilter | None = None
+        self.ready = False
+        self.synced = False
+        self._subscribed = False
+        self._rebuilding = False
+        self._added_during_rebuild: list[str] = []
+        self._negative: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.checks = 0
+        self.definite_misses = 0
+        self.negative_hits = 0
+        self.false_positives = 0
+
+    def might_exist(self, alias: str) -> bool:
+        if not self.enabled:
+            return True
+        with self._lock:
+            if not self.ready:
+                return True
+            self.checks += 1
+            if alias not in self.filter:
+                self.definite_misses += 1
+                return False
+            expires = self._negative.get(alias)
+            if expires is not None:
+                if expires > time.monotonic():
+                    self.negative_hits += 1
+                    return False
+                del self._negative[alias]
+            return True
+
+    def is_definitely_absent(self, alias: str) -> bool:
+        """Алиаса точно нет: фильтр его не видел и не мог пропустить сообщение о нём."""
+        return self.synced and not self.might_exist(alias)
+
+    def record_false_positive(self, alias: str):
+        """Фильтр пропустил алиас, которого нет в БД — запоминаем промах ненадолго."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if not self.ready:
+                return
+            self.false_positives += 1
+            self._negative[alias] = time.monotonic() + self.NEGATIVE_TTL
+            self._negative.move_to_end(alias)
+            while len(self._negative) > self.NEGATIVE_MAX_SIZE:
+                self._negative.popitem(last=False)
+
+    def add(self, aliases: list[str]):
+        with self._lock:
+            for alias in aliases:
+                self._negative.pop(alias, None)
+                if self._rebuilding:
+                    self._added_during_rebuild.append(alias)
+                if self.filter is not None:
+                    self.filter.add(alias)
+
+    def remove(self, aliases: list[str]):
+        with self._lock:
+            if self._rebuilding or self.filter is None:
+                return
+            for alias in aliases:
+                self.filter.remove(alias)
+
+    def encode_message(self, op: str, aliases: list[str]) -> str:
+        return f"{self.worker_id}|{op}|{','.join(aliases)}"
+
+    def apply_message(self, message: str):
+        worker_id, op, aliases = message.split("|", 2)
+        if worker_id == self.worker_id or not aliases:
+            return
+        if op == "+":
+            self.add(aliases.split(","))
+        elif op == "-":
+            self.remove(aliases.split(","))
+
+    def start_rebuild(self):
+        with self._lock:
+            if not self._rebuilding:
+                self._rebuilding = True
+                self._added_during_rebuild = []
+
+    def abort_rebuild(self):
+        with self._lock:
+            self._rebuilding = False
+            self._added_during_rebuild = []
+
+    def finish_rebuild(self, new_filter: CountingBloomFilter):
+        with self._lock:
+            for alias in self._added_during_rebuild:
+                new_filter.add(alias)
+            self.filter = new_filter
+            self._added_during_rebuild = []
+            self._rebuilding = False
+            self.ready = True
+            # Перестройка шла при живой подписке — ни одно добавление не потеряно
+            self.synced = self._subscribed
+
+    def set_subscribed(self, subscribed: bool):
+        with self._lock:
+            self._subscribed = subscribed
+            if not subscribed:
+                self.synced = False
+
+    def new_filter(self, expected: int) -> CountingBloomFilter:
+        # Запас в 2 раза, чтобы фильтр не деградировал по мере роста таблицы
+        return CountingBloomFilter(max(self.CAPACITY, expected * 2), self.ERROR_RATE)
+
+    def stats(self) -> dict:
+        with self._lock:
+            passed = self.checks - self.definite_misses - self.negative_hits
+            return {
+                "enabled": self.enabled,
+                "ready": self.ready,
+                "synced": self.synced,
+                "items": self.filter.count if self.filter else 0,
+                "capacity": self.filter.capacity if self.filter else 0,
+                "counters": self.filter.size if self.filter else 0,
+                "hashFunctions": self.filter.hash_count if self.filter else 0,
+                "checks": self.checks,
+                "definiteMisses": self.definite_misses,
+                "negativeCacheHits": self.negative_hits,
+                "negativeCacheSize": len(self._negative),
+                "falsePositives": self.false_positives,
+                "observedFalsePositiveRate": self.false_positives / passed if passed else 0.0,
+                "estimatedFalsePositiveRate": self.filter.estimated_false_positive_rate() if self.filter else 0.0
+            }
+
+    async def listen_updates(self, rebuild):
+        """
+        Применяет изменения от других воркеров. После каждой (пере)подписки фильтр
+        перестраивается из БД параллельно с приёмом сообщений: пока подписки не было,
+        сообщения могли потеряться.
+        """
+        if not self.enabled:
+            return
+        redis = get_async_redis_client()
+        while True:
+            pubsub = redis.pubsub()
+            rebuild_task = None
+            try:
+                await pubsub.subscribe(self.CHANNEL)
+                self.set_subscribed(True)
+                self.start_rebuild()
+                rebuild_task = asyncio.create_task(rebuild())
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.apply_message(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Update listener failed, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                self.set_subscribed(False)
+                if rebuild_task:
+                    rebuild_task.cancel()
+                await pubsub.aclose()
+
+
+alias_filter = AliasFilterManager()
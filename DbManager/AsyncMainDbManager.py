@@ -0,0 +1,214 @@
+from sqlalchemy import select, insert, func, and_, or_, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+import datetime
+
+from Database.main_db import ShortUrl, ExpiredUrl, AliasSequence
+from Database.url_hash import long_url_hash
+from Monitoring.metrics import instrumented
+from DbManager.MainDbManager import visit_deltas_update, sequence_lease_update, alias_conflict, is_alias_conflict, expired_condition, archive_delete, archive_rows, reusable_condition, long_url_condition
+
+
+@instrumented
+class AsyncMainDbManager:
+
+    async def save(self, shortUrl: ShortUrl, db: AsyncSession):
+        try:
+            db.add(shortUrl)
+            await db.commit()
+            await db.refresh(shortUrl)
+            return shortUrl
+        except IntegrityError as e:
+            await db.rollback()
+            if not is_alias_conflict(e):
+                raise
+            raise alias_conflict(shortUrl.shortUrl)
+
+    async def lease_sequence_block(self, name: str, size: int, db: AsyncSession) -> int:
+        while True:
+            end = (await db.execute(sequence_lease_update(name, size))).scalar()
+            if end is not None:
+                await db.commit()
+                return end + 1
+            try:
+                db.add(AliasSequence(name=name, value=0))
+                await db.commit()
+            except IntegrityError:
+                await db.rollback()
+
+    async def get_existing_short_urls(self, aliases: list[str], db: AsyncSession, chunk_size: int = 500) -> set[str]:
+        existing = set()
+        for start in range(0, len(aliases), chunk_size):
+            result = await db.execute(
+                select(ShortUrl.shortUrl).where(ShortUrl.shortUrl.in_(aliases[start:start + chunk_size]))
+            )
+            existing.update(result.scalars().all())
+        return existing
+
+    async def bulk_insert(self, rows: list[dict], db: AsyncSession) -> set[str]:
+        """
+        Вставляет строки одним executemany в одной транзакции.
+        Если кто-то успел занять алиас параллельно — повторяет построчно через SAVEPOINT.
+        Возвращает алиасы, которые вставить не удалось.
+        """
+        if not rows:
+            return set()
+        try:
+            await db.execute(insert(ShortUrl), rows)
+            await db.commit()
+            return set()
+        except IntegrityError:
+            await db.rollback()
+
+        conflicts = set()
+        for row in rows:
+            try:
+                async with db.begin_nested():
+                    await db.execute(insert(ShortUrl), [row])
+            except IntegrityError as e:
+                if not is_alias_conflict(e):
+                    await db.rollback()
+                    raise
+                conflicts.add(row["shortUrl"])
+        await db.commit()
+        return conflicts
+
+    async def get_reusable(self, long_url: str, owner_id: int | None, expires_at: datetime.datetime | None, db: AsyncSession):
+        result = await db.execute(select(ShortUrl).where(reusable_condition(long_url, owner_id, expires_at)).limit(1))
+        return result.scalars().first()
+
+    async def get_by_short_url(self, short_url: str, db: AsyncSession):
+        result = await db.execute(select(ShortUrl).where(ShortUrl.shortUrl == short_url).limit(1))
+        return result.scalars().first()
+
+    async def get_by_long_url(self, long_url: str, db: AsyncSession):
+        result = await db.execute(select(ShortUrl).where(long_url_condition(long_url)).limit(1))
+        return result.scalars().first()
+
+    async def update_short_url(self, short_url: str, new_full_url: str, db: AsyncSession):
+        db_entry = await self.get_by_short_url(short_url, db)
+        if not db_entry:
+            return None
+        db_entry.longUrl = new_full_url
+        db_entry.longUrlHash = long_url_hash(new_full_url)
+        await db.commit()
+        return db_entry
+
+    async def delete_short_url(self, short_url: str, db: AsyncSession) -> bool:
+        # Удаление и запись в архив — в одной транзакции
+        rows = await self.archive(ShortUrl.shortUrl == short_url, db)
+        return bool(rows)
+
+    async def apply_visit_deltas(self, deltas: dict[str, tuple[int, datetime.datetime]], db: AsyncSession, chunk_size: int = 500) -> int:
+        items = list(deltas.items())
+        updated = 0
+        for start in range(0, len(items), chunk_size):
+            result = await db.execute(visit_deltas_update(items[start:start + chunk_size]))
+            updated += result.rowcount
+        await db.commit()
+        return updated
+
+    async def get_expiring(
+        self,
+        until: datetime.datetime,
+        db: AsyncSession,
+        after: tuple[datetime.datetime, int] | None = None,
+        limit: int = 1000
+    ) -> list[tuple[str, datetime.datetime, int]]:
+        # Keyset-выборка по индексу expires_at: (expires_at, id) строго после after
+        query = select(ShortUrl.shortUrl, ShortUrl.expiresAt, ShortUrl.id).where(expired_condition(until))
+        if after:
+            query = query.where(or_(
+                ShortUrl.expiresAt > after[0],
+                and_(ShortUrl.expiresAt == after[0], ShortUrl.id > after[1])
+            ))
+        result = await db.execute(query.order_by(ShortUrl.expiresAt, ShortUrl.id).limit(limit))
+        return [tuple(row) for row in result.all()]
+
+    async def archive_expired_aliases(self, aliases: list[str], now: datetime.datetime, db: AsyncSession) -> list[str]:
+        """Архивирует перечисленные ссылки, если они действительно истекли к now."""
+        rows = await self.archive(and_(ShortUrl.shortUrl.in_(aliases), expired_condition(now)), db)
+        return [row.shortUrl for row in rows]
+
+    async def archive(self, condition, db: AsyncSession) -> list:
+        """Переносит подходящие под condition строки в expired_urls; возвращает удалённые строки."""
+        rows = (await db.execute(archive_delete(condition))).all()
+        if rows:
+            await db.execute(insert(ExpiredUrl), archive_rows(rows))
+        await db.commit()
+        return rows
+
+    async def get_owned_page(
+        self,
+        owner_id: int,
+        newest_first: bool,
+        db: AsyncSession,
+        after: tuple[datetime.datetime, int] | None = None,
+        limit: int = 50
+    ) -> list[ShortUrl]:
+        # Keyset по индексу (owner_id, created_at, id): (created_at, id) строго после after
+        query = select(ShortUrl).where(ShortUrl.owner_id == owner_id)
+        if after:
+            # created_at якоря берём из самой строки: в SQLite server_default хранит время
+            # без микросекунд, а параметр datetime сравнивался бы как другая строка.
+            # Если якорь уже удалён — используем значение из курсора
+            anchor = func.coalesce(
+                select(ShortUrl.createdAt).where(ShortUrl.id == after[1]).scalar_subquery(),
+                after[0]
+            )
+            # Сравнение строк (row value), а не OR: так индекс ищет сразу с позиции курсора
+            position = tuple_(ShortUrl.createdAt, ShortUrl.id)
+            query = query.where(position < tuple_(anchor, after[1]) if newest_first else position > tuple_(anchor, after[1]))
+        order = (ShortUrl.createdAt.desc(), ShortUrl.id.desc()) if newest_first else (ShortUrl.createdAt, ShortUrl.id)
+        result = await db.execute(query.order_by(*order).limit(limit))
+        return list(result.scalars().all())
+
+    async def count_owned(self, owner_id: int, db: AsyncSession) -> int:
+        # Считается по тому же индексу, без чтения строк таблицы
+        return (await db.execute(select(func.count(ShortUrl.id)).where(ShortUrl.owner_id == owner_id))).scalar()
+
+    async def count_short_urls(self, db: AsyncSession) -> int:
+        return (await db.execute(select(func.count(ShortUrl.id)))).scalar()
+
+    async def iter_short_urls(self, db: AsyncSession, chunk_size: int = 5000):
+        # Keyset по id: каждая пачка — короткий запрос по первичному ключу
+        after = 0
+        while True:
+            result = await db.execute(
+                select(ShortUrl.id, ShortUrl.shortUrl)
+                .where(ShortUrl.id > after)
+                .order_by(ShortUrl.id)
+                .limit(chunk_size)
+            )
+            rows = result.all()
+            if not rows:
+                return
+            yield [row[1] for row in rows]
+            after = rows[-1][0]
+
+    async def stream_most_visited(self, now: datetime.datetime, limit: int, db: AsyncSession, chunk_size: int = 1000):
+        """
+        Самые посещаемые действующие ссылки, пачками. Один запрос: отдельный индекс по
+        times_visited удорожал бы каждый сброс переходов, а сортировка с LIMIT держит в памяти
+        только limit строк.
+        """
+        query = (
+            select(ShortUrl.shortUrl, ShortUrl.longUrl, ShortUrl.expiresAt)
+            .where(or_(ShortUrl.expiresAt.is_(None), ShortUrl.expiresAt > now))
+            .order_by(ShortUrl.timesVisited.desc(), ShortUrl.lastVisited.desc())
+            .limit(limit)
+        )
+        result = await db.stream(query.execution_options(yield_per=chunk_size))
+        async for rows in result.partitions():
+            yield rows
+
+    async def get_rows_after(self, columns: tuple, after_id: int, limit: int, db: AsyncSession) -> list:
+        # Первая колонка — первичный ключ, по нему и листаем
+        result = await db.execute(select(*columns).where(columns[0] > after_id).order_by(columns[0]).limit(limit))
+        return result.all()
+
+    async def stream_rows(self, columns: tuple, db: AsyncSession, chunk_size: int = 1000):
+        # Серверный курсор: в памяти одновременно не больше chunk_size строк
+        result = await db.stream(select(*columns).order_by(columns[0]).execution_options(yield_per=chunk_size))
+        async for rows in result.partitions():
+            yield rows
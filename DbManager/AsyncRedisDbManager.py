@@ -0,0 +1,70 @@
+from datetime import datetime
+
+from Database.redis import get_async_redis_client
+from Database.redis_ring import redis_ring
+from Database.main_db import ShortUrl
+from DbManager.LocalCacheManager import LocalCacheManager
+from DbManager.AliasFilterManager import AliasFilterManager
+from Monitoring.metrics import instrumented
+from DbManager.RedisDbManager import LIVE_TIME, cache_ttl, encode_record, decode_record
+
+
+@instrumented
+class AsyncRedisDbManager:
+    LIVE_TIME = LIVE_TIME
+
+    def __init__(self):
+        # Записи ссылок — на узлах кольца, pub/sub и блокировки — на основном Redis
+        self.redis = get_async_redis_client()
+        self.ring = redis_ring
+
+    async def save(self, short_url: ShortUrl):
+        ttl = cache_ttl(short_url.expiresAt)
+        if ttl <= 0:
+            await self.delete(short_url.shortUrl)
+            return
+        record = encode_record(short_url.longUrl, short_url.expiresAt)
+        await self.ring.call_async(short_url.shortUrl, lambda redis: redis.set(short_url.shortUrl, record, ex=ttl))
+
+    async def save_many(self, short_urls: list[ShortUrl], only_missing: bool = False):
+        # Заполнение кэша по одному pipeline на узел вместо отдельного запроса на каждую ссылку;
+        # only_missing — не перезаписывать ключи, уже попавшие в кэш (SET NX)
+        records = {}
+        for short_url in short_urls:
+            ttl = cache_ttl(short_url.expiresAt)
+            if ttl > 0:
+                records[short_url.shortUrl] = (encode_record(short_url.longUrl, short_url.expiresAt), ttl)
+
+        def build(pipe, keys):
+            for key in keys:
+                record, ttl = records[key]
+                pipe.set(key, record, ex=ttl, nx=only_missing)
+
+        await self.ring.pipeline_async(list(records), build)
+
+    async def try_lock(self, name: str, ttl: int) -> bool:
+        return bool(await self.redis.set(name, "1", nx=True, ex=ttl))
+
+    async def get_long_url(self, short_url: str) -> tuple[str, datetime | None] | None:
+        serialized = await self.ring.call_async(short_url, lambda redis: redis.get(short_url))
+        if not serialized:
+            return None
+        return decode_record(serialized)
+
+    async def delete(self, short_url: str):
+        await self.ring.pipeline_async([short_url], lambda pipe, keys: pipe.delete(*keys), for_delete=True)
+
+    async def delete_many(self, short_urls: list[str], batch_size: int = 500):
+        for start in range(0, len(short_urls), batch_size):
+            batch = short_urls[start:start + batch_size]
+            await self.ring.pipeline_async(batch, lambda pipe, keys: pipe.delete(*keys), for_delete=True)
+            pipe = self.redis.pipeline(transaction=False)
+            for short_url in batch:
+                pipe.publish(LocalCacheManager.INVALIDATION_CHANNEL, short_url)
+            await pipe.execute()
+
+    async def publish_invalidation(self, short_url: str):
+        await self.redis.publish(LocalCacheManager.INVALIDATION_CHANNEL, short_url)
+
+    async def publish_filter_update(self, message: str):
+        await self.redis.publish(AliasFilterManager.CHANNEL, message)
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from Database.redis import get_async_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class AuthCacheManager:
+    """
+    Кэш аутентификации в памяти воркера.
+    Проверенные токены живут до своего exp: повторный запрос с тем же токеном не делает
+    ни jwt.decode, ни EXISTS в Redis. Отзыв (logout) рассылается по jti через pub/sub;
+    пока подписка не работает, кэш токенов выключен и каждый запрос проверяется в Redis.
+    Записи пользователей кэшируются по id на USER_TTL секунд.
+    """
+    TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 10000))
+    USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", 10000))
+    USER_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", 60))
+    REVOCATION_CHANNEL = "auth-revoke"
+
+    def __init__(self):
+        # token -> claims (jti, sub, uid, exp)
+        self._tokens: OrderedDict[str, dict] = OrderedDict()
+        self._token_by_jti: dict[str, str] = {}
+        # jti -> exp отозванных токенов, чтобы не закэшировать токен, отозванный во время проверки
+        self._revoked: dict[str, float] = {}
+        # id пользователя (или email для старых токенов) -> (id, email, is_active, valid_until)
+        self._users: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.healthy = False
+
+        self.token_hits = 0
+        self.token_misses = 0
+        self.user_hits = 0
+        self.user_misses = 0
+
+    def get_token(self, token: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            claims = self._tokens.get(token) if self.healthy else None
+            if claims is None:
+                self.token_misses += 1
+                return None
+            if claims["exp"] <= now:
+                self._drop_token(token)
+                self.token_misses += 1
+                return None
+            self._tokens.move_to_end(token)
+            self.token_hits += 1
+            return claims
+
+    def put_token(self, token: str, claims: dict):
+        with self._lock:
+            # Без подписки на отзывы кэш мог бы пропустить logout
+            if not self.healthy or claims["jti"] in self._revoked:
+                return
+            self._tokens[token] = claims
+            self._token_by_jti[claims["jti"]] = token
+            while len(self._tokens) > self.TOKEN_CACHE_SIZE:
+                evicted, evicted_claims = self._tokens.popitem(last=False)
+                self._token_by_jti.pop(evicted_claims["jti"], None)
+
+    def _drop_token(self, token: str):
+        claims = self._tokens.pop(token, None)
+        if claims:
+            self._token_by_jti.pop(claims["jti"], None)
+
+    def is_revoked(self, jti: str) -> bool:
+        with self._lock:
+            exp = self._revoked.get(jti)
+            return exp is not None and exp > time.time()
+
+    def revoke(self, jti: str, exp: float):
+        now = time.time()
+        with self._lock:
+            self._revoked[jti] = exp
+            token = self._token_by_jti.pop(jti, None)
+            if token:
+                self._tokens.pop(token, None)
+            if len(self._revoked) > self.TOKEN_CACHE_SIZE:
+                self._revoked = {key: value for key, value in self._revoked.items() if value > now}
+
+    def get_user(self, key) -> tuple[int, str, bool] | None:
+        now = time.time()
+        with self._lock:
+            entry = self._users.get(key)
+            if entry is None or entry[3] <= now:
+                self._users.pop(key, None)
+                self.user_misses += 1
+                return None
+            self._users.move_to_end(key)
+            self.user_hits += 1
+            return entry[:3]
+
+    def put_user(self, key, user_id: int, email: str, is_active: bool):
+        with self._lock:
+            self._users[key] = (user_id, email, is_active, time.time() + self.USER_TTL)
+            self._users.move_to_end(key)
+            while len(self._users) > self.USER_CACHE_SIZE:
+                self._users.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+            self._token_by_jti.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "healthy": self.healthy,
+                "tokens": len(self._tokens),
+                "users": len(self._users),
+                "revoked": len(self._revoked),
+                "tokenHits": self.token_hits,
+                "tokenMisses": self.token_misses,
+                "userHits": self.user_hits,
+                "userMisses": self.user_misses
+            }
+
+    @staticmethod
+    def encode_revocation(jti: str, exp: float) -> str:
+        return f"{jti}|{exp}"
+
+    async def listen_revocations(self):
+        """Принимает отзывы токенов от всех воркеров."""
+        redis = get_async_redis_client()
+        while True:
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(self.REVOCATION_CHANNEL)
+                # Пока подписки не было, отзывы могли потеряться
+                self.clear()
+                self.healthy = True
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        jti, exp = message["data"].split("|", 1)
+                        self.revoke(jti, float(exp))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Revocation listener failed, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                self.healthy = False
+                self.clear()
+                await pubsub.aclose()
+
+
+auth_cache = AuthCacheManager()
@@ -0,0 +1,103 @@
+from Database.redis import get_async_redis_client
+from Monitoring.metrics import instrumented
+
+# Гранулярность -> (секунд в корзине, корзин в одном hash)
+# Счётчики корзин одного часа/дня/32 дней лежат в одном hash: запрос диапазона —
+# несколько HMGET, а не ключ на каждую минуту
+GRANULARITIES = {
+    "minute": (60, 60),
+    "hour": (3600, 24),
+    "day": (86400, 32),
+}
+
+
+def bucket_of(timestamp: float, granularity: str) -> int:
+    return int(timestamp // GRANULARITIES[granularity][0])
+
+
+def counter_key(alias: str, granularity: str, hash_index: int) -> str:
+    # {alias} — hash tag: все ключи ссылки попадают на один узел Redis
+    return f"clicks:{{{alias}}}:{granularity}:{hash_index}"
+
+
+SALT_KEY = "analytics:salt"
+
+
+def visitors_key(alias: str, granularity: str, bucket: int) -> str:
+    return f"uv:{{{alias}}}:{granularity}:{bucket}"
+
+
+@instrumented
+class ClickStatsManager:
+
+    def __init__(self):
+        self.redis = get_async_redis_client()
+
+    async def write_batch(
+        self,
+        clicks: dict[str, dict[int, int]],
+        visitors: dict[str, dict[int, set[str]]],
+        retention: dict[str, int]
+    ):
+        """
+        clicks: алиас -> минута -> переходы, visitors: алиас -> час -> хэши посетителей.
+        Каждый переход сразу раскладывается во все гранулярности (rollup при записи),
+        срок жизни ключа — конец его периода плюс retention гранулярности.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for alias, minutes in clicks.items():
+            # (гранулярность, номер hash, поле) -> переходы
+            increments: dict[tuple[str, int, int], int] = {}
+            for minute, count in minutes.items():
+                for granularity, (seconds, per_hash) in GRANULARITIES.items():
+                    bucket = minute * 60 // seconds
+                    slot = (granularity, bucket // per_hash, bucket % per_hash)
+                    increments[slot] = increments.get(slot, 0) + count
+
+            expire_at = {}
+            for (granularity, hash_index, field), count in increments.items():
+                key = counter_key(alias, granularity, hash_index)
+                pipe.hincrby(key, field, count)
+                seconds, per_hash = GRANULARITIES[granularity]
+                expire_at[key] = (hash_index + 1) * per_hash * seconds + retention[granularity]
+            for key, timestamp in expire_at.items():
+                pipe.expireat(key, timestamp)
+
+        for alias, hours in visitors.items():
+            days: dict[int, set[str]] = {}
+            for hour, hashes in hours.items():
+                key = visitors_key(alias, "hour", hour)
+                pipe.pfadd(key, *hashes)
+                pipe.expireat(key, (hour + 1) * 3600 + retention["hour"])
+                days.setdefault(hour // 24, set()).update(hashes)
+            for day, hashes in days.items():
+                key = visitors_key(alias, "day", day)
+                pipe.pfadd(key, *hashes)
+                pipe.expireat(key, (day + 1) * 86400 + retention["day"])
+        await pipe.execute()
+
+    async def get_or_create_salt(self, candidate: str) -> str:
+        """Общая соль всех воркеров: первый записавший побеждает, остальные читают его."""
+        await self.redis.set(SALT_KEY, candidate, nx=True)
+        return await self.redis.get(SALT_KEY)
+
+    async def get_counts(self, alias: str, granularity: str, first: int, last: int) -> dict[int, int]:
+        """Переходы по корзинам [first, last] гранулярности — по одному HMGET на hash."""
+        per_hash = GRANULARITIES[granularity][1]
+        slots: dict[str, list[tuple[int, int]]] = {}
+        for bucket in range(first, last + 1):
+            slots.setdefault(counter_key(alias, granularity, bucket // per_hash), []).append((bucket, bucket % per_hash))
+
+        pipe = self.redis.pipeline(transaction=False)
+        for key, fields in slots.items():
+            pipe.hmget(key, [field for _, field in fields])
+        counts = {}
+        for fields, values in zip(slots.values(), await pipe.execute()):
+            for (bucket, _), value in zip(fields, values):
+                if value:
+                    counts[bucket] = int(value)
+        return counts
+
+    async def count_unique(self, keys: list[str]) -> int:
+        # PFCOUNT по нескольким ключам — мощность объединения, без отдельного PFMERGE
+        return await self.redis.pfcount(*keys) if keys else 0
@@ -0,0 +1,46 @@
+from Database.redis import get_async_redis_client
+from Database.redis_ring import redis_ring
+from Monitoring.metrics import instrumented
+
+
+def minute_key(minute: int) -> str:
+    # Общий hash tag: все поминутные топы лежат на одном узле Redis
+    return f"hot:{{links}}:{minute}"
+
+
+@instrumented
+class HotLinkManager:
+    """Поминутные топы переходов в sorted set: воркеры дописывают свои счётчики, читается объединение."""
+
+    def __init__(self):
+        self.redis = get_async_redis_client()
+
+    async def add_counts(self, minute: int, counts: dict[str, int], max_members: int, ttl: int):
+        key = minute_key(minute)
+        pipe = self.redis.pipeline(transaction=False)
+        for alias, count in counts.items():
+            pipe.zincrby(key, count, alias)
+        # Размер минуты ограничен: хвост с наименьшими счётчиками отбрасывается
+        pipe.zremrangebyrank(key, 0, -max_members - 1)
+        pipe.expire(key, ttl)
+        await pipe.execute()
+
+    async def get_top(self, minutes: list[int], limit: int) -> list[tuple[str, int]]:
+        pipe = self.redis.pipeline(transaction=False)
+        for minute in minutes:
+            pipe.zrange(minute_key(minute), 0, -1, withscores=True)
+        totals: dict[str, float] = {}
+        for members in await pipe.execute():
+            for alias, score in members:
+                totals[alias] = totals.get(alias, 0) + score
+        top = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(alias, int(score)) for alias, score in top]
+
+    async def extend_ttl(self, ttls: dict[str, int]):
+        # Только EXPIRE: ключ, удалённый при изменении ссылки, не воскрешается.
+        # Записи ссылок лежат на узлах кольца — по pipeline на узел
+        def build(pipe, aliases):
+            for alias in aliases:
+                pipe.expire(alias, ttls[alias])
+
+        await redis_ring.pipeline_async(list(ttls), build)
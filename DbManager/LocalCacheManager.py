@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from Database.redis import get_async_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCacheManager:
+    """
+    Кэш первого уровня (в памяти воркера) перед Redis: alias -> (longUrl, expiresAt).
+    LRU-вытеснение по размеру, TTL не дольше MAX_TTL и не дольше expiresAt ссылки.
+    Изменения ссылок рассылаются всем воркерам через Redis pub/sub.
+    Закреплённые (популярные) ссылки не вытесняются по LRU и живут PINNED_TTL.
+    """
+    MAX_SIZE = int(os.getenv("L1_CACHE_SIZE", 10000))
+    MAX_TTL = float(os.getenv("L1_CACHE_TTL", 60))
+    PINNED_TTL = float(os.getenv("L1_PINNED_TTL", 600))
+    INVALIDATION_CHANNEL = "url-invalidate"
+
+    def __init__(self, max_size: int | None = None, max_ttl: float | None = None):
+        self.max_size = max_size or self.MAX_SIZE
+        self.max_ttl = max_ttl or self.MAX_TTL
+        # alias -> (long_url, expires_at, valid_until)
+        self._entries: OrderedDict[str, tuple[str, datetime | None, float]] = OrderedDict()
+        self._pinned: set[str] = set()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, alias: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(alias)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[2] <= now:
+                del self._entries[alias]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(alias)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, alias: str) -> tuple[str, datetime | None] | None:
+        """Запись без учёта в статистике и без продления LRU."""
+        with self._lock:
+            entry = self._entries.get(alias)
+            if entry is None or entry[2] <= time.time():
+                return None
+            return entry[0], entry[1]
+
+    def put(self, alias: str, long_url: str, expires_at: datetime | None = None):
+        valid_until = time.time() + (self.PINNED_TTL if alias in self._pinned else self.max_ttl)
+        if expires_at:
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            valid_until = min(valid_until, expires_at.timestamp())
+            if valid_until <= time.time():
+                return
+
+        with self._lock:
+            self._entries[alias] = (long_url, expires_at, valid_until)
+            self._entries.move_to_end(alias)
+            self._evict()
+
+    def _evict(self):
+        # Закреплённые записи переносятся в конец очереди; их не больше, чем размер топа
+        skipped = 0
+        while len(self._entries) > self.max_size and skipped < len(self._entries):
+            alias, entry = self._entries.popitem(last=False)
+            if alias in self._pinned:
+                self._entries[alias] = entry
+                skipped += 1
+                continue
+            self.evictions += 1
+
+    def set_pinned(self, aliases: set[str]):
+        """Заменяет набор закреплённых алиасов; уже закэшированные получают PINNED_TTL."""
+        now = time.time()
+        with self._lock:
+            self._pinned = set(aliases)
+            for alias in self._pinned:
+                entry = self._entries.get(alias)
+                if entry is None or entry[2] <= now:
+                    continue
+                valid_until = now + self.PINNED_TTL
+                if entry[1]:
+                    expires_at = entry[1] if entry[1].tzinfo else entry[1].replace(tzinfo=timezone.utc)
+                    valid_until = min(valid_until, expires_at.timestamp())
+                self._entries[alias] = (entry[0], entry[1], valid_until)
+
+    def invalidate(self, alias: str):
+        with self._lock:
+            if self._entries.pop(alias, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxSize": self.max_size,
+                "pinned": len(self._pinned),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+    async def listen_invalidations(self):
+        """Слушает канал инвалидации и удаляет изменённые ссылки из кэша воркера."""
+        redis = get_async_redis_client()
+        while True:
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(self.INVALIDATION_CHANNEL)
+                # Пока подписки не было, сообщения могли потеряться
+                self.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.invalidate(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Invalidation listener failed, reconnecting: {e}")
+                self.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+
+local_cache = LocalCacheManager()
@@ -1,93 +1,152 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from Database.main_db import ShortUrl, ExpiredUrl
+from Database.main_db import ShortUrl, ExpiredUrl, AliasSequence
+from Database.url_hash import long_url_hash
+from Monitoring.metrics import instrumented
 from fastapi import HTTPException
 import datetime
-from sqlalchemy import and_
+import re
+from sqlalchemy import and_, or_, case, update, select, insert, delete, bindparam
 
-class MainDbManager:
+def visit_deltas_update(chunk: list[tuple[str, tuple[int, datetime.datetime]]]):
+    visits = case({alias: delta for alias, (delta, _) in chunk}, value=ShortUrl.shortUrl, else_=0)
+    last_visited = case(
+        {alias: visited_at for alias, (_, visited_at) in chunk},
+        value=ShortUrl.shortUrl,
+        else_=ShortUrl.lastVisited
+    )
+    return (
+        update(ShortUrl)
+        .where(ShortUrl.shortUrl.in_([alias for alias, _ in chunk]))
+        .values(timesVisited=ShortUrl.timesVisited + visits, lastVisited=last_visited)
+        .execution_options(synchronize_session=False)
+    )
 
-    def save(self, shortUrl: ShortUrl, db: Session):
-        existing = db.query(ShortUrl).filter(ShortUrl.shortUrl == shortUrl.shortUrl).first()
-        if existing:
-            raise HTTPException(
-                status_code=409,
-                detail=f"Alias '{shortUrl.shortUrl}' already exists"
-            )
-        
-        try:
-            db.add(shortUrl)
-            db.commit()
-            db.refresh(shortUrl)
-            return shortUrl
-        except IntegrityError:
-            db.rollback()
-            return None
 
-    def update_short_url(self, short_url: str, new_full_url: str, db: Session):
-        db_entry = db.query(ShortUrl).filter(ShortUrl.shortUrl == short_url).first()
+def expired_condition(now: datetime.datetime):
+    return and_(ShortUrl.expiresAt.isnot(None), ShortUrl.expiresAt <= now)
 
-        if db_entry:
-            db_entry.longUrl = new_full_url
-            db.commit()
-            db.refresh(db_entry)
-            return db_entry
-        else:
-            return None
 
-    def delete_short_url(self, short_url: str, db: Session):
-        db_entry = db.query(ShortUrl).filter(ShortUrl.shortUrl == short_url).first()
-        if db_entry:
-            self.move_to_expired(db_entry, db)  # Архивируем перед удалением
-            db.delete(db_entry)
-            db.commit()
-            return db_entry
-        return None
+def unused_condition(cutoff: datetime.datetime):
+    return ShortUrl.lastVisited <= cutoff
 
-    def get_by_short_url(self, short_url: str, db: Session):
-        return db.query(ShortUrl).filter(ShortUrl.shortUrl == short_url).first()
 
-    def delete_all_expired(self, db: Session) -> list[str]:
-        curr_time = datetime.utcnow()
-        expired = db.query(ShortUrl).filter(
-            and_(ShortUrl.expiresAt.isnot(None), ShortUrl.expiresAt <= curr_time)
-        ).all()
+# Поля, которые переносятся из urls в expired_urls (имена атрибутов совпадают у обеих моделей)
+ARCHIVED_FIELDS = ("shortUrl", "longUrl", "timesVisited", "createdAt", "lastVisited", "expiresAt", "owner_id")
 
-        deleted_aliases = []
-        for entry in expired:
-            self.move_to_expired(entry, db)
-            deleted_aliases.append(entry.shortUrl)
-            db.delete(entry)
 
-        db.commit()
-        return deleted_aliases
+def archive_delete(condition):
+    """
+    DELETE ... RETURNING удаляемых строк: в архив пишет только транзакция, которая реально удалила строку.
+    INSERT ... SELECT перед DELETE при READ COMMITTED могли выполнить два воркера сразу — с дублями в архиве.
+    """
+    return (
+        delete(ShortUrl)
+        .where(condition)
+        .returning(*(getattr(ShortUrl, field) for field in ARCHIVED_FIELDS))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def archive_rows(rows) -> list[dict]:
+    return [dict(zip(ARCHIVED_FIELDS, row)) for row in rows]
+
+
+def long_url_condition(long_url: str):
+    # Поиск идёт по индексу хэша; строки без хэша (ещё не прошедшие backfill) сравниваются как раньше
+    return or_(
+        ShortUrl.longUrlHash == long_url_hash(long_url),
+        and_(ShortUrl.longUrlHash.is_(None), ShortUrl.longUrl == long_url)
+    )
+
+
+def reusable_condition(long_url: str, owner_id: int | None, expires_at: datetime.datetime | None):
+    # Существующая ссылка того же владельца, которая проживёт не меньше запрошенного
+    owner = ShortUrl.owner_id.is_(None) if owner_id is None else ShortUrl.owner_id == owner_id
+    if expires_at is None:
+        lifetime = ShortUrl.expiresAt.is_(None)
+    else:
+        if expires_at.tzinfo:
+            expires_at = expires_at.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        lifetime = or_(ShortUrl.expiresAt.is_(None), ShortUrl.expiresAt >= expires_at)
+    return and_(ShortUrl.longUrlHash == long_url_hash(long_url), owner, lifetime)
 
 
-    def delete_unused_for_days(self, db: Session, days: int = 10) -> list[str]:
-        cutoff = datetime.utcnow() - datetime.timedelta(days=days)
-        unused = db.query(ShortUrl).filter(ShortUrl.lastVisited <= cutoff).all()
+def sequence_lease_update(name: str, size: int):
+    return (
+        update(AliasSequence)
+        .where(AliasSequence.name == name)
+        .values(value=AliasSequence.value + size)
+        .returning(AliasSequence.value)
+    )
 
-        deleted_aliases = []
-        for entry in unused:
-            self.move_to_expired(entry, db)
-            deleted_aliases.append(entry.shortUrl)
-            db.delete(entry)
 
+# Нарушение уникальности алиаса: SQLite — "UNIQUE constraint failed: urls.short_url",
+# PostgreSQL — ограничение urls_short_url_key. \b отсекает, например, expired_urls.short_url
+ALIAS_UNIQUE_VIOLATION = re.compile(r"\burls(\.short_url\b|_short_url_key\b)")
+
+
+def is_alias_conflict(error: IntegrityError) -> bool:
+    return bool(ALIAS_UNIQUE_VIOLATION.search(str(error.orig)))
+
+
+def alias_conflict(alias: str) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail=f"Alias '{alias}' already exists"
+    )
+
+
+@instrumented
+class MainDbManager:
+
+    def lease_sequence_block(self, name: str, size: int, db: Session) -> int:
+        """Резервирует size значений последовательности, возвращает конец блока (не включая)."""
+        while True:
+            end = db.execute(sequence_lease_update(name, size)).scalar()
+            if end is not None:
+                db.commit()
+                return end + 1
+            try:
+                db.add(AliasSequence(name=name, value=0))
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+
+    def archive_chunk(
+        self, condition, order_by, db: Session, chunk_size: int = 500, exclude: set[str] | None = None
+    ) -> list[str] | None:
+        """
+        Переносит в expired_urls не больше chunk_size ссылок, подходящих под condition,
+        двумя set-based запросами (DELETE ... RETURNING и INSERT удалённых строк). Выборка идёт по индексу order_by.
+        Алиасы из exclude пропускаются. Возвращает удалённые алиасы или None, если подходящих строк больше нет.
+        """
+        if exclude:
+            condition = and_(condition, ShortUrl.shortUrl.notin_(exclude))
+        ids = db.execute(select(ShortUrl.id).where(condition).order_by(order_by).limit(chunk_size)).scalars().all()
+        if not ids:
+            return None
+
+        rows = db.execute(archive_delete(and_(ShortUrl.id.in_(ids), condition))).all()
+        if rows:
+            db.execute(insert(ExpiredUrl), archive_rows(rows))
         db.commit()
-        return deleted_aliases
-
-    def get_by_long_url(self, long_url: str, db: Session):
-        return db.query(ShortUrl).filter(ShortUrl.longUrl == long_url).first()
-    
-    def move_to_expired(self, entry: ShortUrl, db: Session):
-        archived = ExpiredUrl(
-            shortUrl=entry.shortUrl,
-            longUrl=entry.longUrl,
-            timesVisited=entry.timesVisited,
-            createdAt=entry.createdAt,
-            lastVisited=entry.lastVisited,
-            expiresAt=entry.expiresAt,
-            owner_id=entry.owner_id
-        )
-        db.add(archived)
-    
\ No newline at end of file
+        return [row.shortUrl for row in rows]
+
+    def backfill_long_url_hashes(self, db: Session, chunk_size: int = 1000) -> int:
+        # Заполняет long_url_hash у строк, созданных до появления колонки
+        total = 0
+        while True:
+            rows = db.execute(
+                select(ShortUrl.id, ShortUrl.longUrl).where(ShortUrl.longUrlHash.is_(None)).limit(chunk_size)
+            ).all()
+            if not rows:
+                return total
+            db.execute(
+                update(ShortUrl.__table__)
+                .where(ShortUrl.__table__.c.id == bindparam("row_id"))
+                .values(long_url_hash=bindparam("row_hash")),
+                [{"row_id": row.id, "row_hash": long_url_hash(row.longUrl)} for row in rows]
+            )
+            db.commit()
+            total += len(rows)
@@ -0,0 +1,49 @@
+from Database.redis import get_async_redis_client
+from Monitoring.metrics import instrumented
+
+# Token bucket: пополнение rate токенов в секунду до capacity, выдача до requested токенов разом.
+# Время берётся из Redis (TIME) — часы воркеров не влияют на лимит.
+# Возвращает {выдано, через сколько секунд появится токен (строкой: Lua отбрасывает дробную часть чисел)}.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+-- Ключ живёт, пока корзина не наполнится снова
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+
+local retry_after = 0
+if granted == 0 then
+    retry_after = (1 - tokens) / rate
+end
+return {granted, tostring(retry_after)}
+"""
+
+
+def bucket_key(rule: str, identity: str) -> str:
+    # Hash tag: корзина целиком на одном узле Redis
+    return f"rl:{{{rule}:{identity}}}"
+
+
+@instrumented
+class RateLimitManager:
+
+    def __init__(self):
+        self.redis = get_async_redis_client()
+        # EVALSHA, при отсутствии скрипта в кэше Redis — EVAL с повторной загрузкой
+        self.token_bucket = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self, key: str, rate: float, capacity: int, requested: int) -> tuple[int, float]:
+        """Одна атомарная проверка: (выданные токены, секунд до следующего токена)."""
+        granted, retry_after = await self.token_bucket(keys=[key], args=[rate, capacity, requested])
+        return int(granted), float(retry_after)
@@ -1,58 +1,68 @@
 from Database.redis import get_redis_client
-from Database.main_db import ShortUrl
+from Database.redis_ring import redis_ring
+from DbManager.LocalCacheManager import LocalCacheManager
+from DbManager.AliasFilterManager import AliasFilterManager
+from Monitoring.metrics import instrumented
 from datetime import datetime, timezone
 import json
 
+LIVE_TIME = 60 * 60 * 12
+
+
+def to_timestamp(dt: datetime | None) -> int | None:
+    if not dt:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def cache_ttl(expires_at: datetime | None, now: float | None = None) -> int:
+    # TTL в Redis не больше LIVE_TIME и не дольше срока жизни самой ссылки
+    if not expires_at:
+        return LIVE_TIME
+    now = now if now is not None else datetime.now(timezone.utc).timestamp()
+    return min(LIVE_TIME, int(to_timestamp(expires_at) - now))
+
+
+def encode_record(long_url: str, expires_at: datetime | None) -> str:
+    # Компактная запись "<expiresAt в секундах>|<longUrl>" — только то, что нужно редиректу
+    expires_ts = to_timestamp(expires_at)
+    return f"{expires_ts if expires_ts is not None else ''}|{long_url}"
+
+
+def decode_record(serialized: str) -> tuple[str, datetime | None]:
+    if serialized.startswith("{"):
+        # Старый JSON-формат, пока ключи не перезаписаны
+        data = json.loads(serialized)
+        expires_at = data.get("expiresAt")
+        if expires_at:
+            expires_at = datetime.fromisoformat(expires_at.replace("Z", "+00:00"))
+        return data["longUrl"], expires_at
+
+    expires_ts, long_url = serialized.split("|", 1)
+    expires_at = datetime.fromtimestamp(int(expires_ts), tz=timezone.utc) if expires_ts else None
+    return long_url, expires_at
+
+
+@instrumented
 class RedisDbManager:
-    LIVE_TIME = 60 * 60 * 12
+    LIVE_TIME = LIVE_TIME
 
     def __init__(self):
+        # Записи ссылок — на узлах кольца, pub/sub — на основном Redis
         self.redis = get_redis_client()
+        self.ring = redis_ring
 
-    def save(self, short_url: ShortUrl):
-
-        def format_dt(dt: datetime | None) -> str | None:
-            if not dt:
-                return None
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
-
-        data = {
-            "shortUrl": short_url.shortUrl,
-            "longUrl": short_url.longUrl,
-            "timesVisited": short_url.timesVisited,
-            "createdAt": format_dt(short_url.createdAt),
-            "lastVisited": format_dt(short_url.lastVisited),
-            "expiresAt": format_dt(short_url.expiresAt)
-        }
-        serialized = json.dumps(data)
-        self.redis.set(short_url.shortUrl, serialized)
-        self.redis.expire(short_url.shortUrl, self.LIVE_TIME)
-
-    def get(self, short_url: str):
-        serialized = self.redis.get(short_url)
-        if not serialized:
-            return None
-        
-        data = json.loads(serialized)
-        
-        # Создание объекта ShortUrl
-        def parse_dt(iso_str: str | None) -> datetime | None:
-            if not iso_str:
-                return None
-            if iso_str.endswith("Z"):
-                iso_str = iso_str.replace("Z", "+00:00")
-            return datetime.fromisoformat(iso_str).astimezone(timezone.utc)
-
-        return ShortUrl(
-            shortUrl=data["shortUrl"],
-            longUrl=data["longUrl"],
-            timesVisited=data["timesVisited"],
-            createdAt=parse_dt(data["createdAt"]),
-            lastVisited=parse_dt(data["lastVisited"]),
-            expiresAt=parse_dt(data["expiresAt"])
-        )
-    
-    def delete(self, short_url: str):
-        self.redis.delete(short_url)
\ No newline at end of file
+    def publish_filter_update(self, message: str):
+        self.redis.publish(AliasFilterManager.CHANNEL, message)
+
+    def delete_many(self, short_urls: list[str], batch_size: int = 500):
+        # Удаление ключей — по pipeline на узел, рассылка инвалидаций — одним pipeline на основной Redis
+        for start in range(0, len(short_urls), batch_size):
+            batch = short_urls[start:start + batch_size]
+            self.ring.pipeline(batch, lambda pipe, keys: pipe.delete(*keys), for_delete=True)
+            pipe = self.redis.pipeline(transaction=False)
+            for short_url in batch:
+                pipe.publish(LocalCacheManager.INVALIDATION_CHANNEL, short_url)
+            pipe.execute()
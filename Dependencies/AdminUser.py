@@ -0,0 +1,17 @@
+from fastapi import Depends, HTTPException
+
+from Database.main_db import User
+from Dependencies.AuthScheme import optional_oauth2_scheme
+from service.AuthService import AuthService
+
+auth_service = AuthService()
+
+
+async def get_admin_user(token: str = Depends(optional_oauth2_scheme)) -> User:
+    """Доступ к /admin/* — только для email из ADMIN_EMAILS."""
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user = await auth_service.get_current_user_async(token)
+    if not auth_service.is_admin(user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
@@ -0,0 +1,112 @@
+from prometheus_client import REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from Database.main_db import engine, async_engine
+from Database.sqlite_writer import writer_queue
+from Database.replicas import replica_router
+from Database.redis_ring import redis_ring
+from DbManager.LocalCacheManager import local_cache
+from DbManager.AliasFilterManager import alias_filter
+from DbManager.AuthCacheManager import auth_cache
+from service.VisitAggregator import visit_aggregator
+from service.ClickAnalytics import click_analytics
+from service.HotLinkTracker import hot_link_tracker
+from service.RateLimiter import rate_limiter
+from service.ExpiryScheduler import expiry_scheduler
+from service.PasswordHasher import password_hasher
+
+
+class RuntimeCollector:
+    """
+    Состояние кэшей, пулов и фоновых очередей снимается в момент scrape:
+    на горячем пути ничего дополнительно не считается.
+    """
+
+    def collect(self):
+        cache = local_cache.stats()
+        yield GaugeMetricFamily("l1_cache_entries", "Entries in the worker L1 cache", value=cache["size"])
+        yield GaugeMetricFamily("l1_cache_pinned", "Hot links pinned in the worker L1 cache", value=cache["pinned"])
+        yield GaugeMetricFamily(
+            "hot_link_candidates", "Heavy-hitter candidates tracked this minute", value=hot_link_tracker.candidate_count()
+        )
+        yield GaugeMetricFamily("l1_cache_hit_ratio", "L1 cache hit ratio since start", value=cache["hitRatio"])
+        lookups = CounterMetricFamily("l1_cache_lookups", "L1 cache lookups", labels=["result"])
+        lookups.add_metric(["hit"], cache["hits"])
+        lookups.add_metric(["miss"], cache["misses"])
+        yield lookups
+        evictions = CounterMetricFamily("l1_cache_removals", "Entries removed from the L1 cache", labels=["reason"])
+        for reason in ("evictions", "expirations", "invalidations"):
+            evictions.add_metric([reason], cache[reason])
+        yield evictions
+
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "DB connections in use", labels=["engine"])
+        pool_size = GaugeMetricFamily("db_pool_size", "DB pool size", labels=["engine"])
+        overflow = GaugeMetricFamily("db_pool_overflow", "DB connections above pool size", labels=["engine"])
+        pools = [("sync", engine.pool), ("async", async_engine.sync_engine.pool)]
+        for replica in replica_router.replicas:
+            pools.append((f"{replica.name} async", replica.async_engine.sync_engine.pool))
+        for name, pool in pools:
+            # У SingletonThreadPool/NullPool нет счётчиков QueuePool
+            if hasattr(pool, "checkedout"):
+                checked_out.add_metric([name], pool.checkedout())
+                pool_size.add_metric([name], pool.size())
+                overflow.add_metric([name], max(0, pool.overflow()))
+        yield checked_out
+        yield pool_size
+        yield overflow
+
+        replicas = replica_router.stats()
+        replica_healthy = GaugeMetricFamily("db_replica_healthy", "Replica passed the last health check", labels=["replica"])
+        replica_reads = CounterMetricFamily("db_reads", "Routed reads by target", labels=["target"])
+        replica_reads.add_metric(["primary"], replicas["primaryReads"])
+        for replica in replicas["replicas"]:
+            replica_healthy.add_metric([replica["name"]], int(replica["healthy"]))
+            replica_reads.add_metric([replica["name"]], replica["reads"])
+        yield replica_healthy
+        yield replica_reads
+
+        redis_alive = GaugeMetricFamily("redis_node_alive", "Cache Redis node is in the hash ring", labels=["node"])
+        for node in redis_ring.nodes.values():
+            redis_alive.add_metric([node.name], int(node.alive))
+        yield redis_alive
+
+        queues = GaugeMetricFamily("background_queue_depth", "Items waiting in background tasks", labels=["queue"])
+        queues.add_metric(["visits"], visit_aggregator.pending_count())
+        queues.add_metric(["expiry"], expiry_scheduler.pending())
+        queues.add_metric(["password_hash"], password_hasher.in_flight)
+        queues.add_metric(["sqlite_writers"], writer_queue.waiting)
+        queues.add_metric(["clicks"], click_analytics.pending_count())
+        yield queues
+        yield GaugeMetricFamily(
+            "rate_limit_local_keys", "Rate limit buckets with local leases or rejections", value=rate_limiter.local_keys()
+        )
+        yield CounterMetricFamily(
+            "rate_limit_redis_errors", "Rate limit checks allowed because Redis failed", value=rate_limiter.redis_errors
+        )
+        yield CounterMetricFamily(
+            "analytics_dropped_clicks", "Clicks dropped because the analytics buffer was full", value=click_analytics.dropped
+        )
+
+        filter_stats = alias_filter.stats()
+        yield GaugeMetricFamily("alias_filter_items", "Aliases in the Bloom filter", value=filter_stats["items"])
+        filter_checks = CounterMetricFamily("alias_filter_checks", "Alias filter lookups", labels=["result"])
+        filter_checks.add_metric(["definite_miss"], filter_stats["definiteMisses"])
+        filter_checks.add_metric(["negative_cache_hit"], filter_stats["negativeCacheHits"])
+        filter_checks.add_metric(["false_positive"], filter_stats["falsePositives"])
+        yield filter_checks
+
+        auth = auth_cache.stats()
+        auth_lookups = CounterMetricFamily("auth_cache_lookups", "Token and user cache lookups", labels=["cache", "result"])
+        auth_lookups.add_metric(["token", "hit"], auth["tokenHits"])
+        auth_lookups.add_metric(["token", "miss"], auth["tokenMisses"])
+        auth_lookups.add_metric(["user", "hit"], auth["userHits"])
+        auth_lookups.add_metric(["user", "miss"], auth["userMisses"])
+        yield auth_lookups
+        yield GaugeMetricFamily(
+            "auth_revocation_listener_healthy", "1 if token revocations are received over pub/sub",
+            value=1 if auth["healthy"] else 0
+        )
+
+
+runtime_collector = RuntimeCollector()
+REGISTRY.register(runtime_collector)
@@ -0,0 +1,117 @@
+import functools
+import inspect
+import logging
+import os
+import time
+
+from prometheus_client import Counter, Histogram
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Редирект из кэша — доли миллисекунды, очистка и bulk-вставки — секунды
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+LAYER_LATENCY = Histogram(
+    "layer_call_duration_seconds", "Latency of DB and Redis manager calls",
+    ["layer", "operation"], buckets=LATENCY_BUCKETS
+)
+LAYER_ERRORS = Counter(
+    "layer_call_errors_total", "Manager calls that raised an exception", ["layer", "operation"]
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "Redirect lookups by cache level and result", ["cache", "result"]
+)
+CLEANER_RUN_SECONDS = Histogram(
+    "cleaner_run_duration_seconds", "Duration of cleaner runs",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120)
+)
+CLEANER_ARCHIVED = Counter("cleaner_archived_urls_total", "URLs archived by the cleaner", ["reason"])
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds", "bcrypt hash/verify time including pool queue wait",
+    ["operation"], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)
+)
+RATE_LIMITED = Counter("rate_limited_requests_total", "Requests rejected with 429 by route", ["route"])
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total", "Hash/verify requests rejected because the pool was saturated", ["operation"]
+)
+
+
+def setup_logging():
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+
+def timed(layer: str, operation: str):
+    """Замеряет время вызова; дочерние метрики создаются один раз, а не на каждом вызове."""
+    histogram = LAYER_LATENCY.labels(layer, operation)
+    errors = LAYER_ERRORS.labels(layer, operation)
+
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    errors.inc()
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+
+    return decorate
+
+
+def instrumented(cls):
+    """Оборачивает публичные методы менеджера в timed(), layer — имя класса."""
+    for name, method in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(method) or inspect.isasyncgenfunction(method):
+            continue
+        setattr(cls, name, timed(cls.__name__, name)(method))
+    return cls
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: время запроса по шаблону маршрута, а не по конкретному пути."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Роутер кладёт найденный маршрут в тот же scope
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"], route.path if route else "unmatched", str(status)
+            ).observe(time.perf_counter() - started)
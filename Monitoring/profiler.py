@@ -0,0 +1,166 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SamplingProfiler:
+    """
+    Статистический профайлер воркера: отдельный поток раз в interval снимает стеки
+    всех потоков через sys._current_frames(). Код приложения не трассируется, поэтому
+    накладные расходы не зависят от нагрузки, а event loop ни на чём не ждёт.
+
+    Маршрут сэмпла определяется по кадру ProfilerMiddleware в стеке: middleware
+    регистрирует свой кадр только пока идёт сессия. Синхронные маршруты выполняются
+    в пуле потоков без этого кадра и попадают в профиль без маршрута.
+    """
+    MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", 60))
+    MIN_INTERVAL = 0.001
+
+    def __init__(self):
+        self.active = False
+        # кадр ProfilerMiddleware.__call__ -> ASGI scope запроса
+        self._requests: dict = {}
+        self._session_lock = threading.Lock()
+
+    def enter_request(self, frame, scope):
+        self._requests[frame] = scope
+
+    def exit_request(self, frame):
+        self._requests.pop(frame, None)
+
+    def _route_of(self, frame) -> str | None:
+        requests = self._requests
+        while frame is not None:
+            scope = requests.get(frame)
+            if scope is not None:
+                route = scope.get("route")
+                return f"{scope['method']} {route.path if route else scope['path']}"
+            frame = frame.f_back
+        return None
+
+    @staticmethod
+    def _frame_key(frame) -> tuple[str, str, int]:
+        code = frame.f_code
+        return getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno
+
+    def sample(self, seconds: float, interval: float, route: str | None = None) -> dict:
+        """Блокирующий сбор профиля — вызывать из отдельного потока."""
+        if not self._session_lock.acquire(blocking=False):
+            raise RuntimeError("Profiling session already running")
+        try:
+            seconds = min(seconds, self.MAX_SECONDS)
+            interval = max(interval, self.MIN_INTERVAL)
+            own_thread = threading.get_ident()
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            # (поток, маршрут, стек от корня к листу) -> число сэмплов
+            stacks: Counter = Counter()
+            samples = 0
+
+            self.active = True
+            started = time.perf_counter()
+            deadline = started + seconds
+            while time.perf_counter() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    sample_route = self._route_of(frame)
+                    if route and sample_route != route:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(self._frame_key(frame))
+                        frame = frame.f_back
+                    stack.reverse()
+                    if thread_id not in thread_names:
+                        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    stacks[(thread_names.get(thread_id, str(thread_id)), sample_route, tuple(stack))] += 1
+                samples += 1
+                time.sleep(interval)
+
+            return {
+                "seconds": time.perf_counter() - started,
+                "interval": interval,
+                "samples": samples,
+                "stacks": stacks
+            }
+        finally:
+            self.active = False
+            self._requests.clear()
+            self._session_lock.release()
+
+    @staticmethod
+    def to_collapsed(profile: dict) -> str:
+        """Формат flamegraph.pl / speedscope: "поток;маршрут;f1;f2 count"."""
+        lines = []
+        for (thread, route, stack), count in profile["stacks"].items():
+            names = [thread] + ([route] if route else []) + [
+                f"{name} ({os.path.basename(filename)}:{line})" for name, filename, line in stack
+            ]
+            lines.append(f"{';'.join(name.replace(';', ':') for name in names)} {count}")
+        return "".join(f"{line}\n" for line in sorted(lines))
+
+    @staticmethod
+    def to_speedscope(profile: dict, name: str = "url-shortener") -> dict:
+        frames = []
+        frame_index: dict = {}
+
+        def index_of(key) -> int:
+            if key not in frame_index:
+                frame_index[key] = len(frames)
+                frame_name, filename, line = key
+                frame = {"name": frame_name}
+                if filename:
+                    frame.update(file=filename, line=line)
+                frames.append(frame)
+            return frame_index[key]
+
+        # Отдельный профиль на поток, маршрут — корневой кадр сэмпла
+        per_thread: dict[str, tuple[list, list]] = {}
+        for (thread, route, stack), count in profile["stacks"].items():
+            samples, weights = per_thread.setdefault(thread, ([], []))
+            keys = ([(route, "", 0)] if route else []) + list(stack)
+            samples.append([index_of(key) for key in keys])
+            weights.append(count * profile["interval"])
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "url-shortener sampling profiler",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": thread,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights
+                }
+                for thread, (samples, weights) in per_thread.items()
+            ]
+        }
+
+
+class ProfilerMiddleware:
+    """Помечает кадр обработки запроса, пока профайлер активен; иначе — одна проверка флага."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.active:
+            await self.app(scope, receive, send)
+            return
+
+        frame = sys._getframe()
+        profiler.enter_request(frame, scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.exit_request(frame)
+
+
+profiler = SamplingProfiler()
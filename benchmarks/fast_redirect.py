@@ -0,0 +1,56 @@
+"""
+Пропускная способность редиректов с FastRedirectMiddleware и без неё (FAST_REDIRECT=0/1).
+Каждый вариант — отдельный запуск benchmarks.loadtest со смесью redirect=1;
+в таблице — запросы в секунду на один воркер uvicorn и прирост от fast path.
+
+Запуск:
+    python -m benchmarks.fast_redirect
+    python -m benchmarks.fast_redirect --workers 4 --duration 30
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.db_backends import run_scenario
+
+VARIANTS = {
+    "router": {"FAST_REDIRECT": "0"},
+    "fast-path": {"FAST_REDIRECT": "1"}
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redirect throughput with and without the ASGI fast path")
+    parser.add_argument("--server", choices=("inprocess", "uvicorn"), default="uvicorn")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--redis", choices=("fake", "spawn", "env"), default="fake")
+    parser.add_argument("--database-url", help="DATABASE_URL; by default a fresh SQLite database")
+    parser.add_argument("--links", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = {}
+    for name, extra_env in VARIANTS.items():
+        print(f"{name}: redirect...", file=sys.stderr)
+        results[name] = run_scenario(args, args.database_url, extra_env, "redirect=1")["redirect"]
+        results[name]["throughputPerWorker"] = results[name]["throughput"] / args.workers
+    baseline = results["router"]["throughputPerWorker"]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'variant':<12}{'req/s/worker':>14}{'gain':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in results.items():
+        gain = result["throughputPerWorker"] / baseline - 1 if baseline else 0.0
+        print(
+            f"{name:<12}{result['throughputPerWorker']:>14.1f}{gain:>+9.1%}{result['errors']:>8}"
+            f"{result['p50Ms']:>10.2f}{result['p95Ms']:>10.2f}{result['p99Ms']:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
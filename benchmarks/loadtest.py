@@ -0,0 +1,404 @@
+"""
+Нагрузочный тест сервиса: редиректы с Zipf-распределением популярности, всплески
+сокращений, чтение статистики и запуски очистки. Считает p50/p95/p99 и пропускную
+способность по маршрутам, пишет JSON и сравнивает его с сохранённым baseline.
+
+Запуск (из корня репозитория, нужен httpx; для --redis fake — fakeredis):
+    python -m benchmarks.loadtest --redis fake                          # приложение в этом процессе
+    python -m benchmarks.loadtest --server uvicorn --workers 4          # uvicorn в отдельном процессе
+    python -m benchmarks.loadtest --server external --target http://localhost:8000
+
+    python -m benchmarks.loadtest --redis fake --output run.json --save-baseline benchmarks/baseline.json
+    python -m benchmarks.loadtest --redis fake --baseline benchmarks/baseline.json   # код 1 при регрессии
+
+SQLite-база создаётся во временном каталоге, рабочая urls.db не трогается;
+--database-url направляет приложение в другую БД (например, PostgreSQL).
+Сравнение бэкендов — benchmarks/db_backends.py.
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+ENDPOINTS = ("redirect", "shorten", "stats", "cleaner")
+# Ответы, которые считаются успешными для каждой операции
+EXPECTED_STATUS = {"redirect": {302, 307}, "shorten": {200}, "stats": {200}}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_redis(kind: str) -> tuple[int | None, object]:
+    """Поднимает Redis для теста и возвращает (порт, хэндл для остановки)."""
+    if kind == "env":
+        return None, None
+    port = free_port()
+    if kind == "fake":
+        import fakeredis
+        server = fakeredis.TcpFakeServer(("127.0.0.1", port))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return port, server
+    if kind == "spawn":
+        binary = shutil.which("redis-server")
+        if not binary:
+            raise SystemExit("redis-server not found in PATH, use --redis fake")
+        process = subprocess.Popen(
+            [binary, "--port", str(port), "--save", "", "--appendonly", "no"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        return port, process
+    raise SystemExit(f"Unknown --redis '{kind}'")
+
+
+def stop_redis(handle):
+    if handle is None:
+        return
+    if isinstance(handle, subprocess.Popen):
+        handle.terminate()
+        handle.wait()
+    else:
+        handle.shutdown()
+        handle.server_close()
+
+
+class ZipfSampler:
+    """Выбор i-го алиаса с вероятностью ~ 1 / i^s: немного горячих ссылок и длинный хвост."""
+
+    def __init__(self, items: list[str], exponent: float, rng: random.Random):
+        self.items = items
+        self.rng = rng
+        self.cum_weights = list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, len(items) + 1)))
+
+    def sample(self) -> str:
+        point = self.rng.random() * self.cum_weights[-1]
+        return self.items[bisect.bisect_left(self.cum_weights, point)]
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    # Nearest-rank: значение, не превышенное долей q наблюдений
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(q * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {name: [] for name in ENDPOINTS}
+        self.errors: dict[str, int] = {name: 0 for name in ENDPOINTS}
+
+    def record(self, name: str, seconds: float, ok: bool):
+        self.latencies[name].append(seconds)
+        if not ok:
+            self.errors[name] += 1
+
+    def summary(self, duration: float) -> dict:
+        result = {}
+        for name in ENDPOINTS:
+            values = sorted(self.latencies[name])
+            if not values:
+                continue
+            result[name] = {
+                "requests": len(values),
+                "errors": self.errors[name],
+                "throughput": len(values) / duration,
+                "p50Ms": percentile(values, 0.50) * 1000,
+                "p95Ms": percentile(values, 0.95) * 1000,
+                "p99Ms": percentile(values, 0.99) * 1000,
+                "maxMs": values[-1] * 1000
+            }
+        return result
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, args, run_cleaner=None):
+        self.client = client
+        self.args = args
+        self.run_cleaner = run_cleaner
+        self.rng = random.Random(args.seed)
+        self.recorder = Recorder()
+        self.aliases: list[str] = []
+        self.sampler: ZipfSampler | None = None
+        self.mix = parse_mix(args.mix)
+        self.url_counter = itertools.count()
+
+    def next_url(self) -> str:
+        return f"https://example.com/load/{next(self.url_counter)}/{self.rng.randrange(10 ** 9)}"
+
+    async def seed(self):
+        """Создаёт исходный набор ссылок через bulk-эндпоинт."""
+        remaining = self.args.links
+        while remaining > 0:
+            size = min(remaining, 1000)
+            response = await self.client.post(
+                "/links/shorten/bulk", json=[{"url": self.next_url()} for _ in range(size)]
+            )
+            response.raise_for_status()
+            self.aliases.extend(item["url"] for item in response.json()["results"] if item["status"] == 201)
+            remaining -= size
+        # Порядок популярности не должен совпадать с порядком создания
+        self.rng.shuffle(self.aliases)
+        self.sampler = ZipfSampler(self.aliases, self.args.zipf, self.rng)
+
+    async def timed(self, name: str, request):
+        started = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code in EXPECTED_STATUS[name]
+        except httpx.HTTPError:
+            ok = False
+        self.recorder.record(name, time.perf_counter() - started, ok)
+
+    async def redirect(self):
+        await self.timed("redirect", self.client.get(f"/links/{self.sampler.sample()}"))
+
+    async def shorten(self):
+        await self.timed("shorten", self.client.post("/links/shorten", json={"url": self.next_url()}))
+
+    async def stats(self):
+        await self.timed("stats", self.client.get(f"/links/{self.sampler.sample()}/stats"))
+
+    async def worker(self, deadline: float):
+        operations = [getattr(self, name) for name in self.mix]
+        weights = list(self.mix.values())
+        while time.perf_counter() < deadline:
+            await self.rng.choices(operations, weights)[0]()
+
+    async def bursts(self, deadline: float):
+        # Периодические пачки параллельных сокращений поверх основной нагрузки
+        while True:
+            await asyncio.sleep(self.args.burst_interval)
+            if time.perf_counter() >= deadline:
+                return
+            await asyncio.gather(*(self.shorten() for _ in range(self.args.burst_size)))
+
+    async def cleaner(self, deadline: float):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.args.cleaner_interval)
+            if time.perf_counter() >= deadline:
+                return
+            started = time.perf_counter()
+            try:
+                await loop.run_in_executor(None, self.run_cleaner)
+                ok = True
+            except Exception as e:
+                print(f"[LoadTest] Cleaner run failed: {e}")
+                ok = False
+            self.recorder.record("cleaner", time.perf_counter() - started, ok)
+
+    async def run(self) -> dict:
+        await self.seed()
+
+        # Прогрев кэшей — в результаты не попадает
+        warmup_deadline = time.perf_counter() + self.args.warmup
+        await asyncio.gather(*(self.worker(warmup_deadline) for _ in range(self.args.concurrency)))
+        self.recorder = Recorder()
+
+        started = time.perf_counter()
+        deadline = started + self.args.duration
+        tasks = [self.worker(deadline) for _ in range(self.args.concurrency)]
+        if self.args.burst_size and self.args.burst_interval:
+            tasks.append(self.bursts(deadline))
+        if self.run_cleaner and self.args.cleaner_interval:
+            tasks.append(self.cleaner(deadline))
+        await asyncio.gather(*tasks)
+        return self.recorder.summary(time.perf_counter() - started)
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, weight = part.split("=")
+        if name not in EXPECTED_STATUS:
+            raise SystemExit(f"Unknown operation '{name}' in --mix")
+        weights[name] = float(weight)
+    return weights
+
+
+async def run_in_process(args) -> dict:
+    from main import app
+    from Database.main_db import engine, async_engine
+    from Cleaner.cleaner import url_service
+
+    # Вывод SQL в консоль искажает замеры сильнее, чем сама нагрузка
+    engine.echo = False
+    async_engine.echo = False
+
+    def run_cleaner():
+        url_service.delete_expired(include_expired=False)
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            return await LoadTest(client, args, run_cleaner).run()
+
+
+async def run_against(args, base_url: str) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency + args.burst_size)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        # Очистку снаружи не запустить — её время меряется только в режиме inprocess
+        return await LoadTest(client, args).run()
+
+
+def start_uvicorn(args, workdir: str, env: dict) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{base_url}/admin/cache-stats", timeout=1)
+            return process, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("uvicorn did not start in 30 seconds")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Регрессия — рост p95/p99 или падение пропускной способности больше чем на tolerance."""
+    regressions = []
+    for name, current in results["endpoints"].items():
+        reference = baseline["endpoints"].get(name)
+        if not reference:
+            continue
+        for metric in ("p95Ms", "p99Ms"):
+            if current[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {reference[metric]:.2f} -> {current[metric]:.2f}")
+        if name != "cleaner" and current["throughput"] < reference["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name} throughput: {reference['throughput']:.1f} -> {current['throughput']:.1f} req/s"
+            )
+    return regressions
+
+
+def print_table(endpoints: dict):
+    print(f"{'endpoint':<10}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in endpoints.items():
+        print(
+            f"{name:<10}{result['requests']:>10}{result['errors']:>8}{result['throughput']:>10.1f}"
+            f"{result['p50Ms']:>10.2f}{result['p95Ms']:>10.2f}{result['p99Ms']:>10.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="URL shortener load test")
+    parser.add_argument("--server", choices=("inprocess", "uvicorn", "external"), default="inprocess")
+    parser.add_argument("--target", help="base URL for --server external")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--redis", choices=("fake", "spawn", "env"), default="fake",
+                        help="fakeredis TCP server, spawned redis-server or REDIS_HOST/REDIS_PORT")
+    parser.add_argument("--database-url", help="DATABASE_URL of the app (default: SQLite in a temp dir)")
+    parser.add_argument("--cache-nodes", type=int, default=0,
+                        help="extra Redis servers of the same kind for the alias cache ring (REDIS_NODES)")
+    parser.add_argument("--links", type=int, default=10000, help="links created before the run")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of alias popularity")
+    parser.add_argument("--mix", default="redirect=90,shorten=5,stats=5")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--burst-size", type=int, default=50)
+    parser.add_argument("--burst-interval", type=float, default=5)
+    parser.add_argument("--cleaner-interval", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="keep the app rate limits (all load comes from one IP and would be throttled)")
+    parser.add_argument("--output", help="write results JSON to this file")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline", help="store results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+    # В режиме inprocess рабочий каталог меняется на временный
+    for name in ("output", "baseline", "save_baseline"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    if args.cache_nodes and (args.server == "external" or args.redis == "env"):
+        raise SystemExit("--cache-nodes needs --redis fake or spawn; otherwise set REDIS_NODES yourself")
+    workdir = tempfile.mkdtemp(prefix="url-loadtest-")
+    redis_port, redis_handle = (None, None) if args.server == "external" else start_redis(args.redis)
+    cache_nodes = [start_redis(args.redis) for _ in range(args.cache_nodes)]
+    env = dict(os.environ)
+    if redis_port:
+        env.update(REDIS_HOST="127.0.0.1", REDIS_PORT=str(redis_port))
+    if cache_nodes:
+        env["REDIS_NODES"] = ",".join(f"127.0.0.1:{port}" for port, _ in cache_nodes)
+    if args.database_url:
+        env["DATABASE_URL"] = args.database_url
+    if not args.rate_limit:
+        env["RATE_LIMIT"] = "0"
+    server = None
+    try:
+        if args.server == "inprocess":
+            # Настройки Redis и путь к SQLite читаются при импорте приложения
+            os.environ.update(env)
+            os.chdir(workdir)
+            endpoints = asyncio.run(run_in_process(args))
+        elif args.server == "uvicorn":
+            env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH")]))
+            server, base_url = start_uvicorn(args, workdir, env)
+            endpoints = asyncio.run(run_against(args, base_url))
+        else:
+            if not args.target:
+                raise SystemExit("--target is required with --server external")
+            endpoints = asyncio.run(run_against(args, args.target))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        stop_redis(redis_handle)
+        for _, handle in cache_nodes:
+            stop_redis(handle)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "config": {
+            key: value for key, value in vars(args).items()
+            if key not in ("output", "baseline", "save_baseline", "target", "database_url")
+        },
+        # Только схема URL — без логина и пароля
+        "database": (args.database_url or "sqlite").split("://")[0],
+        "endpoints": endpoints
+    }
+    print_table(endpoints)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Микробенчмарк формата записи ссылки в Redis: старый JSON (SET + EXPIRE, разбор в ShortUrl)
+против компактной записи "<expiresAt>|<longUrl>" (SET ... EX, get_long_url).
+
+Запуск:
+    python -m benchmarks.redis_format                # Redis из REDIS_HOST/REDIS_PORT
+    python -m benchmarks.redis_format --fake         # fakeredis, без сервера
+"""
+import argparse
+import json
+import random
+import string
+import time
+from datetime import datetime, timedelta, timezone
+
+from Database.main_db import ShortUrl
+from DbManager.RedisDbManager import LIVE_TIME, encode_record, decode_record
+
+
+def legacy_format_dt(dt: datetime | None) -> str | None:
+    if not dt:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def legacy_parse_dt(iso_str: str | None) -> datetime | None:
+    if not iso_str:
+        return None
+    return datetime.fromisoformat(iso_str.replace("Z", "+00:00")).astimezone(timezone.utc)
+
+
+def legacy_encode(short_url: ShortUrl) -> str:
+    return json.dumps({
+        "shortUrl": short_url.shortUrl,
+        "longUrl": short_url.longUrl,
+        "timesVisited": short_url.timesVisited,
+        "createdAt": legacy_format_dt(short_url.createdAt),
+        "lastVisited": legacy_format_dt(short_url.lastVisited),
+        "expiresAt": legacy_format_dt(short_url.expiresAt)
+    })
+
+
+def legacy_decode(serialized: str) -> ShortUrl:
+    data = json.loads(serialized)
+    return ShortUrl(
+        shortUrl=data["shortUrl"],
+        longUrl=data["longUrl"],
+        timesVisited=data["timesVisited"],
+        createdAt=legacy_parse_dt(data["createdAt"]),
+        lastVisited=legacy_parse_dt(data["lastVisited"]),
+        expiresAt=legacy_parse_dt(data["expiresAt"])
+    )
+
+
+def make_links(count: int) -> list[ShortUrl]:
+    now = datetime.now(timezone.utc)
+    links = []
+    for i in range(count):
+        path = "".join(random.choices(string.ascii_lowercase, k=random.randint(10, 60)))
+        links.append(ShortUrl(
+            shortUrl=f"bench{i:06d}",
+            longUrl=f"https://example.com/{path}",
+            timesVisited=random.randint(0, 10000),
+            createdAt=now,
+            lastVisited=now,
+            expiresAt=now + timedelta(days=1) if i % 2 else None
+        ))
+    return links
+
+
+def memory_usage(client, keys: list[str]) -> float | None:
+    try:
+        return sum(client.memory_usage(key) or 0 for key in keys) / len(keys)
+    except Exception:
+        # fakeredis и часть managed-инсталляций не поддерживают MEMORY USAGE
+        return None
+
+
+def bench_legacy(client, links: list[ShortUrl]) -> dict:
+    start = time.perf_counter()
+    for link in links:
+        client.set(link.shortUrl, legacy_encode(link))
+        client.expire(link.shortUrl, LIVE_TIME)
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for link in links:
+        legacy_decode(client.get(link.shortUrl)).longUrl
+    read_time = time.perf_counter() - start
+
+    keys = [link.shortUrl for link in links]
+    return {
+        "valueBytes": sum(len(client.get(key).encode()) for key in keys) / len(keys),
+        "memoryBytes": memory_usage(client, keys),
+        "writeOpsPerSec": len(links) / write_time,
+        "readOpsPerSec": len(links) / read_time
+    }
+
+
+def bench_compact(client, links: list[ShortUrl]) -> dict:
+    start = time.perf_counter()
+    for link in links:
+        client.set(link.shortUrl, encode_record(link.longUrl, link.expiresAt), ex=LIVE_TIME)
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for link in links:
+        decode_record(client.get(link.shortUrl))[0]
+    read_time = time.perf_counter() - start
+
+    keys = [link.shortUrl for link in links]
+    return {
+        "valueBytes": sum(len(client.get(key).encode()) for key in keys) / len(keys),
+        "memoryBytes": memory_usage(client, keys),
+        "writeOpsPerSec": len(links) / write_time,
+        "readOpsPerSec": len(links) / read_time
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis record format micro-benchmark")
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--fake", action="store_true", help="use fakeredis instead of a real server")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    if args.fake:
+        import fakeredis
+        client = fakeredis.FakeStrictRedis(decode_responses=True)
+    else:
+        from Database.redis import get_redis_client
+        client = get_redis_client()
+
+    links = make_links(args.keys)
+    results = {}
+    for name, bench in (("json", bench_legacy), ("compact", bench_compact)):
+        client.delete(*[link.shortUrl for link in links])
+        results[name] = bench(client, links)
+    client.delete(*[link.shortUrl for link in links])
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'format':<10}{'value B/key':>14}{'memory B/key':>15}{'write op/s':>14}{'read op/s':>14}")
+    for name, result in results.items():
+        memory = f"{result['memoryBytes']:.1f}" if result["memoryBytes"] is not None else "n/a"
+        print(
+            f"{name:<10}{result['valueBytes']:>14.1f}{memory:>15}"
+            f"{result['writeOpsPerSec']:>14.0f}{result['readOpsPerSec']:>14.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
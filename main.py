@@ -2,22 +2,83 @@ from fastapi import FastAPI
 from fastapi import Request
 from contextlib import asynccontextmanager
 import asyncio
+import logging
 
-from router.UrlRouter import router
+from router.UrlRouter import router, async_url_service
 from router.AuthRouter import router as auth_router
-from Cleaner.cleaner import periodic_expired_cleanup
+from router.MetricsRouter import router as metrics_router
+from router.FastRedirect import FAST_REDIRECT, FastRedirectMiddleware
+from Cleaner.cleaner import periodic_expired_cleanup, backfill_url_hashes
+from service.VisitAggregator import visit_aggregator
+from service.ClickAnalytics import click_analytics
+from service.HotLinkTracker import hot_link_tracker
+from service.CacheWarmup import cache_warmup
+from Database.main_db import async_engine
+from Database.migrations import AUTO_MIGRATE, run_migrations
+from Database.replicas import replica_router
+from Database.redis_ring import redis_ring
+from DbManager.LocalCacheManager import local_cache
+from DbManager.AliasFilterManager import alias_filter
+from DbManager.AuthCacheManager import auth_cache
+from service.ExpiryScheduler import expiry_scheduler
+from service.PasswordHasher import password_hasher
+from Monitoring.metrics import setup_logging, MetricsMiddleware
+from Monitoring.profiler import ProfilerMiddleware
+# Регистрирует сборщик состояния кэшей и очередей для /metrics
+import Monitoring.collectors
+
+setup_logging()
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Схема нужна фоновым задачам ниже; при AUTO_MIGRATE=0 — python -m Database.migrations
+    if AUTO_MIGRATE:
+        logger.info(f"Database schema version {run_migrations()}.")
+    # Прогрев Redis идёт в фоне: воркер готов принимать запросы, не дожидаясь его
+    cache_warmup.start()
     # Запуск фоновой задачи
-    task = asyncio.create_task(periodic_expired_cleanup(3600))
-    print("[Lifespan] Background cleaner started.")
+    task = asyncio.create_task(periodic_expired_cleanup())
+    logger.info("Background cleaner started.")
+    backfill_task = asyncio.create_task(backfill_url_hashes())
+    visit_aggregator.start()
+    click_analytics.start()
+    hot_link_tracker.start()
+    invalidation_task = asyncio.create_task(local_cache.listen_invalidations())
+    # Фильтр алиасов строится из БД при подписке на канал обновлений
+    filter_task = asyncio.create_task(alias_filter.listen_updates(async_url_service.rebuild_alias_filter))
+    revocation_task = asyncio.create_task(auth_cache.listen_revocations())
+    replica_health_task = asyncio.create_task(replica_router.run_health_checks())
+    redis_health_task = asyncio.create_task(redis_ring.run_health_checks())
+    expiry_scheduler.start()
     yield
+    cache_warmup.stop()
+    invalidation_task.cancel()
+    filter_task.cancel()
+    revocation_task.cancel()
+    replica_health_task.cancel()
+    redis_health_task.cancel()
+    await expiry_scheduler.stop()
     # Здесь можно завершить задачу по shutdown, если надо
     task.cancel()
-    print("[Lifespan] Shutting down cleaner.")
+    backfill_task.cancel()
+    logger.info("Shutting down cleaner.")
+    # Дописываем накопленные переходы в БД
+    await visit_aggregator.stop()
+    logger.info("Pending visits flushed.")
+    await click_analytics.stop()
+    await hot_link_tracker.stop()
+    password_hasher.shutdown()
+    await async_engine.dispose()
+    await replica_router.dispose()
 
 app = FastAPI(lifespan=lifespan)
+# Добавляется первым — внутри метрик и профайлера, они видят и быстрые редиректы
+if FAST_REDIRECT:
+    app.add_middleware(FastRedirectMiddleware)
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(router)
-app.include_router(auth_router)
\ No newline at end of file
+app.include_router(auth_router)
+app.include_router(metrics_router)
\ No newline at end of file
@@ -1,31 +1,32 @@
+import logging
+
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Query, status
 
-from Database.main_db import SessionLocal
 from DataClasses.DataClasses import UserCreateDC, TokenDC
 from service.AuthService import AuthService
+from service.DumpService import dump_service
+from service.RateLimiter import rate_limiter, client_host
 from Dependencies.AuthScheme import optional_oauth2_scheme
+from Dependencies.AdminUser import get_admin_user
+from Database.main_db import User
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 auth_service = AuthService()
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+logger = logging.getLogger(__name__)
 
 @router.post("/register", response_model=TokenDC)
-def register(user: UserCreateDC, db: Session = Depends(get_db)):
-    return auth_service.register_user(user, db)
+async def register(user: UserCreateDC, request: Request):
+    await rate_limiter.check("register", client_host(request))
+    return await auth_service.register_user(user)
 
 @router.post("/login", response_model=TokenDC)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    # До bcrypt: перебор паролей упирается в лимит, а не в пул хэширования
+    await rate_limiter.check("login", client_host(request))
     user_data = UserCreateDC(email=form_data.username, password=form_data.password)
-    return auth_service.login_user(user_data, db)
+    return await auth_service.login_user(user_data)
 
 @router.post("/logout")
 def logout(token: str = Depends(optional_oauth2_scheme)):
@@ -34,8 +35,7 @@ def logout(token: str = Depends(optional_oauth2_scheme)):
 
 @router.get("/check-token")
 def check_token(token: str = Depends(optional_oauth2_scheme)):
-    print("==== TOKEN ====")
-    print(token)
+    logger.debug(f"Token check, token present: {bool(token)}")
     try:
         if auth_service.is_token_blacklisted(token):
             return {"valid": False}
@@ -48,5 +48,10 @@ def check_token(token: str = Depends(optional_oauth2_scheme)):
         return {"valid": False}
 
 @router.get("/admin/users")
-def get_all_users(db: Session = Depends(get_db)):
-    return auth_service.get_all_users(db)
\ No newline at end of file
+async def get_all_users(
+    cursor: str | None = None,
+    limit: int | None = Query(None, gt=0),
+    format: str = Query("json", pattern="^(json|ndjson|csv)$"),
+    admin: User = Depends(get_admin_user)
+):
+    return await dump_service.dump("users", format, cursor, limit)
\ No newline at end of file
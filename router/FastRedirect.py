@@ -0,0 +1,90 @@
+import logging
+import os
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.exception_handlers import http_exception_handler
+from fastapi.exceptions import HTTPException
+
+from router.UrlRouter import router, async_url_service, get_full_url
+from service.ClickAnalytics import visitor_id
+from service.RateLimiter import rate_limiter, client_address
+
+logger = logging.getLogger(__name__)
+
+# Редиректы в обход роутинга FastAPI; 0 — все запросы идут обычным путём
+FAST_REDIRECT = os.getenv("FAST_REDIRECT", "1") == "1"
+
+# Те же символы, что оставляет без кодирования starlette RedirectResponse
+LOCATION_SAFE = ":/%#?=@[]!$&'()*+,;~"
+
+
+def find_redirect_route():
+    """Маршрут редиректа и статические пути /links/..., объявленные до него (search, mine)."""
+    shadowing = set()
+    for route in router.routes:
+        if route.endpoint is get_full_url:
+            return route, shadowing
+        if "GET" in route.methods and "{" not in route.path:
+            shadowing.add(route.path)
+    raise RuntimeError("Redirect route is not registered")
+
+
+class FastRedirectMiddleware:
+    """
+    ASGI-middleware для GET /links/{short_url}: алиас разрешается через AsyncUrlService
+    (локальный кэш -> Redis -> БД), 302 пишется прямо в send — без роутинга, зависимостей
+    и сборки RedirectResponse. Путь сверяется тем же регулярным выражением, что и у маршрута;
+    всё остальное (в том числе /links/search, /links/mine, /links/{short_url}/stats) уходит в приложение.
+    Ответы совпадают с обычным маршрутом, включая 404 и заголовок Location.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.route, self.shadowing = find_redirect_route()
+        self.match = self.route.path_regex.match
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            # За прокси с root_path путь разбирает сам Starlette
+            or scope.get("root_path")
+            or scope["path"] in self.shadowing
+        ):
+            await self.app(scope, receive, send)
+            return
+        matched = self.match(scope["path"])
+        if not matched:
+            await self.app(scope, receive, send)
+            return
+
+        # Для MetricsMiddleware и профайлера — тот же шаблон маршрута, что и без fast path
+        scope["route"] = self.route
+        user_agent = None
+        forwarded_for = []
+        for name, value in scope["headers"]:
+            if name == b"user-agent":
+                user_agent = value.decode("latin-1")
+            elif name == b"x-forwarded-for":
+                forwarded_for.append(value.decode("latin-1"))
+        client = scope.get("client")
+        host = client_address(client[0] if client else None, ",".join(forwarded_for))
+        visitor = visitor_id(host, user_agent)
+
+        try:
+            await rate_limiter.check("redirect", host)
+            long_url = await async_url_service.get_full_url(matched.group(1), visitor)
+            if not long_url:
+                raise HTTPException(status_code=404, detail="URL not found")
+        except HTTPException as e:
+            response = await http_exception_handler(Request(scope, receive), e)
+            await response(scope, receive, send)
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": 302,
+            "headers": [(b"content-length", b"0"), (b"location", quote(long_url, safe=LOCATION_SAFE).encode("latin-1"))]
+        })
+        await send({"type": "http.response.body", "body": b""})
@@ -0,0 +1,35 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import PlainTextResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from Database.main_db import User
+from Dependencies.AdminUser import get_admin_user
+from Monitoring.profiler import profiler
+
+router = APIRouter(tags=["monitoring"])
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@router.get("/admin/profile")
+async def profile(
+    seconds: float = Query(10, gt=0),
+    interval: float = Query(0.01, gt=0),
+    route: str | None = Query(None, description='Only samples of one route, e.g. "GET /links/{short_url}"'),
+    format: str = Query("collapsed", pattern="^(collapsed|speedscope)$"),
+    admin: User = Depends(get_admin_user)
+):
+    # Сэмплер крутится в отдельном потоке, event loop продолжает обслуживать запросы
+    try:
+        result = await asyncio.to_thread(profiler.sample, seconds, interval, route)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "speedscope":
+        return profiler.to_speedscope(result)
+    return PlainTextResponse(profiler.to_collapsed(result))
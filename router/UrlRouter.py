@@ -1,77 +1,189 @@
-from fastapi import APIRouter, HTTPException, Depends
+import json
+import os
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from pydantic import ValidationError
 from Dependencies.AuthScheme import optional_oauth2_scheme
+from Dependencies.AdminUser import get_admin_user
 from Database.main_db import User
-from sqlalchemy.orm import Session
 
-from Database.main_db import SessionLocal
 from fastapi.responses import RedirectResponse
-from DataClasses.DataClasses import LongUrlDC, CreateShortUrlDC, ShortUrlDC, ShortUrlStatsDC, UpdateUrlDC
-from service.UrlService import UrlService
+from DataClasses.DataClasses import LongUrlDC, CreateShortUrlDC, ShortUrlDC, ShortUrlStatsDC, UpdateUrlDC, BulkShortenResultDC, BulkShortenResponseDC, OwnedLinksPageDC, ClickTimeseriesDC, TopLinksDC
+from service.AsyncUrlService import AsyncUrlService
 from service.AuthService import AuthService
+from service.DumpService import dump_service
+from service.ClickAnalytics import visitor_id
+from service.HotLinkTracker import hot_link_tracker
+from service.RateLimiter import rate_limiter, client_host
+from DbManager.LocalCacheManager import local_cache
+from DbManager.AliasFilterManager import alias_filter
+from Database.replicas import replica_router
+from Database.redis_ring import redis_ring
 
 router = APIRouter()
-url_service = UrlService()
+async_url_service = AsyncUrlService()
 auth_service = AuthService()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
+BULK_SHORTEN_MAX_ITEMS = int(os.getenv("BULK_SHORTEN_MAX_ITEMS", 10000))
 
-def get_current_user_or_none(
-    token: str = Depends(optional_oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User | None:
+async def get_current_user_or_none(token: str = Depends(optional_oauth2_scheme)) -> User | None:
     if not token:
         return None
     try:
-        return auth_service.get_current_user(token, db)
+        return await auth_service.get_current_user_async(token)
     except HTTPException:
         return None
 
 @router.post("/links/shorten", response_model=ShortUrlDC)
 async def shorten_url(
     create_dto: CreateShortUrlDC,
+    request: Request,
     user: User = Depends(get_current_user_or_none)
 ):
-    return url_service.make_short_url(create_dto, user)
+    await rate_limiter.check("shorten", client_host(request), user.id if user else None)
+    return await async_url_service.make_short_url(create_dto, user)
+
+async def read_bulk_items(request: Request) -> list:
+    # NDJSON читаем по мере поступления, обычный JSON — массив объектов
+    if "ndjson" in request.headers.get("content-type", ""):
+        items = []
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            items.extend(line for line in lines if line.strip())
+            if len(items) > BULK_SHORTEN_MAX_ITEMS:
+                raise HTTPException(status_code=413, detail=f"At most {BULK_SHORTEN_MAX_ITEMS} items per request")
+        if buffer.strip():
+            items.append(buffer)
+        return items
+
+    try:
+        items = await request.json()
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if len(items) > BULK_SHORTEN_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_SHORTEN_MAX_ITEMS} items per request")
+    return items
+
+@router.post("/links/shorten/bulk", response_model=BulkShortenResponseDC)
+async def shorten_urls_bulk(request: Request, user: User = Depends(get_current_user_or_none)):
+    await rate_limiter.check("shorten_bulk", client_host(request), user.id if user else None)
+    valid = []
+    invalid = []
+    for index, item in enumerate(await read_bulk_items(request)):
+        try:
+            if isinstance(item, bytes):
+                valid.append((index, CreateShortUrlDC.model_validate_json(item)))
+            else:
+                valid.append((index, CreateShortUrlDC.model_validate(item)))
+        except ValidationError as e:
+            detail = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc']) or 'body'}: {error['msg']}" for error in e.errors()
+            )
+            invalid.append(BulkShortenResultDC(index=index, status=422, detail=detail))
+
+    results = await async_url_service.make_short_urls_bulk(valid, user) + invalid
+    results.sort(key=lambda result: result.index)
+    created = sum(1 for result in results if result.status == 201)
+    return BulkShortenResponseDC(created=created, failed=len(results) - created, results=results)
 
 @router.get("/links/search", response_model=ShortUrlDC)
 async def search_by_original_url(original_url: str):
-    return url_service.find_by_original_url(original_url)
+    return await async_url_service.find_by_original_url(original_url)
+
+@router.get("/links/mine", response_model=OwnedLinksPageDC)
+async def list_my_links(
+    sort: str = Query("newest", pattern="^(newest|oldest)$"),
+    cursor: str | None = None,
+    limit: int = Query(50, gt=0, le=1000),
+    user: User = Depends(get_current_user_or_none)
+):
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return await async_url_service.list_owned_links(user, sort, cursor, limit)
 
 @router.get("/links/{short_url}")
-async def get_full_url(short_url: str):
-    long_url = url_service.get_full_url(short_url)
+async def get_full_url(short_url: str, request: Request):
+    await rate_limiter.check("redirect", client_host(request))
+    visitor = visitor_id(client_host(request), request.headers.get("user-agent"))
+    long_url = await async_url_service.get_full_url(short_url, visitor)
     if not long_url:
         raise HTTPException(status_code=404, detail="URL not found")
     return RedirectResponse(url=long_url, status_code=302)
 
 @router.get("/links/{short_url}/stats", response_model=ShortUrlStatsDC)
 async def get_url_stats(short_url: str):
-    return url_service.get_short_url_stats(short_url)
+    return await async_url_service.get_short_url_stats(short_url)
+
+@router.get("/links/{short_url}/stats/timeseries", response_model=ClickTimeseriesDC)
+async def get_url_timeseries(
+    short_url: str,
+    granularity: str = Query("hour", pattern="^(minute|hour|day)$"),
+    start: datetime | None = Query(None, alias="from"),
+    end: datetime | None = Query(None, alias="to")
+):
+    return await async_url_service.get_click_timeseries(short_url, granularity, start, end)
 
 @router.delete("/links/{short_url}", response_model=LongUrlDC)
 async def delete_url(short_url: str, user: User = Depends(get_current_user_or_none)):
-    success = url_service.delete_by_short_url(short_url, user)
+    success = await async_url_service.delete_by_short_url(short_url, user)
     if not success:
         raise HTTPException(status_code=404, detail="URL not found or not allowed")
     return LongUrlDC(url="Deleted")
 
 @router.put("/links/{short_url}", response_model=LongUrlDC)
 async def update_url(short_url: str, dto: UpdateUrlDC, user: User = Depends(get_current_user_or_none)):
-    updated = url_service.update_long_url(short_url, dto.newUrl, user)
+    updated = await async_url_service.update_long_url(short_url, dto.newUrl, user)
     if not updated:
         raise HTTPException(status_code=404, detail="URL not found or not updated")
     return LongUrlDC(url=dto.newUrl)
 
 @router.get("/admin/dump-db")
-async def dump_database():
-    return url_service.get_all_urls()
+async def dump_database(
+    cursor: str | None = None,
+    limit: int | None = Query(None, gt=0),
+    format: str = Query("json", pattern="^(json|ndjson|csv)$"),
+    admin: User = Depends(get_admin_user)
+):
+    return await dump_service.dump("urls", format, cursor, limit)
 
 @router.get("/admin/dump-expired")
-async def dump_expired_database():
-    return url_service.get_all_expired_urls()
\ No newline at end of file
+async def dump_expired_database(
+    cursor: str | None = None,
+    limit: int | None = Query(None, gt=0),
+    format: str = Query("json", pattern="^(json|ndjson|csv)$"),
+    admin: User = Depends(get_admin_user)
+):
+    return await dump_service.dump("expired", format, cursor, limit)
+
+@router.get("/admin/cache-stats")
+async def cache_stats(admin: User = Depends(get_admin_user)):
+    return local_cache.stats()
+
+
+@router.get("/admin/top-links", response_model=TopLinksDC)
+async def top_links(
+    window: int = Query(300, gt=0),
+    limit: int = Query(20, gt=0, le=1000),
+    admin: User = Depends(get_admin_user)
+):
+    return await hot_link_tracker.get_top(window, limit)
+
+
+@router.get("/admin/alias-filter-stats")
+async def alias_filter_stats(admin: User = Depends(get_admin_user)):
+    return alias_filter.stats()
+
+
+@router.get("/admin/db-replicas")
+async def db_replicas(admin: User = Depends(get_admin_user)):
+    return replica_router.stats()
+
+
+@router.get("/admin/redis-nodes")
+async def redis_nodes(admin: User = Depends(get_admin_user)):
+    return redis_ring.stats()
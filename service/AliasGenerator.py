@@ -0,0 +1,162 @@
+import base64
+import hashlib
+import logging
+import os
+import string
+import threading
+import uuid
+from abc import ABC, abstractmethod
+
+from Database.main_db import SessionLocal, AsyncSessionLocal
+from DbManager.MainDbManager import MainDbManager
+from DbManager.AsyncMainDbManager import AsyncMainDbManager
+
+logger = logging.getLogger(__name__)
+
+BASE62_ALPHABET = string.digits + string.ascii_letters
+
+
+def base62_encode(number: int, width: int) -> str:
+    chars = []
+    while number:
+        number, rest = divmod(number, 62)
+        chars.append(BASE62_ALPHABET[rest])
+    return "".join(reversed(chars)).rjust(width, BASE62_ALPHABET[0])
+
+
+class FeistelPermutation:
+    """
+    Биекция на [0, domain): сбалансированная сеть Фейстеля + cycle walking.
+    Последовательные id превращаются в неотличимые от случайных алиасы без коллизий.
+    """
+    ROUNDS = 4
+
+    def __init__(self, domain: int, key: bytes):
+        self.domain = domain
+        bits = max(2, (domain - 1).bit_length())
+        self.half_bits = (bits + 1) // 2
+        self.mask = (1 << self.half_bits) - 1
+        self.key = key
+
+    def _round(self, round_no: int, value: int) -> int:
+        digest = hashlib.blake2b(
+            value.to_bytes(8, "big"), digest_size=8, key=self.key, salt=round_no.to_bytes(16, "big")
+        ).digest()
+        return int.from_bytes(digest, "big") & self.mask
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self.mask
+        for round_no in range(self.ROUNDS):
+            left, right = right, left ^ self._round(round_no, right)
+        return (left << self.half_bits) | right
+
+    def permute(self, value: int) -> int:
+        value = self._encrypt(value)
+        while value >= self.domain:
+            value = self._encrypt(value)
+        return value
+
+
+class AliasGenerator(ABC):
+    # True — алиасы не повторяются и их не нужно проверять в БД перед INSERT
+    unique = False
+
+    @abstractmethod
+    def next_alias(self) -> str:
+        ...
+
+    async def next_alias_async(self) -> str:
+        return self.next_alias()
+
+
+class RandomAliasGenerator(AliasGenerator):
+    """Прежняя стратегия: случайные 6 символов, каждый кандидат проверяется SELECT-ом."""
+
+    def next_alias(self) -> str:
+        return base64.urlsafe_b64encode(uuid.uuid4().bytes)[:6].decode()
+
+
+class LeasedRangeAliasGenerator(AliasGenerator):
+    """
+    Каждый воркер арендует у БД блок целых id (таблица alias_sequences) и кодирует их в base62.
+    Один UPDATE на LEASE_SIZE алиасов, между арендами — ни одного запроса.
+    """
+    unique = True
+    SEQUENCE_NAME = "urls"
+    LEASE_SIZE = int(os.getenv("ALIAS_LEASE_SIZE", 1000))
+    MIN_LENGTH = int(os.getenv("ALIAS_LENGTH", 6))
+
+    def __init__(self, scramble: bool = True, secret: str | None = None):
+        self.db_manager = MainDbManager()
+        self.async_db_manager = AsyncMainDbManager()
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+        self.permutations: dict[int, FeistelPermutation] = {}
+        # Без секрета ключ перестановки известен всем и алиасы перебираются по порядку id —
+        # перемешивание лишь создавало бы видимость защиты
+        if scramble and not secret:
+            logger.warning("ALIAS_SECRET is not set: aliases are not scrambled and can be enumerated")
+        self.scramble = scramble and bool(secret)
+        self.key = hashlib.blake2b(secret.encode(), digest_size=32).digest() if self.scramble else None
+
+    def encode(self, number: int) -> str:
+        width = self.MIN_LENGTH
+        while number >= 62 ** width:
+            width += 1
+        if self.scramble:
+            permutation = self.permutations.get(width)
+            if not permutation:
+                permutation = self.permutations[width] = FeistelPermutation(62 ** width, self.key)
+            number = permutation.permute(number)
+        return base62_encode(number, width)
+
+    def _take(self) -> int | None:
+        with self._lock:
+            if self._next < self._end:
+                number = self._next
+                self._next += 1
+                return number
+            return None
+
+    def _install(self, end: int):
+        with self._lock:
+            # Если другой поток уже поставил новый блок, наш просто пропадает — пропуски не страшны
+            if self._next >= self._end:
+                self._next, self._end = end - self.LEASE_SIZE, end
+
+    def next_alias(self) -> str:
+        while True:
+            number = self._take()
+            if number is not None:
+                return self.encode(number)
+            db = SessionLocal()
+            try:
+                self._install(self.db_manager.lease_sequence_block(self.SEQUENCE_NAME, self.LEASE_SIZE, db))
+            finally:
+                db.close()
+
+    async def next_alias_async(self) -> str:
+        while True:
+            number = self._take()
+            if number is not None:
+                return self.encode(number)
+            async with AsyncSessionLocal() as db:
+                end = await self.async_db_manager.lease_sequence_block(self.SEQUENCE_NAME, self.LEASE_SIZE, db)
+            self._install(end)
+
+
+def create_alias_generator() -> AliasGenerator:
+    strategy = os.getenv("ALIAS_STRATEGY", "leased")
+    if strategy == "random":
+        return RandomAliasGenerator()
+    if strategy == "leased":
+        return LeasedRangeAliasGenerator(
+            scramble=os.getenv("ALIAS_SCRAMBLE", "1") != "0",
+            secret=os.getenv("ALIAS_SECRET", "")
+        )
+    raise ValueError(f"Unknown ALIAS_STRATEGY '{strategy}'")
+
+
+alias_generator = create_alias_generator()
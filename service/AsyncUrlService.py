@@ -0,0 +1,355 @@
+import base64
+import logging
+from datetime import datetime
+
+from fastapi.exceptions import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from DataClasses.DataClasses import CreateShortUrlDC, ShortUrlDC, ShortUrlStatsDC, BulkShortenResultDC, OwnedLinkDC, OwnedLinksPageDC, ClickTimeseriesDC
+from Database.main_db import AsyncSessionLocal, User, ShortUrl
+from Database.replicas import replica_router, alias_key, user_key
+from DbManager.AsyncMainDbManager import AsyncMainDbManager
+from DbManager.AsyncRedisDbManager import AsyncRedisDbManager
+from DbManager.LocalCacheManager import local_cache
+from DbManager.AliasFilterManager import alias_filter
+from service.UrlService import limit_expires_at, build_stats, should_reuse, mark_link_write
+from service.VisitAggregator import visit_aggregator
+from service.ClickAnalytics import click_analytics
+from service.HotLinkTracker import hot_link_tracker
+from service.AliasGenerator import alias_generator
+from service.ExpiryScheduler import expiry_scheduler, is_expired
+from Monitoring.metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+def encode_owned_cursor(sort: str, short_url: ShortUrl) -> str:
+    return base64.urlsafe_b64encode(f"{sort}|{short_url.createdAt.isoformat()}|{short_url.id}".encode()).decode()
+
+
+def decode_owned_cursor(sort: str, cursor: str | None) -> tuple[datetime, int] | None:
+    if not cursor:
+        return None
+    try:
+        cursor_sort, created_at, last_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        # Курсор другой сортировки указывает не на ту позицию
+        if cursor_sort != sort:
+            raise ValueError(cursor_sort)
+        return datetime.fromisoformat(created_at), int(last_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class AsyncUrlService:
+    """
+    Асинхронный вариант UrlService для всех HTTP-маршрутов: не блокирует event loop
+    и не использует пул потоков. Синхронный UrlService остаётся для очистки.
+    """
+
+    def __init__(self):
+        self.db_manager = AsyncMainDbManager()
+        self.redis_manager = AsyncRedisDbManager()
+        self.visit_aggregator = visit_aggregator
+        self.click_analytics = click_analytics
+        self.hot_link_tracker = hot_link_tracker
+        self.local_cache = local_cache
+        self.alias_generator = alias_generator
+        self.expiry_scheduler = expiry_scheduler
+        self.alias_filter = alias_filter
+
+    async def make_short_url(self, create_short_info: CreateShortUrlDC, user: User | None = None) -> ShortUrlDC:
+        async with AsyncSessionLocal() as db:
+            expires_at = limit_expires_at(create_short_info.expiresAt, user)
+
+            if should_reuse(create_short_info):
+                existing = await self.db_manager.get_reusable(
+                    create_short_info.url, user.id if user else None, expires_at, db
+                )
+                if existing:
+                    return ShortUrlDC(url=existing.shortUrl)
+
+            while True:
+                alias = create_short_info.alias or await self.create_alias(db)
+                short_url = ShortUrl(
+                    shortUrl=alias,
+                    longUrl=create_short_info.url,
+                    expiresAt=expires_at,
+                    owner_id=user.id if user else None
+                )
+                try:
+                    await self.db_manager.save(shortUrl=short_url, db=db)
+                    break
+                except HTTPException as e:
+                    if create_short_info.alias or e.status_code != 409:
+                        raise
+
+            # Свой фильтр обновляем сразу, до любых сетевых вызовов
+            self.alias_filter.add([alias])
+            await self.redis_manager.save(short_url=short_url)
+            self.expiry_scheduler.schedule(alias, expires_at)
+            await self.publish_filter_add([alias])
+            mark_link_write(alias, user)
+
+            return ShortUrlDC(url=alias)
+
+    async def make_short_urls_bulk(
+        self,
+        items: list[tuple[int, CreateShortUrlDC]],
+        user: User | None = None
+    ) -> list[BulkShortenResultDC]:
+        """
+        Массовое создание ссылок: один IN-запрос на конфликты алиасов, один executemany,
+        один pipeline в Redis. Ошибка одного элемента не валит всю пачку.
+        """
+        results: dict[int, BulkShortenResultDC] = {}
+        aliases: dict[int, str] = {}
+        generated: set[int] = set()
+
+        # Дубликаты пользовательских алиасов внутри самой пачки
+        seen = set()
+        for index, dto in items:
+            if not dto.alias:
+                continue
+            if dto.alias in seen:
+                results[index] = BulkShortenResultDC(index=index, status=409, detail=f"Alias '{dto.alias}' already exists")
+            else:
+                seen.add(dto.alias)
+                aliases[index] = dto.alias
+
+        async with AsyncSessionLocal() as db:
+            for index, dto in items:
+                if not dto.alias:
+                    aliases[index] = await self.alias_generator.next_alias_async()
+                    generated.add(index)
+
+            while True:
+                existing = await self.db_manager.get_existing_short_urls(list(aliases.values()), db)
+                retry = False
+                for index, alias in list(aliases.items()):
+                    if alias not in existing:
+                        continue
+                    if index in generated:
+                        aliases[index] = await self.alias_generator.next_alias_async()
+                        retry = True
+                    else:
+                        del aliases[index]
+                        results[index] = BulkShortenResultDC(index=index, status=409, detail=f"Alias '{alias}' already exists")
+                if not retry:
+                    break
+
+            dtos = dict(items)
+            short_urls = {
+                index: ShortUrl(
+                    shortUrl=alias,
+                    longUrl=dtos[index].url,
+                    expiresAt=limit_expires_at(dtos[index].expiresAt, user),
+                    owner_id=user.id if user else None
+                )
+                for index, alias in aliases.items()
+            }
+            rows = [
+                {
+                    "shortUrl": short_url.shortUrl,
+                    "longUrl": short_url.longUrl,
+                    "longUrlHash": short_url.longUrlHash,
+                    "expiresAt": short_url.expiresAt,
+                    "owner_id": short_url.owner_id
+                }
+                for short_url in short_urls.values()
+            ]
+            conflicts = await self.db_manager.bulk_insert(rows, db)
+
+        created = []
+        for index, short_url in short_urls.items():
+            if short_url.shortUrl in conflicts:
+                results[index] = BulkShortenResultDC(
+                    index=index, status=409, detail=f"Alias '{short_url.shortUrl}' already exists"
+                )
+            else:
+                created.append(short_url)
+                results[index] = BulkShortenResultDC(index=index, status=201, url=short_url.shortUrl)
+
+        if created:
+            created_aliases = [short_url.shortUrl for short_url in created]
+            self.alias_filter.add(created_aliases)
+            await self.redis_manager.save_many(created)
+            for short_url in created:
+                self.expiry_scheduler.schedule(short_url.shortUrl, short_url.expiresAt)
+            await self.publish_filter_add(created_aliases)
+            if user:
+                # Алиасы отдельно не отмечаем: промах на реплике и так перепроверяется на основной БД
+                replica_router.mark_write(user_key(user.id))
+
+        return [results[index] for index, _ in items]
+
+    async def create_alias(self, db: AsyncSession) -> str:
+        while True:
+            raw_alias = await self.alias_generator.next_alias_async()
+            if self.alias_generator.unique or not await self.db_manager.get_by_short_url(raw_alias, db):
+                return raw_alias
+
+    async def get_full_url(self, alias: str, visitor: str | None = None) -> str:
+        long_url = self.local_cache.get(alias)
+        if long_url:
+            self.visit_aggregator.record(alias)
+            self.click_analytics.record(alias, visitor)
+            self.hot_link_tracker.record(alias)
+            return long_url
+
+        cached = await self.redis_manager.get_long_url(alias)
+
+        if cached:
+            CACHE_LOOKUPS.labels("redis", "hit").inc()
+            long_url, expires_at = cached
+        else:
+            CACHE_LOOKUPS.labels("redis", "miss").inc()
+            # Алиаса точно нет — в БД не идём. Новую ссылку создатель кладёт в Redis раньше,
+            # чем рассылает её в фильтры, поэтому задержка pub/sub сюда не доходит
+            if self.alias_filter.is_definitely_absent(alias):
+                raise HTTPException(status_code=404, detail="Short URL not found")
+            # Строка уйдёт в общий Redis на часы, поэтому читаем с основной БД: отставшая реплика вернула бы
+            # удалённую или изменённую ссылку, а окно read-your-writes знает только воркер, который писал
+            async with AsyncSessionLocal() as db:
+                short_url = await self.db_manager.get_by_short_url(alias, db)
+            if not short_url:
+                self.alias_filter.record_false_positive(alias)
+                raise HTTPException(status_code=404, detail="Short URL not found")
+            await self.redis_manager.save(short_url)
+            long_url, expires_at = short_url.longUrl, short_url.expiresAt
+
+        # Истёкшую ссылку не отдаём, даже если она ещё лежит в кэше
+        if is_expired(expires_at):
+            raise HTTPException(status_code=404, detail="Short URL not found")
+
+        self.local_cache.put(alias, long_url, expires_at)
+        self.visit_aggregator.record(alias)
+        self.click_analytics.record(alias, visitor)
+        self.hot_link_tracker.record(alias)
+
+        return long_url
+
+    async def get_short_url_stats(self, alias: str) -> ShortUrlStatsDC:
+        short_url = await replica_router.read(
+            lambda db: self.db_manager.get_by_short_url(alias, db), alias_key(alias), retry_on_miss=True
+        )
+        if not short_url:
+            raise HTTPException(status_code=404, detail="Short URL not found")
+
+        return build_stats(short_url, *self.visit_aggregator.pending_for(alias))
+
+    async def list_owned_links(self, user: User, sort: str, cursor: str | None, limit: int) -> OwnedLinksPageDC:
+        after = decode_owned_cursor(sort, cursor)
+
+        async def load(db):
+            short_urls = await self.db_manager.get_owned_page(user.id, sort == "newest", db, after, limit)
+            # Общее число нужно один раз — на первой странице
+            total = await self.db_manager.count_owned(user.id, db) if after is None else None
+            return short_urls, total
+
+        short_urls, total = await replica_router.read(load, user_key(user.id))
+
+        items = []
+        for short_url in short_urls:
+            stats = build_stats(short_url, *self.visit_aggregator.pending_for(short_url.shortUrl))
+            items.append(OwnedLinkDC(
+                shortUrl=short_url.shortUrl,
+                originalUrl=stats.originalUrl,
+                visits=stats.visits,
+                lastTimeUsed=stats.lastTimeUsed,
+                createdAt=stats.createdAt,
+                expiresAt=short_url.expiresAt
+            ))
+
+        return OwnedLinksPageDC(
+            items=items,
+            # Неполная страница — дальше ссылок нет
+            nextCursor=encode_owned_cursor(sort, short_urls[-1]) if len(short_urls) == limit else None,
+            total=total
+        )
+
+    async def delete_by_short_url(self, alias: str, user: User | None = None) -> bool:
+        async with AsyncSessionLocal() as db:
+            entry = await self.db_manager.get_by_short_url(alias, db)
+            if not entry:
+                return False
+            if entry.owner_id and (not user or entry.owner_id != user.id):
+                raise HTTPException(status_code=403, detail="Not your link")
+            # Накопленные переходы должны попасть в архивную строку
+            await self.visit_aggregator.flush_aliases([alias])
+            deleted = await self.db_manager.delete_short_url(alias, db)
+
+        await self.redis_manager.delete(alias)
+        self.expiry_scheduler.unschedule(alias)
+        await self.invalidate_local(alias)
+        await self.remove_from_filter([alias])
+        mark_link_write(alias, user)
+        return deleted
+
+    async def update_long_url(self, alias: str, new_url: str, user: User | None = None) -> bool:
+        async with AsyncSessionLocal() as db:
+            entry = await self.db_manager.get_by_short_url(alias, db)
+            if not entry:
+                raise HTTPException(status_code=404, detail="Short URL not found")
+
+            if entry.owner_id and (not user or entry.owner_id != user.id):
+                raise HTTPException(status_code=403, detail="You are not the owner of this link")
+
+            updated = await self.db_manager.update_short_url(alias, new_url, db)
+
+        if not updated:
+            return False
+        await self.redis_manager.save(updated)
+        await self.invalidate_local(alias)
+        self.expiry_scheduler.schedule(alias, updated.expiresAt)
+        mark_link_write(alias, user)
+        return True
+
+    async def find_by_original_url(self, url: str) -> ShortUrlDC:
+        logger.debug(f"Search by original URL {url}")
+        entry = await replica_router.read(lambda db: self.db_manager.get_by_long_url(url, db), retry_on_miss=True)
+        if not entry:
+            raise HTTPException(status_code=404, detail="Not found")
+        return ShortUrlDC(url=entry.shortUrl)
+
+    async def get_click_timeseries(self, alias: str, granularity: str, start=None, end=None) -> ClickTimeseriesDC:
+        if self.alias_filter.is_definitely_absent(alias):
+            raise HTTPException(status_code=404, detail="Short URL not found")
+        # Корзины переживают удаление ссылки, поэтому существование проверяем по кэшу и БД
+        if not await self.redis_manager.get_long_url(alias):
+            short_url = await replica_router.read(
+                lambda db: self.db_manager.get_by_short_url(alias, db), alias_key(alias), retry_on_miss=True
+            )
+            if not short_url:
+                raise HTTPException(status_code=404, detail="Short URL not found")
+        return await self.click_analytics.get_timeseries(alias, granularity, start, end)
+
+    async def publish_filter_add(self, aliases: list[str]):
+        await self.redis_manager.publish_filter_update(self.alias_filter.encode_message("+", aliases))
+
+    async def remove_from_filter(self, aliases: list[str]):
+        if not aliases:
+            return
+        self.alias_filter.remove(aliases)
+        await self.redis_manager.publish_filter_update(self.alias_filter.encode_message("-", aliases))
+
+    async def invalidate_local(self, alias: str):
+        # Сразу чистим свой кэш, остальные воркеры узнают через pub/sub
+        self.local_cache.invalidate(alias)
+        await self.redis_manager.publish_invalidation(alias)
+
+    async def rebuild_alias_filter(self):
+        """
+        Строит фильтр алиасов заново по таблице urls, не блокируя редиректы.
+        Читает с основной БД: отставшая реплика дала бы ложные 404 для новых ссылок.
+        """
+        self.alias_filter.start_rebuild()
+        try:
+            async with AsyncSessionLocal() as db:
+                new_filter = self.alias_filter.new_filter(await self.db_manager.count_short_urls(db))
+                async for aliases in self.db_manager.iter_short_urls(db):
+                    for alias in aliases:
+                        new_filter.add(alias)
+        except BaseException:
+            self.alias_filter.abort_rebuild()
+            raise
+        self.alias_filter.finish_rebuild(new_filter)
+        logger.info(f"Alias filter rebuilt with {new_filter.count} aliases")
@@ -1,31 +1,31 @@
+import os
 import uuid
 from datetime import datetime, timedelta, timezone
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, Depends, Request
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
-from passlib.context import CryptContext
 
-from Database.main_db import User
+from Database.main_db import User, AsyncSessionLocal
+from Database.replicas import replica_router, user_key
 from DataClasses.DataClasses import UserCreateDC, TokenDC
-from Database.redis import get_redis_client
+from Database.redis import get_redis_client, get_async_redis_client
+from DbManager.AuthCacheManager import auth_cache, AuthCacheManager
+from service.PasswordHasher import password_hasher
 
 class AuthService:
     SECRET_KEY = "your_secret_key"
     ALGORITHM = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
+    # Пользователи с доступом к диагностическим эндпоинтам (профайлер)
+    ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
 
     def __init__(self):
         self.redis = get_redis_client()
-
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-    def hash_password(self, password: str) -> str:
-        return self.pwd_context.hash(password)
-
-    def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        return self.pwd_context.verify(plain_password, hashed_password)
+        self.async_redis = get_async_redis_client()
+        self.auth_cache = auth_cache
+        self.password_hasher = password_hasher
 
     def create_access_token(self, data: dict, expires_delta: timedelta | None = None) -> str:
         to_encode = data.copy()
@@ -36,67 +36,99 @@ class AuthService:
         })
         return jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
 
-    def register_user(self, user_data: UserCreateDC, db: Session) -> TokenDC: 
-        user = User(email=user_data.email, password_hash=self.hash_password(user_data.password))
-        try:
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-        except IntegrityError:
-            db.rollback()
-            raise HTTPException(status_code=400, detail="Email already registered")
-
-        token = self.create_access_token({"sub": user.email})
+    async def register_user(self, user_data: UserCreateDC) -> TokenDC:
+        password_hash = await self.password_hasher.hash(user_data.password)
+        user = User(email=user_data.email, password_hash=password_hash)
+        async with AsyncSessionLocal() as db:
+            try:
+                db.add(user)
+                await db.commit()
+                await db.refresh(user)
+            except IntegrityError:
+                await db.rollback()
+                raise HTTPException(status_code=400, detail="Email already registered")
+
+        replica_router.mark_write(user_key(user.id))
+        token = self.create_access_token({"sub": user.email, "uid": user.id})
         return TokenDC(access_token=token)
 
-    def login_user(self, user_data: UserCreateDC, db: Session) -> TokenDC:
-        user = db.query(User).filter(User.email == user_data.email).first()
-        if not user or not self.verify_password(user_data.password, user.password_hash):
+    async def login_user(self, user_data: UserCreateDC) -> TokenDC:
+        async def load(db):
+            result = await db.execute(select(User).where(User.email == user_data.email).limit(1))
+            return result.scalars().first()
+
+        # Только что зарегистрированного пользователя реплика может ещё не знать
+        user = await replica_router.read(load, retry_on_miss=True)
+        if not user or not await self.password_hasher.verify(user_data.password, user.password_hash):
             raise HTTPException(status_code=401, detail="Invalid credentials")
 
-        token = self.create_access_token({"sub": user.email})
+        token = self.create_access_token({"sub": user.email, "uid": user.id})
         return TokenDC(access_token=token)
-    
-    def get_current_user(self, token: str, db: Session) -> User:
-        if self.is_token_blacklisted(token):
-            raise HTTPException(status_code=401, detail="Token is blacklisted (logged out)")
 
-        try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            email: str = payload.get("sub")
-            if email is None:
-                raise HTTPException(status_code=401, detail="Invalid token")
-        except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        user = db.query(User).filter(User.email == email).first()
+    async def get_current_user_async(self, token: str) -> User:
+        """
+        Проверенный токен и запись пользователя берутся из кэша воркера; Redis, jwt.decode
+        и БД нужны только при первом запросе с токеном и после истечения записи пользователя.
+        """
+        claims = self.auth_cache.get_token(token)
+        if claims is None:
+            claims = self.verify_claims(token)
+            if await self.async_redis.exists(*self.blacklist_keys(token, claims["jti"])):
+                raise HTTPException(status_code=401, detail="Token is blacklisted (logged out)")
+            self.auth_cache.put_token(token, claims)
+
+        # Токены, выданные до появления uid, ищем по email
+        key = claims["uid"] if claims["uid"] is not None else claims["sub"]
+        cached = self.auth_cache.get_user(key)
+        if cached:
+            user_id, email, is_active = cached
+            return User(id=user_id, email=email, is_active=is_active)
+
+        async def load(db):
+            condition = User.id == claims["uid"] if claims["uid"] is not None else User.email == claims["sub"]
+            result = await db.execute(select(User).where(condition).limit(1))
+            return result.scalars().first()
+
+        user = await replica_router.read(load, retry_on_miss=True)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
+        self.auth_cache.put_user(key, user.id, user.email, user.is_active)
         return user
 
-    def logout_token(self, token: str):
+    def verify_claims(self, token: str) -> dict:
         try:
             payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            exp = payload.get("exp")
-            ttl = exp - int(datetime.now(timezone.utc).timestamp())
-            self.redis.set(f"blacklist:{token}", "true", ex=ttl)
         except JWTError:
             raise HTTPException(status_code=401, detail="Invalid token")
+        if payload.get("sub") is None or payload.get("jti") is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        return {"jti": payload["jti"], "sub": payload["sub"], "uid": payload.get("uid"), "exp": payload["exp"]}
+
+    @staticmethod
+    def blacklist_keys(token: str, jti: str | None) -> list[str]:
+        # blacklist:<token> — старый формат, пропадёт сам после истечения выданных токенов
+        return ([f"blacklist:{jti}"] if jti else []) + [f"blacklist:{token}"]
+
+    def logout_token(self, token: str):
+        claims = self.verify_claims(token)
+        ttl = claims["exp"] - int(datetime.now(timezone.utc).timestamp())
+        if ttl <= 0:
+            return
+        self.redis.set(f"blacklist:{claims['jti']}", "true", ex=ttl)
+        # Воркеры выкидывают токен из кэша, не дожидаясь его exp
+        self.auth_cache.revoke(claims["jti"], claims["exp"])
+        self.redis.publish(
+            AuthCacheManager.REVOCATION_CHANNEL, AuthCacheManager.encode_revocation(claims["jti"], claims["exp"])
+        )
+
+    def is_admin(self, user: User) -> bool:
+        return user.email.lower() in self.ADMIN_EMAILS
 
     def is_token_blacklisted(self, token: str) -> bool:
-        return self.redis.exists(f"blacklist:{token}") == 1
+        jti = jwt.get_unverified_claims(token).get("jti")
+        if jti and self.auth_cache.is_revoked(jti):
+            return True
+        return self.redis.exists(*self.blacklist_keys(token, jti)) > 0
     
     def decode_token(self, token: str) -> dict:
         return jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-
-    def get_all_users(self, db: Session) -> list[dict]:
-        users = db.query(User).all()
-        return [
-            {
-                "id": u.id,
-                "email": u.email,
-                "isActive": u.is_active,
-                "createdAt": u.created_at
-            }
-            for u in users
-        ]
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from Database.main_db import AsyncSessionLocal
+from DbManager.AsyncMainDbManager import AsyncMainDbManager
+from DbManager.AsyncRedisDbManager import AsyncRedisDbManager
+from DbManager.RedisDbManager import encode_record
+
+logger = logging.getLogger(__name__)
+
+
+class CacheWarmup:
+    """
+    Прогрев Redis после деплоя или перезапуска Redis: самые посещаемые ссылки
+    (times_visited, затем last_visited) читаются из БД пачками и пишутся pipeline'ом.
+    Работает в фоне — воркер принимает запросы сразу. Останавливается по LINKS,
+    TIME_BUDGET или MAX_BYTES (ключи + значения). Прогревает один воркер из всех:
+    остальные видят блокировку в Redis и пропускают этап.
+    """
+    ENABLED = os.getenv("CACHE_WARMUP", "1") == "1"
+    LINKS = int(os.getenv("CACHE_WARMUP_LINKS", 10000))
+    CHUNK_SIZE = int(os.getenv("CACHE_WARMUP_CHUNK", 1000))
+    TIME_BUDGET = float(os.getenv("CACHE_WARMUP_TIME_BUDGET", 30))
+    MAX_BYTES = int(os.getenv("CACHE_WARMUP_MAX_BYTES", 64 * 1024 * 1024))
+    LOCK_KEY = "cache-warmup"
+
+    def __init__(self):
+        self.db_manager = AsyncMainDbManager()
+        self.redis_manager = AsyncRedisDbManager()
+        self._task: asyncio.Task | None = None
+
+    async def warm(self) -> dict:
+        started = time.perf_counter()
+        report = {"loaded": 0, "bytes": 0, "seconds": 0.0, "stoppedBy": "done"}
+        if not await self.redis_manager.try_lock(self.LOCK_KEY, int(self.TIME_BUDGET) + 1):
+            report["stoppedBy"] = "locked"
+            return report
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        deadline = started + self.TIME_BUDGET
+        # С основной БД: прочитанное живёт в общем Redis часами, а реплика могла отстать
+        async with AsyncSessionLocal() as db:
+            async for rows in self.db_manager.stream_most_visited(now, self.LINKS, db, self.CHUNK_SIZE):
+                chunk_bytes = 0
+                for taken, row in enumerate(rows):
+                    size = len(row.shortUrl) + len(encode_record(row.longUrl, row.expiresAt))
+                    if report["bytes"] + chunk_bytes + size > self.MAX_BYTES:
+                        rows = rows[:taken]
+                        report["stoppedBy"] = "memory"
+                        break
+                    chunk_bytes += size
+                # NX: ключ, уже записанный обычным путём, свежее прочитанной строки
+                await self.redis_manager.save_many(rows, only_missing=True)
+                report["loaded"] += len(rows)
+                report["bytes"] += chunk_bytes
+                logger.info(f"Cache warm-up: {report['loaded']} links, {report['bytes'] / 1024:.0f} KiB")
+                if report["stoppedBy"] == "memory":
+                    break
+                if time.perf_counter() >= deadline:
+                    report["stoppedBy"] = "time"
+                    break
+        report["seconds"] = time.perf_counter() - started
+        return report
+
+    async def run(self):
+        try:
+            report = await self.warm()
+        except Exception as e:
+            logger.warning(f"Cache warm-up failed: {e}")
+            return
+        if report["stoppedBy"] == "locked":
+            logger.info("Cache warm-up is running in another worker, skipping.")
+            return
+        logger.info(
+            f"Cache warm-up finished: {report['loaded']} links ({report['bytes'] / 1024:.0f} KiB) "
+            f"in {report['seconds']:.2f}s, stopped by {report['stoppedBy']}"
+        )
+
+    def start(self):
+        if self.ENABLED:
+            self._task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+cache_warmup = CacheWarmup()
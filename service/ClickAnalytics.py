@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import logging
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+
+from fastapi.exceptions import HTTPException
+
+from DataClasses.DataClasses import ClickPointDC, ClickTimeseriesDC
+from DbManager.ClickStatsManager import ClickStatsManager, GRANULARITIES, bucket_of, visitors_key
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+DAY = 86400
+
+# Диапазон по умолчанию, если from не задан
+DEFAULT_SPAN = {"minute": HOUR, "hour": DAY, "day": 30 * DAY}
+
+
+def visitor_id(client_host: str | None, user_agent: str | None) -> str | None:
+    """
+    Посетитель — хэш IP и User-Agent с секретной солью; сами IP нигде не хранятся.
+    Пока соль не загружена, посетители не считаются: хэш без соли перебирается по всем IPv4.
+    """
+    salt = click_analytics.salt
+    if not salt:
+        return None
+    digest = hashlib.blake2b(f"{client_host}|{user_agent}".encode(), digest_size=8, key=salt.encode()[:64])
+    return digest.hexdigest()
+
+
+def to_timestamp(value: datetime) -> float:
+    # Время без таймзоны считаем UTC, как и в БД
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def unique_visitor_keys(alias: str, start: float, end: float) -> list[str]:
+    """
+    Покрытие диапазона HLL-ключами: целые сутки — суточным ключом, края — часовыми.
+    Уникальные посетители считаются с точностью до часа.
+    """
+    keys = []
+    hour, last_hour = int(start // HOUR), int(end // HOUR)
+    while hour <= last_hour:
+        if hour % 24 == 0 and hour + 23 <= last_hour:
+            keys.append(visitors_key(alias, "day", hour // 24))
+            hour += 24
+        else:
+            keys.append(visitors_key(alias, "hour", hour))
+            hour += 1
+    return keys
+
+
+class ClickAnalytics:
+    """
+    Аналитика переходов: счётчики по минутам/часам/дням и уникальные посетители (HyperLogLog).
+    На редиректе — только инкремент в словаре воркера; в Redis всё уходит одним pipeline
+    раз в FLUSH_INTERVAL. Сырые события нигде не хранятся: запрос диапазона читает готовые
+    корзины. Старые корзины удаляет Redis по TTL (RETENTION по гранулярностям).
+    """
+    FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", 5))
+    # Предел буфера (корзины + посетители), если Redis недоступен
+    MAX_PENDING = int(os.getenv("ANALYTICS_MAX_PENDING", 200000))
+    MAX_POINTS = int(os.getenv("ANALYTICS_MAX_POINTS", 1500))
+    # Без ANALYTICS_SALT соль генерируется при первом запуске и хранится в Redis
+    SALT = os.getenv("ANALYTICS_SALT", "")
+    RETENTION = {
+        "minute": int(float(os.getenv("ANALYTICS_MINUTE_RETENTION_HOURS", 48)) * HOUR),
+        "hour": int(float(os.getenv("ANALYTICS_HOUR_RETENTION_DAYS", 90)) * DAY),
+        "day": int(float(os.getenv("ANALYTICS_DAY_RETENTION_DAYS", 730)) * DAY),
+    }
+
+    def __init__(self):
+        self.manager = ClickStatsManager()
+        # alias -> минута -> переходы
+        self._clicks: dict[str, dict[int, int]] = {}
+        # alias -> час -> хэши посетителей
+        self._visitors: dict[str, dict[int, set[str]]] = {}
+        # Пачка, которая сейчас пишется в Redis: её переходы тоже видны в ответах
+        self._in_flight: dict[str, dict[int, int]] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+        self.dropped = 0
+        self.salt = self.SALT or None
+
+    def record(self, alias: str, visitor: str | None = None, timestamp: float | None = None):
+        minute = int((timestamp or time.time()) // 60)
+        with self._lock:
+            if self._pending >= self.MAX_PENDING:
+                self.dropped += 1
+                return
+            minutes = self._clicks.setdefault(alias, {})
+            if minute not in minutes:
+                self._pending += 1
+            minutes[minute] = minutes.get(minute, 0) + 1
+            if visitor:
+                hashes = self._visitors.setdefault(alias, {}).setdefault(minute // 60, set())
+                if visitor not in hashes:
+                    hashes.add(visitor)
+                    self._pending += 1
+
+    def pending_count(self) -> int:
+        return self._pending
+
+    async def flush(self) -> int:
+        with self._lock:
+            if not self._clicks:
+                return 0
+            clicks, visitors = self._clicks, self._visitors
+            self._clicks, self._visitors, self._pending = {}, {}, 0
+            self._in_flight = clicks
+
+        try:
+            await self.manager.write_batch(clicks, visitors, self.RETENTION)
+        except asyncio.CancelledError:
+            # Остановка посреди записи — stop() допишет пачку
+            self._restore(clicks, visitors)
+            raise
+        except Exception as e:
+            logger.warning(f"Analytics flush failed, keeping {len(clicks)} aliases for retry: {e}")
+            self._restore(clicks, visitors)
+            return 0
+        finally:
+            with self._lock:
+                self._in_flight = {}
+        return len(clicks)
+
+    def _restore(self, clicks: dict[str, dict[int, int]], visitors: dict[str, dict[int, set[str]]]):
+        with self._lock:
+            for alias, minutes in clicks.items():
+                target = self._clicks.setdefault(alias, {})
+                for minute, count in minutes.items():
+                    if minute not in target:
+                        self._pending += 1
+                    target[minute] = target.get(minute, 0) + count
+            for alias, hours in visitors.items():
+                target = self._visitors.setdefault(alias, {})
+                for hour, hashes in hours.items():
+                    before = len(target.get(hour, ()))
+                    target.setdefault(hour, set()).update(hashes)
+                    self._pending += len(target[hour]) - before
+
+    def _pending_for(self, alias: str) -> dict[int, int]:
+        with self._lock:
+            pending: dict[int, int] = {}
+            for source in (self._in_flight, self._clicks):
+                for minute, count in source.get(alias, {}).items():
+                    pending[minute] = pending.get(minute, 0) + count
+            return pending
+
+    async def get_timeseries(
+        self,
+        alias: str,
+        granularity: str,
+        start: datetime | None = None,
+        end: datetime | None = None
+    ) -> ClickTimeseriesDC:
+        end_ts = to_timestamp(end) if end else time.time()
+        start_ts = to_timestamp(start) if start else end_ts - DEFAULT_SPAN[granularity]
+        if start_ts > end_ts:
+            raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+        first, last = bucket_of(start_ts, granularity), bucket_of(end_ts, granularity)
+        if last - first + 1 > self.MAX_POINTS:
+            raise HTTPException(
+                status_code=400, detail=f"At most {self.MAX_POINTS} points per request, use a coarser granularity"
+            )
+
+        counts = await self.manager.get_counts(alias, granularity, first, last)
+        # Переходы этого воркера, ещё не сброшенные в Redis
+        seconds = GRANULARITIES[granularity][0]
+        for minute, count in self._pending_for(alias).items():
+            bucket = minute * 60 // seconds
+            if first <= bucket <= last:
+                counts[bucket] = counts.get(bucket, 0) + count
+
+        points = [
+            ClickPointDC(time=datetime.fromtimestamp(bucket * seconds, tz=timezone.utc), clicks=counts.get(bucket, 0))
+            for bucket in range(first, last + 1)
+        ]
+        return ClickTimeseriesDC(
+            alias=alias,
+            granularity=granularity,
+            points=points,
+            totalClicks=sum(point.clicks for point in points),
+            uniqueVisitors=await self.manager.count_unique(unique_visitor_keys(alias, start_ts, end_ts))
+        )
+
+    async def load_salt(self):
+        if self.salt:
+            return
+        try:
+            self.salt = await self.manager.get_or_create_salt(secrets.token_hex(32))
+        except Exception as e:
+            logger.warning(f"Analytics salt is not loaded, unique visitors are not counted: {e}")
+
+    async def run(self):
+        while True:
+            await self.load_salt()
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            await self.flush()
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Останавливает фоновый сброс и дописывает накопленное."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+click_analytics = ClickAnalytics()
@@ -0,0 +1,141 @@
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+
+from fastapi.exceptions import HTTPException
+from fastapi.responses import StreamingResponse
+
+from Database.main_db import ShortUrl, ExpiredUrl, User
+from Database.replicas import replica_router
+from DbManager.AsyncMainDbManager import AsyncMainDbManager
+
+# Поля выгрузки каждой таблицы: имя в ответе -> колонка. Первая колонка — ключ пагинации
+DUMP_COLUMNS = {
+    "urls": [
+        ("id", ShortUrl.id),
+        ("shortUrl", ShortUrl.shortUrl),
+        ("longUrl", ShortUrl.longUrl),
+        ("visits", ShortUrl.timesVisited),
+        ("createdAt", ShortUrl.createdAt),
+        ("lastVisited", ShortUrl.lastVisited),
+        ("expiresAt", ShortUrl.expiresAt)
+    ],
+    "expired": [
+        ("id", ExpiredUrl.id),
+        ("shortUrl", ExpiredUrl.shortUrl),
+        ("longUrl", ExpiredUrl.longUrl),
+        ("visits", ExpiredUrl.timesVisited),
+        ("createdAt", ExpiredUrl.createdAt),
+        ("lastVisited", ExpiredUrl.lastVisited),
+        ("expiresAt", ExpiredUrl.expiresAt),
+        ("deletedAt", ExpiredUrl.deletedAt),
+        ("owner_id", ExpiredUrl.owner_id)
+    ],
+    "users": [
+        ("id", User.id),
+        ("email", User.email),
+        ("isActive", User.is_active),
+        ("createdAt", User.created_at)
+    ]
+}
+
+EXPORT_MEDIA_TYPES = {"json": "application/json", "ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def encode_cursor(table: str, last_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{table}:{last_id}".encode()).decode()
+
+
+def decode_cursor(table: str, cursor: str | None) -> int:
+    if not cursor:
+        return 0
+    try:
+        cursor_table, last_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        if cursor_table != table:
+            raise ValueError(cursor_table)
+        return int(last_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def to_json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class DumpService:
+    """
+    Выгрузка таблиц для админки без материализации целиком:
+    страницы по keyset-курсору (id > last_id) и потоковый экспорт JSON-массива/NDJSON/CSV
+    пачками по chunk_size строк из серверного курсора.
+    """
+    MAX_PAGE_SIZE = 10000
+    DEFAULT_PAGE_SIZE = 1000
+
+    def __init__(self):
+        self.db_manager = AsyncMainDbManager()
+
+    async def get_page(self, table: str, cursor: str | None, limit: int) -> dict:
+        names, columns = zip(*DUMP_COLUMNS[table])
+        after_id = decode_cursor(table, cursor)
+        limit = min(limit, self.MAX_PAGE_SIZE)
+
+        rows = await replica_router.read(lambda db: self.db_manager.get_rows_after(columns, after_id, limit, db))
+
+        return {
+            "items": [dict(zip(names, row)) for row in rows],
+            # Неполная страница — дальше строк нет
+            "nextCursor": encode_cursor(table, rows[-1][0]) if len(rows) == limit else None
+        }
+
+    async def export(self, table: str, export_format: str, chunk_size: int = 1000):
+        """Асинхронный генератор для StreamingResponse: один блок байт на пачку строк."""
+        names, columns = zip(*DUMP_COLUMNS[table])
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if export_format == "csv":
+            writer.writerow(names)
+        elif export_format == "json":
+            buffer.write("[")
+        first = True
+
+        # Полная выгрузка — самое тяжёлое чтение, основной БД оно не нужно
+        async with replica_router.async_session() as db:
+            async for rows in self.db_manager.stream_rows(columns, db, chunk_size):
+                for row in rows:
+                    if export_format == "csv":
+                        writer.writerow(["" if value is None else to_json_value(value) for value in row])
+                    elif export_format == "json":
+                        buffer.write(("" if first else ",") + json.dumps(dict(zip(names, map(to_json_value, row)))))
+                        first = False
+                    else:
+                        buffer.write(json.dumps(dict(zip(names, map(to_json_value, row)))))
+                        buffer.write("\n")
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+
+        if export_format == "json":
+            buffer.write("]")
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+
+    async def dump(self, table: str, export_format: str, cursor: str | None, limit: int | None):
+        """
+        Ответ админского эндпоинта. По умолчанию — вся таблица JSON-списком, как раньше (потоком);
+        с cursor или limit — страница {"items", "nextCursor"}; ndjson/csv — файл.
+        """
+        if export_format == "json":
+            if cursor or limit:
+                return await self.get_page(table, cursor, limit or self.DEFAULT_PAGE_SIZE)
+            return StreamingResponse(self.export(table, export_format), media_type=EXPORT_MEDIA_TYPES["json"])
+        return StreamingResponse(
+            self.export(table, export_format),
+            media_type=EXPORT_MEDIA_TYPES[export_format],
+            headers={"Content-Disposition": f'attachment; filename="{table}.{export_format}"'}
+        )
+
+
+dump_service = DumpService()
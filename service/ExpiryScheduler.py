@@ -0,0 +1,190 @@
+import asyncio
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from Database.main_db import AsyncSessionLocal
+from DbManager.AsyncMainDbManager import AsyncMainDbManager
+from DbManager.AsyncRedisDbManager import AsyncRedisDbManager
+from DbManager.LocalCacheManager import local_cache
+from DbManager.AliasFilterManager import alias_filter
+from service.VisitAggregator import visit_aggregator
+
+logger = logging.getLogger(__name__)
+
+
+def deadline_of(expires_at: datetime) -> float:
+    # В БД время хранится без таймзоны (UTC)
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at.timestamp()
+
+
+def is_expired(expires_at: datetime | None, now: float | None = None) -> bool:
+    if not expires_at:
+        return False
+    return deadline_of(expires_at) <= (now if now is not None else time.time())
+
+
+class ExpiryScheduler:
+    """
+    Точное истечение ссылок: ближайшие дедлайны лежат в min-heap, задача спит до ближайшего
+    из них, затем архивирует ссылку и вычищает её из кэшей.
+    В памяти держатся только ссылки, истекающие в пределах HORIZON секунд; горизонт
+    периодически подгружается из индекса по expires_at, так что работа пропорциональна
+    числу реально истекающих ссылок, а не размеру таблицы.
+    """
+    HORIZON = int(os.getenv("EXPIRY_HORIZON", 900))
+    RELOAD_INTERVAL = int(os.getenv("EXPIRY_RELOAD_INTERVAL", 300))
+    BATCH_SIZE = int(os.getenv("EXPIRY_BATCH_SIZE", 500))
+    RETRY_DELAY = 5
+
+    def __init__(self):
+        self.db_manager = AsyncMainDbManager()
+        self.redis_manager = AsyncRedisDbManager()
+        self.local_cache = local_cache
+        self.alias_filter = alias_filter
+        self.visit_aggregator = visit_aggregator
+
+        self._heap: list[tuple[float, str]] = []
+        # alias -> актуальный дедлайн; устаревшие записи в куче пропускаются при извлечении
+        self._deadlines: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+        self.loaded_until = 0.0
+        self.archived = 0
+
+    def schedule(self, alias: str, expires_at: datetime | None):
+        if not expires_at:
+            self.unschedule(alias)
+            return
+        deadline = deadline_of(expires_at)
+        with self._lock:
+            if deadline > self.loaded_until:
+                # За горизонтом — подхватим при следующей подгрузке из индекса
+                self._deadlines.pop(alias, None)
+                return
+            self._deadlines[alias] = deadline
+            heapq.heappush(self._heap, (deadline, alias))
+            earliest = self._heap[0][0] == deadline
+
+        if earliest and self._loop:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def unschedule(self, alias: str):
+        with self._lock:
+            self._deadlines.pop(alias, None)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._deadlines)
+
+    def _pop_due(self, now: float) -> list[str]:
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(due) < self.BATCH_SIZE:
+                deadline, alias = heapq.heappop(self._heap)
+                if self._deadlines.get(alias) == deadline:
+                    del self._deadlines[alias]
+                    due.append(alias)
+        return due
+
+    def _next_deadline(self) -> float | None:
+        with self._lock:
+            while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    async def reload(self, now: float):
+        """Подгружает из индекса все ссылки, истекающие до now + HORIZON (включая просроченные)."""
+        until = now + self.HORIZON
+        with self._lock:
+            self.loaded_until = until
+        until_dt = datetime.fromtimestamp(until, tz=timezone.utc).replace(tzinfo=None)
+
+        after = None
+        async with AsyncSessionLocal() as db:
+            while True:
+                rows = await self.db_manager.get_expiring(until_dt, db, after=after, limit=self.BATCH_SIZE)
+                for alias, expires_at, _ in rows:
+                    self.schedule(alias, expires_at)
+                if len(rows) < self.BATCH_SIZE:
+                    break
+                after = (rows[-1][1], rows[-1][2])
+
+    async def expire(self, aliases: list[str]):
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        try:
+            # Переходы до истечения должны попасть в архив; новых не будет — истёкшая ссылка не редиректит
+            await self.visit_aggregator.flush_aliases(aliases)
+            async with AsyncSessionLocal() as db:
+                archived = await self.db_manager.archive_expired_aliases(aliases, now, db)
+        except Exception as e:
+            logger.warning(f"Failed to archive {len(aliases)} URLs, retrying: {e}")
+            retry_at = datetime.fromtimestamp(time.time() + self.RETRY_DELAY, tz=timezone.utc)
+            for alias in aliases:
+                self.schedule(alias, retry_at)
+            return
+
+        # Из кэшей убираем всё, что наступило, даже если ссылку уже заархивировал другой воркер
+        for alias in aliases:
+            self.local_cache.invalidate(alias)
+        await self.redis_manager.delete_many(aliases)
+        self.archived += len(archived)
+        if archived:
+            # Из фильтра — только реально удалённое этим воркером, иначе счётчики уйдут в минус
+            self.alias_filter.remove(archived)
+            await self.redis_manager.publish_filter_update(self.alias_filter.encode_message("-", archived))
+            logger.info(f"Archived {len(archived)} expired URLs")
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        next_reload = 0.0
+        while True:
+            now = time.time()
+            try:
+                if now >= next_reload:
+                    await self.reload(now)
+                    next_reload = now + self.RELOAD_INTERVAL
+
+                due = self._pop_due(now)
+                if due:
+                    await self.expire(due)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Scheduler iteration failed: {e}")
+                await asyncio.sleep(self.RETRY_DELAY)
+                continue
+
+            next_deadline = self._next_deadline()
+            timeout = next_reload - now
+            if next_deadline is not None:
+                timeout = min(timeout, next_deadline - now)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+expiry_scheduler = ExpiryScheduler()
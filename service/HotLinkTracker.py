@@ -0,0 +1,206 @@
+import asyncio
+import heapq
+import logging
+import math
+import os
+import threading
+import time
+from array import array
+
+from fastapi.exceptions import HTTPException
+
+from DataClasses.DataClasses import TopLinkDC, TopLinksDC
+from DbManager.HotLinkManager import HotLinkManager
+from DbManager.LocalCacheManager import local_cache
+from DbManager.RedisDbManager import to_timestamp
+
+logger = logging.getLogger(__name__)
+
+
+class CountMinSketch:
+    """Счётчики depth x width: оценка сверху, ошибка не больше total * e / width с вероятностью 1 - e^-depth."""
+
+    def __init__(self, width: int, depth: int):
+        self.width = width
+        self.rows = [array("Q", bytes(8 * width)) for _ in range(depth)]
+
+    def _indexes(self, key: str):
+        # Двойное хэширование: строки отличаются шагом второго хэша
+        first, step = hash(key), hash((key, 1)) | 1
+        return ((first + row * step) % self.width for row in range(len(self.rows)))
+
+    def add(self, key: str, count: int = 1) -> int:
+        estimate = None
+        for row, index in zip(self.rows, self._indexes(key)):
+            row[index] += count
+            if estimate is None or row[index] < estimate:
+                estimate = row[index]
+        return estimate
+
+
+class HotLinkTracker:
+    """
+    Поиск популярных ссылок на пути редиректа. Воркер считает переходы текущей минуты
+    в Count-Min Sketch и держит не больше CANDIDATES кандидатов с наибольшей оценкой —
+    память не зависит от числа алиасов. Раз в INTERVAL прирост кандидатов дописывается
+    в поминутный sorted set Redis (общий для всех воркеров, не больше MAX_MEMBERS на минуту).
+
+    Топ-TOP_K за PIN_WINDOW закрепляется: в кэше воркера ссылки не вытесняются и живут
+    L1_PINNED_TTL, в Redis срок жизни ключа продлевается до REDIS_TTL (не дольше expiresAt).
+    """
+    TOP_K = int(os.getenv("HOT_LINKS_TOP_K", 50))
+    CANDIDATES = int(os.getenv("HOT_LINKS_CANDIDATES", 256))
+    SKETCH_WIDTH = int(os.getenv("HOT_LINKS_SKETCH_WIDTH", 2048))
+    SKETCH_DEPTH = int(os.getenv("HOT_LINKS_SKETCH_DEPTH", 4))
+    INTERVAL = float(os.getenv("HOT_LINKS_INTERVAL", 10))
+    PIN_WINDOW = int(os.getenv("HOT_LINKS_PIN_WINDOW", 300))
+    # Меньше стольких переходов за PIN_WINDOW ссылка не закрепляется
+    MIN_CLICKS = int(os.getenv("HOT_LINKS_MIN_CLICKS", 20))
+    MAX_WINDOW = int(os.getenv("HOT_LINKS_MAX_WINDOW", 3600))
+    MAX_MEMBERS = int(os.getenv("HOT_LINKS_MAX_MEMBERS", 1000))
+    REDIS_TTL = int(os.getenv("HOT_LINKS_REDIS_TTL", 7 * 24 * 3600))
+
+    def __init__(self):
+        self.manager = HotLinkManager()
+        self._minute = int(time.time() // 60)
+        self._sketch = CountMinSketch(self.SKETCH_WIDTH, self.SKETCH_DEPTH)
+        # alias -> оценка за текущую минуту
+        self._candidates: dict[str, int] = {}
+        # Min-куча (оценка, alias) по кандидатам, по записи на кандидата; оценки в ней могут отставать
+        self._heap: list[tuple[int, str]] = []
+        # Наименьшая оценка среди кандидатов, пока их CANDIDATES
+        self._floor = 0
+        # alias -> сколько из оценки уже отправлено в Redis
+        self._pushed: dict[str, int] = {}
+        # Закрытые минуты, ещё не дописанные в Redis: (минута, прирост)
+        self._finished: list[tuple[int, dict[str, int]]] = []
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+        self.pinned: set[str] = set()
+
+    def record(self, alias: str):
+        minute = int(time.time() // 60)
+        with self._lock:
+            if minute != self._minute:
+                self._rotate(minute)
+            estimate = self._sketch.add(alias)
+            candidates = self._candidates
+            if alias in candidates:
+                candidates[alias] = estimate
+                return
+            if len(candidates) < self.CANDIDATES:
+                candidates[alias] = estimate
+                heapq.heappush(self._heap, (estimate, alias))
+                return
+            if estimate <= self._floor:
+                return
+            weakest_estimate, weakest = self._weakest()
+            if estimate > weakest_estimate:
+                del candidates[weakest]
+                candidates[alias] = estimate
+                heapq.heapreplace(self._heap, (estimate, alias))
+                weakest_estimate, _ = self._weakest()
+            self._floor = weakest_estimate
+
+    def _weakest(self) -> tuple[int, str]:
+        """
+        Кандидат с наименьшей оценкой. Оценки только растут, поэтому в куче они могут быть
+        лишь занижены: устаревшую вершину обновляем и просеиваем, пока вершина не совпадёт.
+        """
+        heap = self._heap
+        while True:
+            estimate, alias = heap[0]
+            current = self._candidates[alias]
+            if current == estimate:
+                return estimate, alias
+            heapq.heapreplace(heap, (current, alias))
+
+    def _rotate(self, minute: int):
+        delta = self._take_delta()
+        if delta:
+            self._finished.append((self._minute, delta))
+        self._minute = minute
+        self._sketch = CountMinSketch(self.SKETCH_WIDTH, self.SKETCH_DEPTH)
+        self._candidates, self._heap, self._pushed, self._floor = {}, [], {}, 0
+
+    def _take_delta(self) -> dict[str, int]:
+        delta = {}
+        for alias, estimate in self._candidates.items():
+            pushed = self._pushed.get(alias, 0)
+            if estimate > pushed:
+                delta[alias] = estimate - pushed
+                self._pushed[alias] = estimate
+        return delta
+
+    async def push(self):
+        with self._lock:
+            batches = self._finished + [(self._minute, self._take_delta())]
+            self._finished = []
+        for minute, delta in batches:
+            if not delta:
+                continue
+            try:
+                await self.manager.add_counts(minute, delta, self.MAX_MEMBERS, self.MAX_WINDOW + 120)
+            except Exception as e:
+                # Топ приблизительный: потерянная минута одного воркера не критична
+                logger.warning(f"Hot links push for minute {minute} failed: {e}")
+
+    async def refresh_pins(self):
+        top = await self.manager.get_top(self._window_minutes(self.PIN_WINDOW), self.TOP_K)
+        self.pinned = {alias for alias, clicks in top if clicks >= self.MIN_CLICKS}
+        local_cache.set_pinned(self.pinned)
+
+        now = time.time()
+        ttls = {}
+        for alias in self.pinned:
+            # Закреплённые ссылки уже в кэше воркера: их переходы только что прошли через него
+            entry = local_cache.peek(alias)
+            if entry is None:
+                continue
+            ttl = self.REDIS_TTL if entry[1] is None else min(self.REDIS_TTL, int(to_timestamp(entry[1]) - now))
+            if ttl > 0:
+                ttls[alias] = ttl
+        if ttls:
+            await self.manager.extend_ttl(ttls)
+
+    def _window_minutes(self, window: int) -> list[int]:
+        current = int(time.time() // 60)
+        return list(range(current - math.ceil(window / 60) + 1, current + 1))
+
+    async def get_top(self, window: int, limit: int) -> TopLinksDC:
+        """Топ по всем воркерам; переходы последних INTERVAL секунд могут быть ещё не учтены."""
+        if window > self.MAX_WINDOW:
+            raise HTTPException(status_code=400, detail=f"Window must not exceed {self.MAX_WINDOW} seconds")
+        top = await self.manager.get_top(self._window_minutes(window), limit)
+        return TopLinksDC(
+            window=window,
+            items=[TopLinkDC(shortUrl=alias, clicks=clicks, pinned=alias in self.pinned) for alias, clicks in top]
+        )
+
+    def candidate_count(self) -> int:
+        return len(self._candidates)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.INTERVAL)
+            await self.push()
+            try:
+                await self.refresh_pins()
+            except Exception as e:
+                logger.warning(f"Hot links refresh failed: {e}")
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.push()
+
+
+hot_link_tracker = HotLinkTracker()
@@ -0,0 +1,96 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from Monitoring.metrics import PASSWORD_HASH_SECONDS, PASSWORD_HASH_REJECTED
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def hash_in_worker(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_in_worker(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    bcrypt в отдельном пуле процессов: волна логинов не занимает ни пул потоков,
+    ни GIL воркера, который обслуживает редиректы.
+    Одновременно в работе и в очереди не больше WORKERS + MAX_QUEUE задач,
+    остальные сразу получают 503 с Retry-After. Задача считается, пока её выполняет пул,
+    а не пока её ждёт запрос: отменённый запрос не освобождает место раньше bcrypt.
+    """
+    WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    MAX_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", 16))
+    RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", 1))
+
+    def __init__(self):
+        self._executor: ProcessPoolExecutor | None = None
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: fork процесса с event loop и потоками небезопасен
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _run(self, operation: str, func, *args):
+        if self.in_flight >= self.WORKERS + self.MAX_QUEUE:
+            PASSWORD_HASH_REJECTED.labels(operation).inc()
+            raise HTTPException(
+                status_code=503,
+                detail="Authentication is overloaded, retry later",
+                headers={"Retry-After": str(self.RETRY_AFTER)}
+            )
+
+        started = time.perf_counter()
+        try:
+            future = self._get_executor().submit(func, *args)
+            with self._lock:
+                self.in_flight += 1
+            # Колбэк вызывается потоком пула, когда задача действительно закончилась или отменена до старта
+            future.add_done_callback(self._release)
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            # Процесс пула упал — пересоздаём пул при следующем запросе
+            self._executor = None
+            raise HTTPException(
+                status_code=503,
+                detail="Authentication is temporarily unavailable",
+                headers={"Retry-After": str(self.RETRY_AFTER)}
+            )
+        finally:
+            PASSWORD_HASH_SECONDS.labels(operation).observe(time.perf_counter() - started)
+
+    def _release(self, future):
+        with self._lock:
+            self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", hash_in_worker, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run("verify", verify_in_worker, password, hashed_password)
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
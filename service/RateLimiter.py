@@ -0,0 +1,159 @@
+import logging
+import math
+import os
+import time
+from ipaddress import ip_address, ip_network
+
+from fastapi import Request
+from fastapi.exceptions import HTTPException
+
+from DbManager.RateLimitManager import RateLimitManager, bucket_key
+from Monitoring.metrics import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+# Лимиты "запросов/секунд"; переопределяются RATE_LIMIT_<ИМЯ>, "0" — без лимита.
+# <маршрут>_anonymous — отдельный лимит для запросов без токена (по IP).
+DEFAULT_LIMITS = {
+    "redirect": "600/60",
+    "shorten": "120/60",
+    "shorten_anonymous": "20/60",
+    "shorten_bulk": "10/60",
+    "login": "10/60",
+    "register": "10/3600",
+}
+
+
+def parse_limit(spec: str) -> tuple[float, int] | None:
+    """"count/seconds" -> (токенов в секунду, ёмкость корзины); "0" -> None."""
+    if spec.strip() == "0":
+        return None
+    count, _, seconds = spec.partition("/")
+    count, seconds = int(count), float(seconds or 1)
+    if count <= 0 or seconds <= 0:
+        raise ValueError(f"Invalid rate limit '{spec}', expected count/seconds")
+    return count / seconds, count
+
+
+def load_limits() -> dict[str, tuple[float, int]]:
+    limits = {}
+    for name, default in DEFAULT_LIMITS.items():
+        limit = parse_limit(os.getenv(f"RATE_LIMIT_{name.upper()}", default))
+        if limit:
+            limits[name] = limit
+    return limits
+
+
+# Адреса и сети обратных прокси через запятую: только им доверяется X-Forwarded-For
+TRUSTED_PROXIES = [ip_network(item.strip()) for item in os.getenv("TRUSTED_PROXIES", "").split(",") if item.strip()]
+
+
+def is_trusted_proxy(address: str | None) -> bool:
+    try:
+        parsed = ip_address(address)
+    except ValueError:
+        return False
+    return any(parsed in network for network in TRUSTED_PROXIES)
+
+
+def client_address(peer: str | None, forwarded_for: str | None) -> str | None:
+    """
+    Адрес клиента для лимитов и аналитики. X-Forwarded-For читается, только если соединение
+    пришло от доверенного прокси: берётся самый правый адрес цепочки, не являющийся прокси,
+    — левее клиент может дописать что угодно.
+    """
+    if not forwarded_for or not is_trusted_proxy(peer):
+        return peer
+    hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+def client_host(request: Request) -> str | None:
+    forwarded_for = ",".join(request.headers.getlist("x-forwarded-for"))
+    return client_address(request.client.host if request.client else None, forwarded_for)
+
+
+class RateLimiter:
+    """
+    Распределённые лимиты запросов: token bucket в Redis, одна атомарная Lua-проверка на обращение.
+    Ключ — маршрут и пользователь (id) либо IP для анонимных запросов.
+
+    Чтобы не ходить в Redis на каждый запрос, воркер берёт токены «в аренду» пачкой
+    (LEASE_FRACTION ёмкости корзины) и расходует их локально в течение LEASE_TTL;
+    неизрасходованные сгорают, поэтому лимит может оказаться только строже.
+    Отказ тоже запоминается локально до момента появления токена. При недоступности
+    Redis запросы пропускаются.
+
+    По умолчанию выключен: за обратным прокси без TRUSTED_PROXIES все клиенты
+    делили бы одну корзину адреса прокси.
+    """
+    ENABLED = os.getenv("RATE_LIMIT", "0") == "1"
+    LEASE_FRACTION = float(os.getenv("RATE_LIMIT_LEASE_FRACTION", 0.05))
+    LEASE_TTL = float(os.getenv("RATE_LIMIT_LEASE_TTL", 1))
+    MAX_LOCAL_KEYS = int(os.getenv("RATE_LIMIT_MAX_LOCAL_KEYS", 100000))
+
+    def __init__(self):
+        self.manager = RateLimitManager()
+        self.limits = load_limits()
+        # ключ -> [арендованные токены, аренда до, отказ до] (time.monotonic)
+        self._local: dict[str, list] = {}
+        self.redis_errors = 0
+
+    def _rule_for(self, route: str, user_id: int | None) -> str | None:
+        if user_id is None and f"{route}_anonymous" in self.limits:
+            return f"{route}_anonymous"
+        return route if route in self.limits else None
+
+    async def check(self, route: str, client_host: str | None, user_id: int | None = None):
+        """Пропускает запрос или бросает 429 с Retry-After."""
+        rule = self._rule_for(route, user_id) if self.ENABLED else None
+        if rule is None:
+            return
+        key = bucket_key(rule, f"u{user_id}" if user_id is not None else client_host or "unknown")
+        now = time.monotonic()
+        entry = self._local.get(key)
+        if entry:
+            if entry[0] > 0 and entry[1] > now:
+                entry[0] -= 1
+                return
+            if entry[2] > now:
+                self._reject(route, entry[2] - now)
+
+        rate, capacity = self.limits[rule]
+        lease = max(1, int(capacity * self.LEASE_FRACTION))
+        try:
+            granted, retry_after = await self.manager.acquire(key, rate, capacity, lease)
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Rate limit check failed, allowing request: {e}")
+            return
+
+        if len(self._local) >= self.MAX_LOCAL_KEYS:
+            self._prune(now)
+        if granted:
+            self._local[key] = [granted - 1, now + self.LEASE_TTL, 0.0]
+            return
+        self._local[key] = [0, 0.0, now + retry_after]
+        self._reject(route, retry_after)
+
+    def _reject(self, route: str, retry_after: float):
+        RATE_LIMITED.labels(route).inc()
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    def _prune(self, now: float):
+        self._local = {key: entry for key, entry in self._local.items() if max(entry[1], entry[2]) > now}
+        if len(self._local) >= self.MAX_LOCAL_KEYS:
+            self._local.clear()
+
+    def local_keys(self) -> int:
+        return len(self._local)
+
+
+rate_limiter = RateLimiter()
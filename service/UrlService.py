@@ -1,225 +1,132 @@
-import base64
-import uuid
-import asyncio
+import logging
+import os
+import time
 from datetime import datetime, timezone, timedelta
-from fastapi.exceptions import HTTPException
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
 
-from DataClasses.DataClasses import LongUrlDC, CreateShortUrlDC, ShortUrlDC, ShortUrlStatsDC
-from Database.main_db import SessionLocal, User, ExpiredUrl
-from DbManager.MainDbManager import MainDbManager, ShortUrl
+from DataClasses.DataClasses import CreateShortUrlDC, ShortUrlStatsDC
+from Database.main_db import SessionLocal, User
+from Database.replicas import replica_router, alias_key, user_key
+from DbManager.MainDbManager import MainDbManager, ShortUrl, expired_condition, unused_condition
 from DbManager.RedisDbManager import RedisDbManager
+from DbManager.LocalCacheManager import local_cache
+from DbManager.AliasFilterManager import alias_filter
+from service.VisitAggregator import visit_aggregator
 
+logger = logging.getLogger(__name__)
 
-class UrlService:
-    def __init__(self):
-        self.db_manager = MainDbManager()
-        self.redis_manager = RedisDbManager()
 
-    def make_short_url(self, create_short_info: CreateShortUrlDC, user: User | None = None) -> ShortUrlDC:
-        db = SessionLocal()
-        try:
-            alias = create_short_info.alias or self.create_alias(db)
+ANONYMOUS_LINK_TTL = timedelta(hours=12)
+REUSE_EXISTING_ALIAS = os.getenv("REUSE_EXISTING_ALIAS", "0") == "1"
 
-            # Если пользователь не авторизован — устанавливаем макс время жизни 12 часов
-            expires_at = create_short_info.expiresAt
-            if not user:
-                if expires_at:
-                    expires_at = min(datetime.now(timezone.utc) + timedelta(hours=12), expires_at)
-                else:
-                    expires_at = datetime.now(timezone.utc) + timedelta(hours=12)
 
+def limit_expires_at(expires_at: datetime | None, user: User | None) -> datetime | None:
+    # Если пользователь не авторизован — устанавливаем макс время жизни 12 часов
+    if user:
+        return expires_at
+    if expires_at:
+        return min(datetime.now(timezone.utc) + ANONYMOUS_LINK_TTL, expires_at)
+    return datetime.now(timezone.utc) + ANONYMOUS_LINK_TTL
 
-            short_url = ShortUrl(
-                shortUrl=alias,
-                longUrl=create_short_info.url,
-                expiresAt=expires_at,
-                owner_id=user.id if user else None
-            )
 
-            self.db_manager.save(shortUrl=short_url, db=db)
-            self.redis_manager.save(short_url=short_url)
+def should_reuse(create_short_info: CreateShortUrlDC) -> bool:
+    # Пользовательский алиас всегда создаёт новую ссылку
+    if create_short_info.alias:
+        return False
+    if create_short_info.reuseExisting is None:
+        return REUSE_EXISTING_ALIAS
+    return create_short_info.reuseExisting
 
-            return ShortUrlDC(url=alias)
-        finally:
-            db.close()
 
-    def create_alias(self, db: Session) -> str:
-        while True:
-            raw_alias = base64.urlsafe_b64encode(uuid.uuid4().bytes)[:6].decode()
-            exists = self.db_manager.get_by_short_url(raw_alias, db)
-            if not exists:
-                return raw_alias
+def mark_link_write(alias: str, user: User | None):
+    # Ближайшие чтения этой ссылки и списка владельца — с основной БД
+    replica_router.mark_write(alias_key(alias), *([user_key(user.id)] if user else []))
 
-    def get_short_url(self, alias: str) -> str:
-        db = SessionLocal()
-        try:
-            short_url = self.redis_manager.get(alias)
-            if not short_url:
-                short_url = self.db_manager.get_by_short_url(alias, db)
-                if not short_url:
-                    raise HTTPException(status_code=404, detail="Short URL not found")
-                self.redis_manager.save(short_url)
 
-            short_url.timesVisited += 1
-            short_url.lastVisited = datetime.now(timezone.utc)
-            db.commit()
+def build_stats(short_url: ShortUrl, pending_visits: int, pending_last: datetime | None) -> ShortUrlStatsDC:
+    # Добавляем переходы, которые ещё не сброшены в БД
+    last_visited = short_url.lastVisited
+    if pending_last:
+        # В SQLite время хранится без таймзоны (UTC)
+        last_visited = max(last_visited, pending_last.astimezone(timezone.utc).replace(tzinfo=None))
 
-            self.redis_manager.save(short_url)
+    return ShortUrlStatsDC(
+        originalUrl=short_url.longUrl,
+        visits=short_url.timesVisited + pending_visits,
+        lastTimeUsed=last_visited,
+        createdAt=short_url.createdAt
+    )
 
-            return short_url.longUrl
-        finally:
-            db.close()
-
-    def get_short_url_stats(self, alias: str) -> ShortUrlStatsDC:
-        db = SessionLocal()
-        try:
-            short_url = self.db_manager.get_by_short_url(alias, db)
-            if not short_url:
-                raise HTTPException(status_code=404, detail="Short URL not found")
-
-            return ShortUrlStatsDC(
-                originalUrl=short_url.longUrl,
-                visits=short_url.timesVisited,
-                lastTimeUsed=short_url.lastVisited,
-                createdAt=short_url.createdAt
-            )
-        finally:
-            db.close()
 
-    def delete_by_short_url(self, alias: str, user: User | None = None) -> bool:
-        db = SessionLocal()
-        try:
-            entry = self.db_manager.get_by_short_url(alias, db)
-            if not entry:
-                return False
-            if entry.owner_id and entry.owner_id != user.id:
-                raise HTTPException(status_code=403, detail="Not your link")
-            deleted = self.db_manager.delete_short_url(alias, db)
-            self.redis_manager.delete(alias)
-            return deleted is not None
-        finally:
-            db.close()
-
-    def get_by_long_url(self, long_url: str, db: Session):
-        return db.query(ShortUrl).filter(ShortUrl.longUrl == long_url).first()
-    
-    def update_long_url(self, alias: str, new_url: str, user: User | None = None) -> bool:
-        db = SessionLocal()
-        try:
-            entry = self.db_manager.get_by_short_url(alias, db)
-            if not entry:
-                raise HTTPException(status_code=404, detail="Short URL not found")
-
-            if entry.owner_id and (not user or entry.owner_id != user.id):
-                raise HTTPException(status_code=403, detail="You are not the owner of this link")
-
-            updated = self.db_manager.update_short_url(alias, new_url, db)
-            if updated:
-                self.redis_manager.save(updated)
-                return True
-            return False
-        finally:
-            db.close()
-
-    def delete_expired(self, unused_days: int = 10):
-        db = SessionLocal()
-        try:
-            expired_aliases = self.db_manager.delete_all_expired(db)
-            unused_aliases = self.db_manager.delete_unused_for_days(db=db, days=unused_days)
-
-            # Очистка кэша
-            for alias in expired_aliases + unused_aliases:
-                self.redis_manager.delete(alias)
-        finally:
-            db.close()
+class UrlService:
+    def __init__(self):
+        self.db_manager = MainDbManager()
+        self.redis_manager = RedisDbManager()
+        self.visit_aggregator = visit_aggregator
+        self.local_cache = local_cache
+        self.alias_filter = alias_filter
+
+    def delete_expired(
+        self,
+        unused_days: int = 10,
+        chunk_size: int = 500,
+        time_budget: float | None = None,
+        chunk_pause: float = 0.0,
+        include_expired: bool = True
+    ) -> dict:
+        """
+        Архивирует просроченные и давно не используемые ссылки пачками по chunk_size.
+        Каждая пачка — отдельная короткая транзакция; после time_budget секунд работа
+        прерывается и продолжится в следующий запуск.
+        """
+        started = time.monotonic()
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        passes = [("unused", unused_condition(now - timedelta(days=unused_days)), ShortUrl.lastVisited)]
+        if include_expired:
+            passes.insert(0, ("expired", expired_condition(now), ShortUrl.expiresAt))
+        report = {"expired": 0, "unused": 0, "complete": True}
 
-    def get_full_url(self, alias: str) -> str:
-        short_url = self.redis_manager.get(alias)
-
-        if not short_url:
-            # Попытка достать из БД и кэшировать
-            db = SessionLocal()
-            try:
-                short_url = self.db_manager.get_by_short_url(alias, db)
-                if not short_url:
-                    raise HTTPException(status_code=404, detail="Short URL not found")
-                self.redis_manager.save(short_url)
-            finally:
-                db.close()
-
-        # Если нашли — запускаем фоновую задачу
-        asyncio.create_task(self._update_usage_stats(alias))
-
-        return short_url.longUrl
-    
-    async def _update_usage_stats(self, alias: str):
-        def sync_update():
-            db = SessionLocal()
-            try:
-                entry = self.db_manager.get_by_short_url(alias, db)
-                if entry:
-                    entry.timesVisited += 1
-                    entry.lastVisited = datetime.now(timezone.utc)
-                    db.commit()
-                    self.redis_manager.save(entry)
-            finally:
-                db.close()
-
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, sync_update)
-
-    def find_by_original_url(self, url: str) -> ShortUrlDC:
         db = SessionLocal()
-        print('===========================')
-        print(url)
         try:
-            entry = self.db_manager.get_by_long_url(url, db)
-            if not entry:
-                raise HTTPException(status_code=404, detail="Not found")
-            return ShortUrlDC(url=entry.shortUrl)
+            for name, condition, order_by in passes:
+                while True:
+                    if time_budget is not None and time.monotonic() - started >= time_budget:
+                        report["complete"] = False
+                        break
+                    # Ссылки с ещё не записанными переходами пропускаем: в архив ушли бы устаревшие счётчики,
+                    # а "неиспользуемая" ссылка на деле используется. Их заберёт следующий запуск
+                    aliases = self.db_manager.archive_chunk(
+                        condition, order_by, db, chunk_size, exclude=self.visit_aggregator.pending_aliases()
+                    )
+                    if aliases is None:
+                        break
+                    report[name] += len(aliases)
+
+                    # Очистка кэша
+                    for alias in aliases:
+                        self.local_cache.invalidate(alias)
+                    self.redis_manager.delete_many(aliases)
+                    self.remove_from_filter(aliases)
+
+                    if chunk_pause:
+                        # Даём другим писателям захватить блокировку между пачками
+                        time.sleep(chunk_pause)
+                if not report["complete"]:
+                    break
         finally:
             db.close()
 
+        report["seconds"] = time.monotonic() - started
+        return report
 
-    def get_all_urls(self) -> list[dict]:
+    def backfill_long_url_hashes(self) -> int:
         db = SessionLocal()
         try:
-            entries = db.query(ShortUrl).all()
-            return [
-                {
-                    "id": e.id,
-                    "shortUrl": e.shortUrl,
-                    "longUrl": e.longUrl,
-                    "visits": e.timesVisited,
-                    "createdAt": e.createdAt,
-                    "lastVisited": e.lastVisited,
-                    "expiresAt": e.expiresAt
-                }
-                for e in entries
-            ]
+            return self.db_manager.backfill_long_url_hashes(db)
         finally:
             db.close()
 
-
-    def get_all_expired_urls(self) -> list[dict]:
-        db = SessionLocal()
-        try:
-            entries = db.query(ExpiredUrl).all()
-            return [
-                {
-                    "id": e.id,
-                    "shortUrl": e.shortUrl,
-                    "longUrl": e.longUrl,
-                    "visits": e.timesVisited,
-                    "createdAt": e.createdAt,
-                    "lastVisited": e.lastVisited,
-                    "expiresAt": e.expiresAt,
-                    "deletedAt": e.deletedAt,
-                    "owner_id": e.owner_id
-                }
-                for e in entries
-            ]
-        finally:
-            db.close()
+    def remove_from_filter(self, aliases: list[str]):
+        if not aliases:
+            return
+        self.alias_filter.remove(aliases)
+        self.redis_manager.publish_filter_update(self.alias_filter.encode_message("-", aliases))
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+from Database.main_db import AsyncSessionLocal
+from DbManager.AsyncMainDbManager import AsyncMainDbManager
+
+logger = logging.getLogger(__name__)
+
+
+class VisitAggregator:
+    """
+    Копит переходы по ссылкам в памяти и пачками сбрасывает их в таблицу urls.
+    Сброс происходит по интервалу или при накоплении max_pending алиасов.
+    """
+    FLUSH_INTERVAL = float(os.getenv("VISITS_FLUSH_INTERVAL", 5))
+    MAX_PENDING = int(os.getenv("VISITS_FLUSH_MAX_PENDING", 1000))
+
+    def __init__(self, flush_interval: float | None = None, max_pending: int | None = None):
+        self.db_manager = AsyncMainDbManager()
+        self.flush_interval = flush_interval or self.FLUSH_INTERVAL
+        self.max_pending = max_pending or self.MAX_PENDING
+
+        # alias -> [количество переходов, время последнего перехода]
+        self._pending: dict[str, list] = {}
+        # Пачка, которая сейчас пишется в БД (нужна, чтобы статистика не "проседала")
+        self._in_flight: dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    def record(self, alias: str, visited_at: datetime | None = None):
+        visited_at = visited_at or datetime.now(timezone.utc)
+        with self._lock:
+            entry = self._pending.get(alias)
+            if entry:
+                entry[0] += 1
+                entry[1] = max(entry[1], visited_at)
+            else:
+                self._pending[alias] = [1, visited_at]
+            overflow = len(self._pending) >= self.max_pending
+
+        if overflow and self._loop:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def pending_for(self, alias: str) -> tuple[int, datetime | None]:
+        """Переходы по алиасу, ещё не записанные в БД."""
+        with self._lock:
+            visits, last_visited = 0, None
+            for source in (self._in_flight, self._pending):
+                entry = source.get(alias)
+                if entry:
+                    visits += entry[0]
+                    last_visited = max(last_visited, entry[1]) if last_visited else entry[1]
+            return visits, last_visited
+
+    def pending_aliases(self) -> set[str]:
+        """Алиасы, у которых есть переходы, ещё не записанные в БД."""
+        with self._lock:
+            return self._pending.keys() | self._in_flight.keys()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending) + len(self._in_flight)
+
+    async def flush(self, raise_errors: bool = False) -> int:
+        async with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._in_flight, self._pending = self._pending, {}
+                batch = {alias: (entry[0], entry[1]) for alias, entry in self._in_flight.items()}
+
+            try:
+                await self._write_batch(batch)
+            except asyncio.CancelledError:
+                # Остановка посреди записи — незаписанная пачка вернётся в _pending, stop() её допишет
+                if self._in_flight:
+                    self._restore(batch)
+                raise
+            except Exception as e:
+                if not self._in_flight:
+                    # Коммит прошёл, упало только закрытие сессии — пачка уже в БД
+                    logger.warning(f"Closing session after flush failed: {e}")
+                    return len(batch)
+                logger.warning(f"Flush failed, keeping {len(batch)} aliases for retry: {e}")
+                self._restore(batch)
+                if raise_errors:
+                    raise
+                return 0
+            return len(batch)
+
+    async def flush_aliases(self, aliases: list[str]):
+        """
+        Дописывает в БД переходы по aliases перед тем, как их строки уйдут в архив:
+        после удаления UPDATE из следующего сброса их уже не найдёт. Ошибка записи пробрасывается.
+        """
+        if any(self.pending_for(alias)[0] for alias in aliases):
+            await self.flush(raise_errors=True)
+
+    async def _write_batch(self, batch: dict[str, tuple[int, datetime]]):
+        async with AsyncSessionLocal() as db:
+            await self.db_manager.apply_visit_deltas(batch, db)
+            # Переходы уже в БД: убираем пачку сразу после коммита, а не после закрытия сессии,
+            # иначе /stats в этот момент сложит значение из БД с in-flight и посчитает их дважды
+            with self._lock:
+                self._in_flight = {}
+
+    def _restore(self, batch: dict[str, tuple[int, datetime]]):
+        # Пачка возвращается в _pending тем же шагом, что уходит из in-flight, — статистика не проседает
+        with self._lock:
+            self._in_flight = {}
+            for alias, (visits, last_visited) in batch.items():
+                entry = self._pending.get(alias)
+                if entry:
+                    entry[0] += visits
+                    entry[1] = max(entry[1], last_visited)
+                else:
+                    self._pending[alias] = [visits, last_visited]
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        # Примитивы привязываются к текущему event loop
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Останавливает фоновый сброс и дописывает всё накопленное."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._task:
+            await self._task
+            self._task = None
+        await self.flush()
+
+
+visit_aggregator = VisitAggregator()
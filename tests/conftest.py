@@ -0,0 +1,22 @@
+import os
+import tempfile
+
+# До импорта Database.main_db: тесты пишут в свою SQLite-базу, а не в urls.db рабочего каталога
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/urls.db")
+os.environ.setdefault("ALIAS_SECRET", "test-secret")
+
+import pytest
+from sqlalchemy import delete
+
+
+@pytest.fixture
+def database():
+    """Схема по миграциям и пустые таблицы на каждый тест."""
+    from Database.main_db import Base, engine
+    from Database.migrations import run_migrations
+
+    run_migrations(bind=engine)
+    with engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(delete(table))
+    yield engine
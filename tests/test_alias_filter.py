@@ -0,0 +1,72 @@
+from DbManager.AliasFilterManager import AliasFilterManager, CountingBloomFilter
+
+
+def synced_filter(*aliases: str) -> AliasFilterManager:
+    manager = AliasFilterManager(enabled=True)
+    manager.set_subscribed(True)
+    manager.start_rebuild()
+    rebuilt = manager.new_filter(len(aliases))
+    for alias in aliases:
+        rebuilt.add(alias)
+    manager.finish_rebuild(rebuilt)
+    return manager
+
+
+def test_counting_filter_add_and_remove():
+    bloom = CountingBloomFilter(1000, 0.01)
+    aliases = [f"a{index}" for index in range(500)]
+    for alias in aliases:
+        bloom.add(alias)
+    assert all(alias in bloom for alias in aliases)
+
+    for alias in aliases[:250]:
+        bloom.remove(alias)
+    # Удаление не задевает оставшиеся алиасы
+    assert all(alias in bloom for alias in aliases[250:])
+    assert sum(alias in bloom for alias in aliases[:250]) < 25
+    assert bloom.count == 250
+
+
+def test_removing_absent_alias_keeps_counters():
+    bloom = CountingBloomFilter(100, 0.01)
+    bloom.add("kept")
+    bloom.remove("never-added")
+    bloom.remove("never-added")
+    assert "kept" in bloom
+    assert bloom.count == 1
+
+
+def test_additions_during_rebuild_survive():
+    manager = AliasFilterManager(enabled=True)
+    manager.set_subscribed(True)
+    manager.start_rebuild()
+    manager.apply_message("other|+|fresh")
+    manager.finish_rebuild(manager.new_filter(0))
+    assert manager.might_exist("fresh")
+
+
+def test_miss_is_final_only_while_synced():
+    manager = synced_filter("known")
+    assert manager.is_definitely_absent("missing")
+    assert not manager.is_definitely_absent("known")
+
+    # Подписка потеряна: сообщения о новых алиасах могли пропасть
+    manager.set_subscribed(False)
+    assert not manager.is_definitely_absent("missing")
+
+
+def test_rebuild_without_subscription_is_not_synced():
+    manager = AliasFilterManager(enabled=True)
+    manager.start_rebuild()
+    manager.finish_rebuild(manager.new_filter(0))
+    assert manager.ready and not manager.synced
+    assert not manager.is_definitely_absent("missing")
+
+
+def test_own_messages_are_ignored():
+    manager = synced_filter()
+    manager.apply_message(manager.encode_message("+", ["mine"]))
+    assert not manager.might_exist("mine")
+    manager.apply_message("other|+|theirs")
+    manager.apply_message("other|-|theirs")
+    assert not manager.might_exist("theirs")
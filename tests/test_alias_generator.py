@@ -0,0 +1,42 @@
+import asyncio
+
+from Database.main_db import async_engine
+from service.AliasGenerator import FeistelPermutation, LeasedRangeAliasGenerator, base62_encode
+
+
+def test_feistel_permutation_is_a_bijection():
+    for domain in (5, 1000, 62 ** 2):
+        permutation = FeistelPermutation(domain, b"k" * 32)
+        images = [permutation.permute(value) for value in range(domain)]
+        assert sorted(images) == list(range(domain))
+
+
+def test_permutation_depends_on_key():
+    first = FeistelPermutation(62 ** 2, b"a" * 32)
+    second = FeistelPermutation(62 ** 2, b"b" * 32)
+    assert [first.permute(value) for value in range(20)] != [second.permute(value) for value in range(20)]
+
+
+def test_encode_grows_past_min_length():
+    generator = LeasedRangeAliasGenerator(secret="test-secret")
+    assert len(generator.encode(0)) == generator.MIN_LENGTH
+    assert len(generator.encode(62 ** generator.MIN_LENGTH)) == generator.MIN_LENGTH + 1
+    assert base62_encode(61, 2) == "0Z"
+
+
+def test_workers_lease_disjoint_blocks(database):
+    # Два воркера с маленькими блоками: аренды чередуются, алиасы не повторяются
+    workers = [LeasedRangeAliasGenerator(secret="test-secret") for _ in range(2)]
+    for worker in workers:
+        worker.LEASE_SIZE = 3
+
+    async def generate():
+        aliases = []
+        for _ in range(10):
+            for worker in workers:
+                aliases.append(await worker.next_alias_async())
+        await async_engine.dispose()
+        return aliases
+
+    aliases = asyncio.run(generate())
+    assert len(set(aliases)) == len(aliases) == 20
@@ -0,0 +1,78 @@
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+from fastapi.exceptions import HTTPException
+
+from Database.main_db import SessionLocal, ShortUrl, async_engine
+from service.DumpService import DumpService
+
+
+def add_links(count: int):
+    db = SessionLocal()
+    try:
+        db.add_all([ShortUrl(shortUrl=f"d{index}", longUrl=f"https://example.com/{index}") for index in range(count)])
+        db.commit()
+    finally:
+        db.close()
+
+
+def run(coroutine):
+    async def scenario():
+        try:
+            return await coroutine
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(scenario())
+
+
+async def all_pages(service: DumpService, limit: int) -> list[list[str]]:
+    pages, cursor = [], None
+    while True:
+        page = await service.get_page("urls", cursor, limit)
+        pages.append([item["shortUrl"] for item in page["items"]])
+        if not page["nextCursor"]:
+            return pages
+        cursor = page["nextCursor"]
+
+
+async def exported(service: DumpService, export_format: str, chunk_size: int) -> str:
+    return b"".join([chunk async for chunk in service.export("urls", export_format, chunk_size)]).decode()
+
+
+def test_pages_walk_every_row_once(database):
+    add_links(5)
+    pages = run(all_pages(DumpService(), 2))
+    assert pages == [["d0", "d1"], ["d2", "d3"], ["d4"]]
+
+
+def test_cursor_of_other_table_is_rejected(database):
+    add_links(3)
+    service = DumpService()
+    cursor = run(service.get_page("urls", None, 1))["nextCursor"]
+    for bad in (cursor, "not-a-cursor"):
+        with pytest.raises(HTTPException) as error:
+            run(service.get_page("expired", bad, 1))
+        assert error.value.status_code == 400
+
+
+def test_export_streams_whole_table(database):
+    add_links(5)
+    service = DumpService()
+
+    # Пачки меньше таблицы: JSON-массив склеивается из нескольких блоков
+    rows = json.loads(run(exported(service, "json", 2)))
+    assert [row["shortUrl"] for row in rows] == [f"d{index}" for index in range(5)]
+
+    lines = run(exported(service, "ndjson", 2)).splitlines()
+    assert [json.loads(line)["shortUrl"] for line in lines] == [f"d{index}" for index in range(5)]
+
+    table = list(csv.reader(io.StringIO(run(exported(service, "csv", 2)))))
+    assert table[0][:3] == ["id", "shortUrl", "longUrl"]
+    assert [row[1] for row in table[1:]] == [f"d{index}" for index in range(5)]
+
+
+def test_export_of_empty_table_is_valid_json(database):
+    assert json.loads(run(exported(DumpService(), "json", 2))) == []
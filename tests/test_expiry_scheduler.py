@@ -0,0 +1,119 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from Database.main_db import SessionLocal, ShortUrl, ExpiredUrl, async_engine
+from DbManager.AliasFilterManager import AliasFilterManager
+from service.ExpiryScheduler import ExpiryScheduler
+from service.VisitAggregator import VisitAggregator
+
+
+class RecordingRedisManager:
+    """Вместо AsyncRedisDbManager: запоминает вызовы, в Redis не ходит."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        async def call(*args):
+            self.calls.append((name, args))
+        return call
+
+
+def utc_in(seconds: float) -> datetime:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).replace(tzinfo=None)
+
+
+def add_link(alias: str, expires_at: datetime | None):
+    db = SessionLocal()
+    try:
+        db.add(ShortUrl(shortUrl=alias, longUrl=f"https://example.com/{alias}", expiresAt=expires_at))
+        db.commit()
+    finally:
+        db.close()
+
+
+def aliases_of(model) -> set[str]:
+    db = SessionLocal()
+    try:
+        return set(db.execute(select(model.shortUrl)).scalars())
+    finally:
+        db.close()
+
+
+def make_scheduler() -> ExpiryScheduler:
+    scheduler = ExpiryScheduler()
+    scheduler.redis_manager = RecordingRedisManager()
+    scheduler.alias_filter = AliasFilterManager(enabled=False)
+    scheduler.visit_aggregator = VisitAggregator()
+    return scheduler
+
+
+def run(coroutine):
+    async def scenario():
+        try:
+            return await coroutine
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(scenario())
+
+
+def test_only_latest_deadline_fires():
+    scheduler = ExpiryScheduler()
+    now = time.time()
+    scheduler.loaded_until = now + scheduler.HORIZON
+
+    scheduler.schedule("moved", utc_in(-10))
+    scheduler.schedule("moved", utc_in(60))
+    scheduler.schedule("due", utc_in(-5))
+    scheduler.schedule("cancelled", utc_in(-5))
+    scheduler.unschedule("cancelled")
+    # За горизонтом — не держится в памяти
+    scheduler.schedule("far", utc_in(scheduler.HORIZON + 600))
+
+    assert scheduler._pop_due(now) == ["due"]
+    assert scheduler.pending() == 1
+    assert scheduler._pop_due(now + 120) == ["moved"]
+
+
+def test_reload_and_expire_archive_due_links(database):
+    add_link("past", utc_in(-60))
+    add_link("later", utc_in(60))
+    add_link("far", utc_in(ExpiryScheduler.HORIZON + 600))
+    add_link("forever", None)
+    scheduler = make_scheduler()
+    scheduler.visit_aggregator.record("past")
+
+    async def scenario():
+        now = time.time()
+        await scheduler.reload(now)
+        assert scheduler.pending() == 2
+        await scheduler.expire(scheduler._pop_due(now))
+
+    run(scenario())
+
+    assert aliases_of(ExpiredUrl) == {"past"}
+    assert aliases_of(ShortUrl) == {"later", "far", "forever"}
+    assert scheduler.archived == 1
+    # Переходы, накопленные до истечения, попали в архивную строку
+    db = SessionLocal()
+    try:
+        assert db.execute(select(ExpiredUrl.timesVisited)).scalar() == 1
+    finally:
+        db.close()
+
+
+def test_link_archived_elsewhere_is_only_evicted(database):
+    add_link("past", utc_in(-60))
+    first, second = make_scheduler(), make_scheduler()
+
+    run(first.expire(["past"]))
+    run(second.expire(["past"]))
+
+    assert second.archived == 0
+    assert ("delete_many", (["past"],)) in second.redis_manager.calls
+    # Удаление из фильтров рассылает только воркер, который действительно архивировал
+    assert all(name != "publish_filter_update" for name, _ in second.redis_manager.calls)
+    assert aliases_of(ExpiredUrl) == {"past"}
@@ -0,0 +1,39 @@
+from sqlalchemy import create_engine, inspect
+
+from Database.main_db import Base
+from Database.migrations import MIGRATIONS, run_migrations
+
+
+def schema_of(engine) -> dict:
+    inspector = inspect(engine)
+    schema = {}
+    for table in inspector.get_table_names():
+        if table == "schema_migrations":
+            continue
+        schema[table] = (
+            sorted(column["name"] for column in inspector.get_columns(table)),
+            sorted((index["name"], tuple(index["column_names"]), bool(index["unique"])) for index in inspector.get_indexes(table)),
+            sorted(tuple(constraint["column_names"]) for constraint in inspector.get_unique_constraints(table))
+        )
+    return schema
+
+
+def test_migrations_build_the_model_schema(tmp_path):
+    migrated = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    assert run_migrations(bind=migrated) == MIGRATIONS[-1][0]
+
+    reference = create_engine(f"sqlite:///{tmp_path / 'reference.db'}")
+    Base.metadata.create_all(reference)
+
+    assert schema_of(migrated) == schema_of(reference)
+
+
+def test_migrations_are_idempotent_on_a_model_created_database(tmp_path):
+    # База, созданная create_all до появления миграций
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(legacy)
+    before = schema_of(legacy)
+
+    assert run_migrations(bind=legacy) == MIGRATIONS[-1][0]
+    assert run_migrations(bind=legacy) == MIGRATIONS[-1][0]
+    assert schema_of(legacy) == before
@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi.exceptions import HTTPException
+
+from Database.main_db import SessionLocal, ShortUrl, User, async_engine
+from service.AsyncUrlService import AsyncUrlService
+
+
+def add_owner_links(created: list[datetime]) -> User:
+    db = SessionLocal()
+    try:
+        user = User(email="owner@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        for index, created_at in enumerate(created):
+            db.add(ShortUrl(
+                shortUrl=f"l{index}", longUrl=f"https://example.com/{index}", owner_id=user.id, createdAt=created_at
+            ))
+        # Чужая ссылка в выдачу не попадает
+        db.add(ShortUrl(shortUrl="foreign", longUrl="https://example.com/foreign"))
+        db.commit()
+        db.refresh(user)
+        return user
+    finally:
+        db.close()
+
+
+def collect(user: User, sort: str, limit: int) -> tuple[list[str], list[int | None]]:
+    async def scenario():
+        service = AsyncUrlService()
+        aliases, totals, cursor = [], [], None
+        try:
+            while True:
+                page = await service.list_owned_links(user, sort, cursor, limit)
+                aliases += [item.shortUrl for item in page.items]
+                totals.append(page.total)
+                if not page.nextCursor:
+                    return aliases, totals
+                cursor = page.nextCursor
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(scenario())
+
+
+def test_pages_walk_every_link_once(database):
+    # Одинаковое время создания: порядок внутри секунды задаёт id
+    same = datetime(2030, 1, 1, 12, 0, 0)
+    user = add_owner_links([same, datetime(2030, 1, 1, 11), same, datetime(2030, 1, 1, 13), same])
+
+    aliases, totals = collect(user, "newest", 2)
+    assert aliases == ["l3", "l4", "l2", "l0", "l1"]
+    assert totals == [5, None, None]
+
+    aliases, _ = collect(user, "oldest", 2)
+    assert aliases == ["l1", "l0", "l2", "l4", "l3"]
+
+
+def test_cursor_of_other_sort_is_rejected(database):
+    user = add_owner_links([datetime(2030, 1, 1, hour) for hour in range(3)])
+
+    async def scenario():
+        service = AsyncUrlService()
+        try:
+            page = await service.list_owned_links(user, "newest", None, 1)
+            for cursor in (page.nextCursor, "not-a-cursor"):
+                with pytest.raises(HTTPException) as error:
+                    await service.list_owned_links(user, "oldest", cursor, 1)
+                assert error.value.status_code == 400
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,79 @@
+import asyncio
+from ipaddress import ip_network
+
+import pytest
+from fastapi.exceptions import HTTPException
+
+import service.RateLimiter as rate_limiter_module
+from service.RateLimiter import RateLimiter, client_address
+
+
+class FakeRateLimitManager:
+    """Вместо RateLimitManager: отдаёт заданные ответы и считает обращения к Redis."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    async def acquire(self, key, rate, capacity, requested):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def make_limiter(manager) -> RateLimiter:
+    limiter = RateLimiter()
+    limiter.ENABLED = True
+    limiter.manager = manager
+    # 100 запросов за 10 секунд: аренда по 5 токенов
+    limiter.limits = {"redirect": (10.0, 100)}
+    return limiter
+
+
+def test_redis_failure_allows_request():
+    manager = FakeRateLimitManager(ConnectionError("down"), ConnectionError("down"))
+    limiter = make_limiter(manager)
+
+    asyncio.run(limiter.check("redirect", "10.0.0.1"))
+    asyncio.run(limiter.check("redirect", "10.0.0.1"))
+
+    # Отказ Redis не кэшируется: каждый запрос снова пробует Redis
+    assert manager.calls == 2
+    assert limiter.redis_errors == 2
+    assert limiter.local_keys() == 0
+
+
+def test_leased_tokens_are_spent_locally():
+    manager = FakeRateLimitManager((5, 0.0), (5, 0.0))
+    limiter = make_limiter(manager)
+
+    for _ in range(5):
+        asyncio.run(limiter.check("redirect", "10.0.0.1"))
+    assert manager.calls == 1
+
+    # Аренда исчерпана — следующий запрос снова идёт в Redis
+    asyncio.run(limiter.check("redirect", "10.0.0.1"))
+    assert manager.calls == 2
+
+
+def test_rejection_is_remembered_until_retry_after():
+    manager = FakeRateLimitManager((0, 30.0))
+    limiter = make_limiter(manager)
+
+    for _ in range(2):
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(limiter.check("redirect", "10.0.0.1"))
+        assert error.value.status_code == 429
+        assert error.value.headers["Retry-After"] == "30"
+    assert manager.calls == 1
+
+
+def test_forwarded_for_is_read_only_from_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(rate_limiter_module, "TRUSTED_PROXIES", [ip_network("10.0.0.0/8")])
+
+    assert client_address("203.0.113.5", "198.51.100.1") == "203.0.113.5"
+    # Левые адреса цепочки подделывает клиент — берётся ближайший к прокси недоверенный
+    assert client_address("10.0.0.2", "1.2.3.4, 198.51.100.1, 10.0.0.3") == "198.51.100.1"
+    assert client_address("10.0.0.2", None) == "10.0.0.2"
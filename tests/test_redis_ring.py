@@ -0,0 +1,67 @@
+from collections import Counter
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from Database.redis_ring import HashRing, RedisRing
+
+NODES = ["cache-a:6379", "cache-b:6379", "cache-c:6379"]
+KEYS = [f"alias{index}" for index in range(3000)]
+
+
+def test_keys_spread_over_all_nodes():
+    ring = HashRing(NODES, 160)
+    shares = Counter(ring.node_for(key) for key in KEYS)
+    assert set(shares) == set(NODES)
+    assert min(shares.values()) > len(KEYS) / len(NODES) * 0.7
+
+
+def test_mark_down_moves_only_keys_of_that_node():
+    ring = RedisRing(NODES)
+    before = {key: ring.node_for(key).name for key in KEYS}
+
+    assert ring.mark_down(ring.nodes["cache-b:6379"], RedisConnectionError("down"))
+    after = {key: ring.node_for(key).name for key in KEYS}
+
+    for key in KEYS:
+        if before[key] != "cache-b:6379":
+            assert after[key] == before[key]
+    # Ключи выбывшего узла расходятся по обоим оставшимся
+    assert {after[key] for key in KEYS if before[key] == "cache-b:6379"} == {"cache-a:6379", "cache-c:6379"}
+
+
+def test_last_alive_node_stays_in_ring():
+    ring = RedisRing(NODES[:2])
+    assert ring.mark_down(ring.nodes["cache-a:6379"], RedisConnectionError("down"))
+    assert not ring.mark_down(ring.nodes["cache-b:6379"], RedisConnectionError("down"))
+    assert ring.nodes["cache-b:6379"].alive
+    assert {ring.node_for(key).name for key in KEYS} == {"cache-b:6379"}
+
+
+def test_call_retries_on_new_owner():
+    ring = RedisRing(NODES)
+    key = KEYS[0]
+    failing = ring.node_for(key)
+    clients = {node.redis: node.name for node in ring.nodes.values()}
+
+    def operation(client):
+        if client is failing.redis:
+            raise RedisConnectionError("down")
+        return clients[client]
+
+    served_by = ring.call(key, operation)
+    assert not failing.alive
+    assert served_by != failing.name
+
+
+def test_shared_redis_is_never_marked_down():
+    # Без REDIS_NODES кольцо из одного общего Redis: его нельзя выводить и очищать
+    ring = RedisRing([])
+    node = next(iter(ring.nodes.values()))
+    assert not ring.mark_down(node, RedisConnectionError("down"))
+
+    def operation(client):
+        raise RedisConnectionError("down")
+
+    with pytest.raises(RedisConnectionError):
+        ring.call(KEYS[0], operation)
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from Database.sqlite_writer import WriterQueueConnection, writer_queue
+
+FLUSH_SECONDS = 0.5
+
+
+@pytest.fixture
+def engines(tmp_path):
+    path = tmp_path / "urls.db"
+    connect_args = {"factory": WriterQueueConnection, "timeout": 5.0}
+    sync_engine = create_engine(f"sqlite:///{path}", connect_args=connect_args)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args=connect_args)
+    with sync_engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        conn.exec_driver_sql("CREATE TABLE urls (short_url TEXT PRIMARY KEY, times_visited INTEGER NOT NULL)")
+        conn.exec_driver_sql("INSERT INTO urls VALUES ('a', 0), ('b', 0)")
+    yield sync_engine, async_engine
+    sync_engine.dispose()
+
+
+def sync_update(engine, alias: str):
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE urls SET times_visited = times_visited + 1 WHERE short_url = :alias"), {"alias": alias})
+
+
+async def slow_flush(engine, started: asyncio.Event):
+    # Как VisitAggregator.flush: транзакция записи через aiosqlite, которая держит очередь писателей
+    async with engine.begin() as conn:
+        await conn.execute(text("UPDATE urls SET times_visited = times_visited + 10 WHERE short_url = 'a'"))
+        started.set()
+        await asyncio.sleep(FLUSH_SECONDS)
+
+
+async def max_loop_stall(stop: asyncio.Event) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        before = time.monotonic()
+        await asyncio.sleep(0.01)
+        worst = max(worst, time.monotonic() - before - 0.01)
+    return worst
+
+
+def test_sync_write_on_loop_thread_fails_fast_during_async_flush(engines):
+    sync_engine, async_engine = engines
+
+    async def scenario():
+        started, stop = asyncio.Event(), asyncio.Event()
+        heartbeat = asyncio.create_task(max_loop_stall(stop))
+        flush = asyncio.create_task(slow_flush(async_engine, started))
+        await started.wait()
+
+        before = time.monotonic()
+        with pytest.raises(OperationalError, match="writer queue busy"):
+            sync_update(sync_engine, "b")
+        failed_after = time.monotonic() - before
+
+        await flush
+        stop.set()
+        await async_engine.dispose()
+        return failed_after, await heartbeat
+
+    failed_after, stall = asyncio.run(scenario())
+    assert failed_after < 0.1
+    assert stall < FLUSH_SECONDS / 2
+    assert writer_queue.try_acquire()
+    writer_queue.release()
+
+
+def test_sync_write_off_loop_waits_for_async_flush(engines):
+    sync_engine, async_engine = engines
+
+    async def scenario():
+        started, stop = asyncio.Event(), asyncio.Event()
+        heartbeat = asyncio.create_task(max_loop_stall(stop))
+        flush = asyncio.create_task(slow_flush(async_engine, started))
+        await started.wait()
+
+        # Синхронная сессия в пуле потоков ждёт своей очереди, не задерживая event loop
+        await asyncio.to_thread(sync_update, sync_engine, "a")
+
+        await flush
+        stop.set()
+        await async_engine.dispose()
+        return await heartbeat
+
+    stall = asyncio.run(scenario())
+    assert stall < FLUSH_SECONDS / 2
+    with sync_engine.connect() as conn:
+        assert conn.execute(text("SELECT times_visited FROM urls WHERE short_url = 'a'")).scalar() == 11
+
+
+def test_sync_write_outside_loop_is_unaffected(engines):
+    sync_engine, _ = engines
+    worker = threading.Thread(target=sync_update, args=(sync_engine, "b"))
+    worker.start()
+    worker.join()
+    sync_update(sync_engine, "b")
+    with sync_engine.connect() as conn:
+        assert conn.execute(text("SELECT times_visited FROM urls WHERE short_url = 'b'")).scalar() == 2
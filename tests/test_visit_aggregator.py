@@ -0,0 +1,124 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import select
+
+from Database.main_db import SessionLocal, ShortUrl, ExpiredUrl, async_engine
+from service.AsyncUrlService import AsyncUrlService
+from service.VisitAggregator import VisitAggregator, visit_aggregator
+
+
+class RecordingRedisManager:
+    """Вместо AsyncRedisDbManager: запоминает вызовы, в Redis не ходит."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        async def call(*args):
+            self.calls.append((name, args))
+        return call
+
+
+def add_link(alias: str, visits: int = 0) -> ShortUrl:
+    db = SessionLocal()
+    try:
+        short_url = ShortUrl(shortUrl=alias, longUrl=f"https://example.com/{alias}", timesVisited=visits)
+        db.add(short_url)
+        db.commit()
+        return short_url
+    finally:
+        db.close()
+
+
+def visits_of(model, alias: str) -> int | None:
+    db = SessionLocal()
+    try:
+        return db.execute(select(model.timesVisited).where(model.shortUrl == alias)).scalar()
+    finally:
+        db.close()
+
+
+def run(coroutine):
+    async def scenario():
+        try:
+            return await coroutine
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(scenario())
+
+
+def test_flush_applies_merged_deltas(database):
+    add_link("a", visits=2)
+    aggregator = VisitAggregator()
+    visited_at = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    for _ in range(3):
+        aggregator.record("a", visited_at)
+
+    assert aggregator.pending_for("a") == (3, visited_at)
+    assert run(aggregator.flush()) == 1
+    assert aggregator.pending_for("a") == (0, None)
+    assert visits_of(ShortUrl, "a") == 5
+
+
+def test_failed_flush_keeps_visits_for_retry(database, monkeypatch):
+    add_link("a")
+    aggregator = VisitAggregator()
+    aggregator.record("a")
+
+    async def fail(batch, db, chunk_size=500):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(aggregator.db_manager, "apply_visit_deltas", fail)
+    assert run(aggregator.flush()) == 0
+    aggregator.record("a")
+    assert aggregator.pending_for("a")[0] == 2
+
+    monkeypatch.undo()
+    assert run(aggregator.flush()) == 1
+    assert visits_of(ShortUrl, "a") == 2
+
+
+def test_delete_archives_pending_visits(database):
+    add_link("del1", visits=1)
+    for _ in range(4):
+        visit_aggregator.record("del1")
+    service = AsyncUrlService()
+    service.redis_manager = RecordingRedisManager()
+
+    assert run(service.delete_by_short_url("del1")) is True
+    assert visits_of(ShortUrl, "del1") is None
+    assert visits_of(ExpiredUrl, "del1") == 5
+    assert visit_aggregator.pending_for("del1") == (0, None)
+
+
+def test_restored_batch_merges_with_new_visits(database, monkeypatch):
+    add_link("a")
+    aggregator = VisitAggregator()
+    early, late = datetime(2030, 1, 1, tzinfo=timezone.utc), datetime(2030, 1, 2, tzinfo=timezone.utc)
+    aggregator.record("a", late)
+
+    async def fail_after_visit(batch, db, chunk_size=500):
+        # Переход, пришедший во время записи, попадает в новый _pending
+        aggregator.record("a", early)
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(aggregator.db_manager, "apply_visit_deltas", fail_after_visit)
+    assert run(aggregator.flush()) == 0
+    assert aggregator.pending_for("a") == (2, late)
+    assert aggregator.pending_count() == 1
+
+
+def test_flush_aliases_raises_when_write_fails(database, monkeypatch):
+    add_link("a")
+    aggregator = VisitAggregator()
+
+    async def fail(batch, db, chunk_size=500):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(aggregator.db_manager, "apply_visit_deltas", fail)
+    aggregator.record("a")
+    with pytest.raises(RuntimeError):
+        run(aggregator.flush_aliases(["a"]))
+    assert aggregator.pending_for("a")[0] == 1